@@ -1,3 +1,14 @@
+from .arrays import number_args, to_array  # noqa F401
+from .cache import CacheSettings, ClientCache  # noqa F401
+from .cluster import ClusterSettings, RedisCluster, create_cluster  # noqa F401
+from .codecs import BytesCodec, Codec, CompressedCodec, JsonCodec, MsgpackCodec, PickleCodec  # noqa F401
 from .connection import ConnectionSettings  # noqa F401
-from .main import Redis, connect  # noqa F401
+from .main import CachedRedis, Redis, ReplicaRedis, connect  # noqa F401
+from .metrics import Histogram, Metrics  # noqa F401
+from .pool import ConnectionPool, PoolSettings, create_pool  # noqa F401
+from .pubsub import PubSub, PubSubSettings, create_pubsub  # noqa F401
+from .replicas import ReplicaSettings  # noqa F401
+from .scripts import Script  # noqa F401
+from .sharding import HashRing, ShardedRedis, create_sharded  # noqa F401
+from .transaction import Transaction, WatchError  # noqa F401
 from .version import VERSION  # noqa F401
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from array import array, typecodes
+from numbers import Integral, Real
+from types import ModuleType
+from typing import Any, List, Optional, Sequence, Tuple
+
+numpy: Optional[ModuleType]
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+__all__ = 'ArrayType', 'to_array', 'to_scored_array', 'number_args'
+
+# how to return numeric replies: a typecode of the array module (e.g. 'q' or 'd') for an array.array, anything else
+# is a numpy dtype (e.g. numpy.int64 or numpy.dtype('f8')) for a numpy array
+ArrayType = Any
+
+
+def to_array(values: Sequence[Any], array_type: ArrayType) -> Any:
+    """
+    Convert a reply of numbers to an array.array or numpy array, see ArrayType. Numbers may be bytes, str, int or
+    float, nil values (e.g. from MGET of missing keys) become NaN in float arrays and 0 in integer arrays.
+
+    Numbers are converted one at a time straight into the array, so no python object is kept per number.
+    """
+    if isinstance(array_type, str):
+        if array_type not in typecodes:
+            raise ValueError(f'invalid array typecode {array_type!r}, must be one of: {", ".join(typecodes)}')
+        floating = array_type in 'fd'
+        return array(array_type, map(float if floating else int, _fill_missing(values, floating)))
+    elif numpy is None:
+        raise ImportError('numpy must be installed to return numpy arrays')
+
+    dtype = numpy.dtype(array_type)
+    floating = dtype.kind in 'fc'
+    numbers = map(float if floating else int, _fill_missing(values, floating))
+    return numpy.fromiter(numbers, dtype=dtype, count=len(values))
+
+
+def to_scored_array(values: List[Any], array_type: ArrayType) -> Tuple[List[Any], Any]:
+    """
+    Convert a reply of members and scores, e.g. from ZRANGE WITHSCORES, to a list of members and an array of scores.
+    """
+    if values and isinstance(values[0], list):
+        # RESP3 replies are pairs of member and score
+        return [member for member, _ in values], to_array([score for _, score in values], array_type)
+    return values[0::2], to_array(values[1::2], array_type)
+
+
+def number_args(values: Sequence[Any]) -> List[bytes]:
+    """
+    Encode an array.array, numpy array or sequence of numbers as command arguments, e.g.
+    redis.mset(*zip(keys, number_args(values))), see also AbstractCommands.zadd.
+
+    numpy arrays are converted to python numbers in one go, iterating over them would create a numpy scalar per
+    number, numpy integers can't be used as arguments directly. Values other than integers and real numbers,
+    e.g. Decimal, raise TypeError.
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        values = values.tolist()
+    return [b'%d' % v if type(v) is int else _number_arg(v) for v in values]
+
+
+def _number_arg(value: Any) -> bytes:
+    if isinstance(value, Integral):
+        return b'%d' % value
+    elif isinstance(value, Real):
+        # repr of a float is the shortest string which round-trips, unlike numpy scalars which repr as e.g.
+        # "np.float64(1.5)"
+        return repr(float(value)).encode()
+    raise TypeError(f'numbers must be integers or real numbers, not {type(value).__name__}')
+
+
+def _fill_missing(values: Sequence[Any], floating: bool) -> Sequence[Any]:
+    if None not in values:
+        return values
+    missing = float('nan') if floating else 0
+    return [missing if v is None else v for v in values]
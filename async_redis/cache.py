@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from mmap import mmap
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cluster import keyless_commands
+from .connection import ConnectionSettings, RawConnection, create_raw_connection, open_stream
+from .streams import RedisStreamReader, RedisWriter
+from .typing import ArgType, CommandArgs, ReturnAs
+from .utils import encode_command
+
+__all__ = 'CacheSettings', 'CacheStats', 'ClientCache'
+
+# read commands of a single key, the first argument, whose replies can be cached. Not EXISTS: it can have several
+# keys and the reply would only be invalidated with the first
+cacheable_commands = {b'GET', b'GETBIT', b'GETRANGE', b'STRLEN'}
+
+_invalidation_channel = b'__redis__:invalidate'
+_subscribe_command = encode_command(b'CLIENT', [b'ID']) + encode_command(b'SUBSCRIBE', [_invalidation_channel])
+
+
+@dataclass
+class CacheSettings:
+    """
+    Client side cache settings
+    """
+
+    # maximum number of keys and approximate total size of values to cache
+    max_keys: int = 10_000
+    max_size: int = 2 ** 26  # 64 MiB
+    # entries are dropped this many seconds after being cached even if no invalidation is received
+    max_ttl: Optional[float] = 60
+    # how long to wait before reconnecting when the invalidation connection is lost, doubled after each failure
+    reconnect_delay: float = 0.1
+    max_reconnect_delay: float = 10
+
+    def __repr__(self) -> str:
+        fields = 'max_keys', 'max_size', 'max_ttl', 'reconnect_delay', 'max_reconnect_delay'
+        return 'CacheSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
+
+
+@dataclass
+class CacheStats:
+    """
+    Snapshot of client side cache counters.
+    """
+
+    hits: int
+    misses: int
+    invalidations: int
+    evictions: int
+    keys: int
+    size: int
+
+
+class _Entry:
+    __slots__ = 'values', 'size', 'expires'
+
+    def __init__(self, expires: float):
+        # cached replies for this key by command, extra arguments and return_as
+        self.values: Dict[Tuple[Any, ...], Any] = {}
+        self.size = 0
+        self.expires = expires
+
+
+class ClientCache:
+    """
+    Local LRU cache of read command replies kept correct with redis server-assisted client side caching.
+
+    Cached reads go through a dedicated connection with CLIENT TRACKING enabled, redis sends invalidation messages
+    for keys read on that connection to a second connection subscribed to "__redis__:invalidate". While either
+    connection is down the cache is empty and reads bypass it.
+    """
+
+    __slots__ = (
+        '_conn_settings',
+        '_settings',
+        '_loop',
+        '_entries',
+        '_inflight',
+        '_size',
+        '_read_conn',
+        '_invalidation_writer',
+        '_task',
+        '_hits',
+        '_misses',
+        '_invalidations',
+        '_evictions',
+    )
+
+    def __init__(self, conn_settings: ConnectionSettings, cache_settings: Optional[CacheSettings] = None):
+        self._conn_settings = conn_settings
+        self._settings = cache_settings or CacheSettings()
+        self._loop = asyncio.get_event_loop()
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        # keys being read, a reply is only cached if its key hasn't been invalidated since the read was sent
+        self._inflight: Dict[bytes, object] = {}
+        self._size = 0
+        self._read_conn: Optional[RawConnection] = None
+        self._invalidation_writer: Optional[RedisWriter] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._read_conn is not None
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            invalidations=self._invalidations,
+            evictions=self._evictions,
+            keys=len(self._entries),
+            size=self._size,
+        )
+
+    async def open(self) -> None:
+        """
+        Connect and start tracking, errors connecting the first time are raised.
+        """
+        ready: asyncio.Future[None] = self._loop.create_future()
+        self._task = self._loop.create_task(self._run(ready))
+        await ready
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def execute(self, args: CommandArgs, return_as: ReturnAs) -> Any:
+        """
+        Execute a command from cacheable_commands, using the cached reply if there is one.
+        """
+        read_conn = self._read_conn
+        assert read_conn is not None, 'cache is not enabled'
+        key = self._key(args[1])
+        variant = (args[0], *args[2:], return_as)
+        value = self._get(key, variant)
+        if value is not _missing:
+            self._hits += 1
+            return value
+
+        self._misses += 1
+        token = self._inflight[key] = object()
+        try:
+            value = await self._read(read_conn, args, return_as)
+        except BaseException:
+            if self._inflight.get(key) is token:
+                del self._inflight[key]
+            raise
+        self._set(key, token, variant, value)
+        return value
+
+    async def mget(self, keys: CommandArgs, return_as: ReturnAs) -> List[Any]:
+        """
+        MGET using cached values of GET where available, only missing keys are requested from redis.
+        """
+        read_conn = self._read_conn
+        assert read_conn is not None, 'cache is not enabled'
+        variant = (b'GET', return_as)
+        values: List[Any] = []
+        missing: List[Tuple[int, bytes, ArgType]] = []
+        for key in keys:
+            bkey = self._key(key)
+            value = self._get(bkey, variant)
+            if value is _missing:
+                missing.append((len(values), bkey, key))
+            values.append(value)
+
+        self._hits += len(values) - len(missing)
+        if missing:
+            self._misses += len(missing)
+            tokens = []
+            for _, bkey, _ in missing:
+                tokens.append(object())
+                self._inflight[bkey] = tokens[-1]
+            try:
+                fetched = await self._read(read_conn, [b'MGET', *(key for _, _, key in missing)], return_as)
+            except BaseException:
+                for (_, bkey, _), token in zip(missing, tokens):
+                    if self._inflight.get(bkey) is token:
+                        del self._inflight[bkey]
+                raise
+            for (index, bkey, _), token, value in zip(missing, tokens, fetched):
+                self._set(bkey, token, variant, value)
+                values[index] = value
+        return values
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+        self._size = 0
+
+    def invalidate(self, keys: Optional[List[bytes]]) -> None:
+        """
+        Remove keys from the cache, None means remove all keys, e.g. after FLUSHALL.
+        """
+        if keys is None:
+            self._invalidations += len(self._entries)
+            self.clear()
+            return
+
+        for key in keys:
+            self._inflight.pop(key, None)
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._invalidations += 1
+                self._size -= entry.size
+
+    def invalidate_command(self, args: CommandArgs) -> None:
+        """
+        Remove the keys a write command may change before it's sent, so reads from this client never return a
+        value it has changed while the invalidation message is on its way. Every argument is treated as a key.
+        """
+        command = args[0]
+        if command == b'FLUSHALL' or command == b'FLUSHDB':
+            self.invalidate(None)
+        elif command not in keyless_commands:
+            # large values passed as buffers can't be keys worth caching, so they're not copied to compare them
+            self.invalidate([self._key(a) for a in args[1:] if not isinstance(a, (bytearray, memoryview, mmap))])
+
+    def _key(self, key: ArgType) -> bytes:
+        if isinstance(key, bytes):
+            return key
+        elif isinstance(key, str):
+            return key.encode(self._conn_settings.encoding)
+        elif isinstance(key, (int, float)):
+            return str(key).encode()
+        else:
+            return bytes(key)
+
+    def _get(self, key: bytes, variant: Tuple[Any, ...]) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _missing
+        elif entry.expires < self._loop.time():
+            self._drop(key)
+            return _missing
+        value = entry.values.get(variant, _missing)
+        if value is not _missing:
+            self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: bytes, token: object, variant: Tuple[Any, ...], value: Any) -> None:
+        if self._inflight.get(key) is not token:
+            # the key was invalidated (or read again) while the read was in progress
+            return
+        del self._inflight[key]
+
+        entry = self._entries.get(key)
+        if entry is None:
+            max_ttl = self._settings.max_ttl
+            expires = self._loop.time() + max_ttl if max_ttl is not None else float('inf')
+            self._entries[key] = entry = _Entry(expires)
+            entry.size = len(key)
+            self._size += entry.size
+        else:
+            self._entries.move_to_end(key)
+
+        size = len(value) if isinstance(value, (bytes, str)) else 8
+        entry.values[variant] = value
+        entry.size += size
+        self._size += size
+
+        while self._entries and (len(self._entries) > self._settings.max_keys or self._size > self._settings.max_size):
+            old_key, old_entry = self._entries.popitem(last=False)
+            self._size -= old_entry.size
+            self._evictions += 1
+
+    def _drop(self, key: bytes) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+    async def _read(self, read_conn: RawConnection, args: CommandArgs, return_as: ReturnAs) -> Any:
+        try:
+            return await read_conn.execute(args, return_as)
+        except ConnectionError:
+            # tracking has stopped with this connection, closing the invalidation connection causes both
+            # to be reconnected
+            if self._invalidation_writer is not None:
+                self._invalidation_writer.close()
+            raise
+
+    async def _run(self, ready: asyncio.Future[None]) -> None:
+        """
+        Maintain the invalidation and tracked connections, reconnecting when either is lost.
+        """
+        delay = self._settings.reconnect_delay
+        while True:
+            try:
+                reader, writer = await open_stream(self._conn_settings)
+                try:
+                    self._invalidation_writer = writer
+                    await self._start_tracking(reader, writer)
+                    if not ready.done():
+                        ready.set_result(None)
+                    delay = self._settings.reconnect_delay
+                    await self._listen(reader)
+                finally:
+                    self._invalidation_writer = None
+                    await self._stop_tracking()
+                    writer.close()
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                    return
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._settings.max_reconnect_delay)
+
+    async def _start_tracking(self, reader: RedisStreamReader, writer: RedisWriter) -> None:
+        writer.write(_subscribe_command)
+        client_id = await reader.read_redis()
+        await reader.read_redis()
+        read_conn = await create_raw_connection(self._conn_settings)
+        try:
+            await read_conn.execute([b'CLIENT', b'TRACKING', b'ON', b'REDIRECT', client_id], 'ok')  # type: ignore
+        except BaseException:
+            await read_conn.close()
+            raise
+        self._read_conn = read_conn
+
+    async def _stop_tracking(self) -> None:
+        self.clear()
+        read_conn, self._read_conn = self._read_conn, None
+        if read_conn is not None:
+            try:
+                await read_conn.close()
+            except (OSError, ConnectionError):
+                pass
+
+    async def _listen(self, reader: RedisStreamReader) -> None:
+        while True:
+            msg = await reader.read_redis()
+            if isinstance(msg, list) and len(msg) == 3 and msg[0] == b'message':
+                self.invalidate(msg[2])  # type: ignore
+
+
+_missing = object()
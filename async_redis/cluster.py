@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from hiredis import ReplyError
+
+from .commands import AbstractCommands
+from .connection import ConnectionSettings
+from .pool import ConnectionPool, PoolSettings
+from .scripts import Script, Scripts
+from .typing import ArgType, Callback, CommandArgs, ReturnAs
+from .utils import apply_callback
+
+__all__ = 'ClusterSettings', 'RedisCluster', 'create_cluster', 'key_slot'
+
+Address = Tuple[str, int]
+
+SLOTS = 16384
+# commands without keys, they're sent to a random node
+keyless_commands = {
+    b'BGREWRITEAOF',
+    b'BGSAVE',
+    b'CLIENT',
+    b'COMMAND',
+    b'CONFIG',
+    b'DBSIZE',
+    b'DEBUG',
+    b'INFO',
+    b'LASTSAVE',
+    b'PUBLISH',
+    b'ROLE',
+    b'SAVE',
+    b'SHUTDOWN',
+    b'SLAVEOF',
+    b'SLOWLOG',
+    b'SYNC',
+    b'TIME',
+}
+# commands sent to every primary, the reply from the first node is returned, SCRIPT so scripts are on every node
+broadcast_commands = {b'FLUSHALL', b'FLUSHDB', b'SCRIPT'}
+# commands where the first argument is a script rather than a key
+script_commands = {b'EVAL', b'EVALSHA'}
+
+
+def _crc16_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+_crc16_lookup = _crc16_table()
+
+
+def crc16(data: bytes) -> int:
+    """
+    CRC16-CCITT (XMODEM) as used by redis cluster.
+    """
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) & 0xFF00) ^ _crc16_lookup[((crc >> 8) ^ b) & 0xFF]
+    return crc
+
+
+def _hash_tag(key: bytes) -> bytes:
+    """
+    Part of a key which is hashed, if the key contains a non-empty hash tag "{...}" only the tag is hashed.
+    """
+    start = key.find(b'{')
+    if start != -1:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]
+    return key
+
+
+def key_slot(key: bytes) -> int:
+    """
+    Hash slot of a key, see _hash_tag.
+    """
+    return crc16(_hash_tag(key)) % SLOTS
+
+
+@dataclass
+class ClusterSettings:
+    """
+    Redis cluster settings
+    """
+
+    # nodes used to discover the cluster topology
+    startup_nodes: Sequence[Address] = (('localhost', 7000),)
+    # maximum number of MOVED or ASK redirects followed for one command
+    max_redirects: int = 5
+
+    def __repr__(self) -> str:
+        fields = 'startup_nodes', 'max_redirects'
+        return 'ClusterSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
+
+
+async def create_cluster(
+    cluster_settings: Optional[ClusterSettings] = None,
+    conn_settings: Optional[ConnectionSettings] = None,
+    pool_settings: Optional[PoolSettings] = None,
+) -> 'RedisCluster':
+    """
+    Create a new RedisCluster and load the cluster's topology.
+    """
+    cluster = RedisCluster(cluster_settings, conn_settings, pool_settings)
+    await cluster.open()
+    return cluster
+
+
+class RedisCluster(AbstractCommands):
+    """
+    Client for redis cluster, commands are sent to the primary serving the slot of their key using a pool of
+    connections per node.
+
+    The slot map is loaded with CLUSTER SLOTS, it's updated when redis replies with MOVED and reloaded in the
+    background. MGET and MSET are split into one command per slot, commands for the same node are written
+    together on one connection and nodes are queried concurrently. host, port and database in conn_settings
+    are ignored.
+    """
+
+    __slots__ = (
+        '_settings',
+        '_conn_settings',
+        '_pool_settings',
+        '_loop',
+        '_slots',
+        '_nodes',
+        '_pools',
+        '_refresh_task',
+        'scripts',
+    )
+
+    def __init__(
+        self,
+        cluster_settings: Optional[ClusterSettings] = None,
+        conn_settings: Optional[ConnectionSettings] = None,
+        pool_settings: Optional[PoolSettings] = None,
+    ):
+        self._settings = cluster_settings or ClusterSettings()
+        self._conn_settings = conn_settings or ConnectionSettings()
+        self._pool_settings = pool_settings or PoolSettings()
+        self._loop = asyncio.get_event_loop()
+        # address of the primary serving each slot
+        self._slots: List[Optional[Address]] = [None] * SLOTS
+        self._nodes: List[Address] = []
+        self._pools: Dict[Address, ConnectionPool] = {}
+        self._refresh_task: Optional[asyncio.Task[None]] = None
+        # scripts registered with the client, shared by the pools of all nodes, see RawConnection.scripts
+        self.scripts: Scripts = {}
+
+    @property
+    def nodes(self) -> List[Address]:
+        """
+        Addresses of the cluster's primaries.
+        """
+        return list(self._nodes)
+
+    def node_for_key(self, key: ArgType) -> Address:
+        return self._node(key_slot(self._key(key)))
+
+    async def open(self) -> None:
+        await self.refresh()
+
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        pools = list(self._pools.values())
+        self._pools.clear()
+        await asyncio.gather(*[pool.close() for pool in pools])
+
+    async def __aenter__(self) -> 'RedisCluster':
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        await self.close()
+
+    async def refresh(self) -> None:
+        """
+        Load the slot map with CLUSTER SLOTS from the first known node which replies, then close the pools of
+        nodes which no longer serve any slots.
+        """
+        addresses = list(dict.fromkeys([*self._nodes, *self._settings.startup_nodes]))
+        exc: Optional[Exception] = None
+        for address in addresses:
+            try:
+                slots = await self._pool(address).execute((b'CLUSTER', b'SLOTS'))
+            except (OSError, ConnectionError) as e:
+                exc = e
+            else:
+                self._set_slots(address, slots)
+                stale = [self._pools.pop(a) for a in list(self._pools) if a not in self._nodes]
+                await asyncio.gather(*[pool.close() for pool in stale])
+                return
+        raise ConnectionError(f'unable to load cluster slots from any of {addresses}') from exc
+
+    async def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> Any:
+        command = args[0]
+        if command == b'MGET':
+            values = await self._mget(args[1:], return_as)
+            # the callback applies to the whole reply, e.g. converting the values to an array
+            return values if callback is None else apply_callback(values, callback)
+        elif command == b'MSET':
+            return await self._mset(args[1:])
+        elif command in broadcast_commands:
+            results = await asyncio.gather(*[self._pool(a).execute(args, return_as, callback) for a in self._nodes])
+            return results[0]
+        elif command in script_commands:
+            # the first key is after the script and the number of keys, scripts without keys go to a random node
+            if int(args[2]) > 0:
+                return await self._execute_slot(key_slot(self._key(args[3])), args, return_as, callback)
+            return await self._pool(random.choice(self._nodes)).execute(args, return_as, callback)
+        elif command in keyless_commands or len(args) < 2:
+            return await self._pool(random.choice(self._nodes)).execute(args, return_as, callback)
+        else:
+            return await self._execute_slot(key_slot(self._key(args[1])), args, return_as, callback)
+
+    def _register_script(self, script: Script) -> None:
+        self.scripts[script.sha] = script
+        for pool in self._pools.values():
+            pool.register_script(script)
+
+    async def _execute_slot(
+        self,
+        slot: int,
+        args: CommandArgs,
+        return_as: ReturnAs,
+        callback: Optional[Callback],
+        error: Optional[ReplyError] = None,
+    ) -> Any:
+        """
+        Execute a command on the node serving slot following redirects, if error is set it's the reply to the
+        command having already been sent.
+        """
+        address = self._node(slot)
+        asking = False
+        redirects = 0
+        while True:
+            if error is None:
+                pool = self._pool(address)
+                try:
+                    if asking:
+                        # ASKING must be sent on the same connection immediately before the command
+                        commands = [((b'ASKING',), 'ok', None), (args, return_as, callback)]
+                        return (await pool.execute_many(commands))[1]
+                    else:
+                        return await pool.execute(args, return_as, callback)
+                except ReplyError as e:
+                    error = e
+
+            redirect = _parse_redirect(error)
+            if redirect is None or redirects >= self._settings.max_redirects:
+                raise error
+            redirects += 1
+            kind, address = redirect
+            asking = kind == 'ASK'
+            if not asking:
+                # the slot has moved permanently, refresh the whole map since other slots have probably moved too
+                self._slots[slot] = address
+                self._refresh_soon()
+            error = None
+
+    async def _mget(self, keys: CommandArgs, return_as: ReturnAs) -> List[Any]:
+        by_slot: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            by_slot.setdefault(key_slot(self._key(key)), []).append(i)
+
+        slot_args = {slot: [b'MGET', *(keys[i] for i in indices)] for slot, indices in by_slot.items()}
+        results = await self._execute_split(slot_args, return_as)
+
+        values: List[Any] = [None] * len(keys)
+        for slot, indices in by_slot.items():
+            for i, value in zip(indices, results[slot]):
+                values[i] = value
+        return values
+
+    async def _mset(self, pairs: CommandArgs) -> None:
+        slot_args: Dict[int, List[ArgType]] = {}
+        for i in range(0, len(pairs), 2):
+            args = slot_args.setdefault(key_slot(self._key(pairs[i])), [b'MSET'])
+            args += pairs[i], pairs[i + 1]
+        await self._execute_split(slot_args, 'ok')
+
+    async def _execute_split(self, slot_args: Dict[int, List[ArgType]], return_as: ReturnAs) -> Dict[int, Any]:
+        """
+        Execute one command per slot, commands for the same node are sent together on one connection.
+        """
+        by_node: Dict[Address, List[int]] = {}
+        for slot in slot_args:
+            by_node.setdefault(self._node(slot), []).append(slot)
+
+        results: Dict[int, Any] = {}
+
+        async def execute_node(address: Address, slots: List[int]) -> None:
+            pool = self._pool(address)
+            conn = await pool.acquire()
+            try:
+                replies = await asyncio.gather(
+                    *[conn.execute(slot_args[slot], return_as) for slot in slots], return_exceptions=True
+                )
+            finally:
+                pool.release(conn)
+            for slot, reply in zip(slots, replies):
+                if isinstance(reply, ReplyError):
+                    reply = await self._execute_slot(slot, slot_args[slot], return_as, None, reply)
+                elif isinstance(reply, BaseException):
+                    raise reply
+                results[slot] = reply
+
+        await asyncio.gather(*[execute_node(address, slots) for address, slots in by_node.items()])
+        return results
+
+    def _node(self, slot: int) -> Address:
+        address = self._slots[slot]
+        if address is None:
+            raise RuntimeError(f'slot {slot} is not served by any node')
+        return address
+
+    def _pool(self, address: Address) -> ConnectionPool:
+        pool = self._pools.get(address)
+        if pool is None:
+            s = self._conn_settings
+            conn_settings = ConnectionSettings(
+                host=address[0],
+                port=address[1],
+                password=s.password,
+                encoding=s.encoding,
+                protocol=s.protocol,
+                parser=s.parser,
+                metrics=s.metrics,
+                command_timeout=s.command_timeout,
+                stuck_timeout=s.stuck_timeout,
+                offload_threshold=s.offload_threshold,
+                executor=s.executor,
+                tcp_nodelay=s.tcp_nodelay,
+                tcp_keepalive=s.tcp_keepalive,
+                recv_buffer_size=s.recv_buffer_size,
+                send_buffer_size=s.send_buffer_size,
+                read_limit=s.read_limit,
+                max_read_limit=s.max_read_limit,
+            )
+            pool = self._pools[address] = ConnectionPool(conn_settings, self._pool_settings)
+            pool.scripts = self.scripts
+        return pool
+
+    def _key(self, key: ArgType) -> bytes:
+        if isinstance(key, bytes):
+            return key
+        elif isinstance(key, str):
+            return key.encode(self._conn_settings.encoding)
+        elif isinstance(key, (int, float)):
+            return str(key).encode()
+        else:
+            return bytes(key)
+
+    def _set_slots(self, queried: Address, slots: List[List[Any]]) -> None:
+        new_slots: List[Optional[Address]] = [None] * SLOTS
+        nodes: Dict[Address, None] = {}
+        for start, end, primary, *_ in slots:
+            host = primary[0].decode() if isinstance(primary[0], bytes) else primary[0]
+            # an empty host means the node we asked
+            address = (host or queried[0], int(primary[1]))
+            nodes[address] = None
+            new_slots[start : end + 1] = [address] * (end + 1 - start)
+        self._slots = new_slots
+        self._nodes = list(nodes)
+
+    def _refresh_soon(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self._loop.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except ConnectionError:
+            # the slot map is refreshed again after the next redirect
+            pass
+
+
+def _parse_redirect(error: ReplyError) -> Optional[Tuple[str, Address]]:
+    """
+    Parse "MOVED <slot> <host>:<port>" and "ASK <slot> <host>:<port>" errors.
+    """
+    parts = str(error).split(' ')
+    if len(parts) == 3 and parts[0] in ('MOVED', 'ASK'):
+        host, _, port = parts[2].rpartition(':')
+        if host and port.isdigit():
+            return parts[0], (host, int(port))
+    return None
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import pickle
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame  # type: ignore
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+__all__ = 'Codec', 'BytesCodec', 'JsonCodec', 'PickleCodec', 'MsgpackCodec', 'CompressedCodec'
+
+# first byte of values encoded by CompressedCodec, the algorithm the rest of the value is compressed with
+_uncompressed_id = b'\x00'
+_zlib_id = b'z'
+_lz4_id = b'4'
+
+
+class Codec(ABC):
+    """
+    Converts values to the bytes stored in redis and back, see Redis.with_codec. Subclass and implement encode and
+    decode to use a custom format.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        ...
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        ...
+
+    def decode_reply(self, data: Optional[bytes]) -> Any:
+        """
+        Decode the reply to e.g. GET, None where the key doesn't exist.
+        """
+        return None if data is None else self.decode(data)
+
+    def decode_replies(self, data: List[Optional[bytes]]) -> List[Any]:
+        """
+        Decode the reply to MGET.
+        """
+        return [None if d is None else self.decode(d) for d in data]
+
+
+class BytesCodec(Codec):
+    """
+    bytes are stored as they are and other values as strings, values are returned as bytes. Mostly useful with
+    CompressedCodec.
+    """
+
+    __slots__ = ('encoding',)
+
+    def __init__(self, encoding: str = 'utf8'):
+        self.encoding = encoding
+
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        elif isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
+        return str(value).encode(self.encoding)
+
+    def decode(self, data: bytes) -> Any:
+        return data
+
+
+class JsonCodec(Codec):
+    __slots__ = ()
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class PickleCodec(Codec):
+    """
+    Values are pickled, only use this if nothing untrusted can write to redis.
+    """
+
+    __slots__ = ('protocol',)
+
+    def __init__(self, protocol: int = pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=self.protocol)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """
+    Values are encoded with msgpack, which must be installed.
+    """
+
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImportError('msgpack must be installed to use MsgpackCodec')
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data)
+
+
+class CompressedCodec(Codec):
+    """
+    Values encoded by codec which are at least threshold bytes long are compressed with zlib or lz4 (lz4 must be
+    installed), values where compression doesn't save space are stored uncompressed.
+
+    Every value is prefixed with one byte for the algorithm it's compressed with, or none, so values written with
+    either algorithm can be read whatever the settings. Values not written by a CompressedCodec can't be decoded.
+    """
+
+    __slots__ = 'codec', 'compression', 'threshold', 'level', '_header'
+
+    def __init__(
+        self,
+        codec: Optional[Codec] = None,
+        compression: str = 'zlib',
+        threshold: int = 1024,
+        level: Optional[int] = None,
+    ):
+        if compression == 'zlib':
+            self._header = _zlib_id
+        elif compression == 'lz4':
+            if lz4_frame is None:
+                raise ImportError('lz4 must be installed to use lz4 compression')
+            self._header = _lz4_id
+        else:
+            raise ValueError(f'invalid compression {compression!r}, must be "zlib" or "lz4"')
+        self.codec = codec or BytesCodec()
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        data = self.codec.encode(value)
+        if len(data) < self.threshold:
+            return _uncompressed_id + data
+        if self.compression == 'zlib':
+            compressed = zlib.compress(data, -1 if self.level is None else self.level)
+        else:
+            compressed = lz4_frame.compress(data, compression_level=self.level or 0)
+        if len(compressed) >= len(data):
+            return _uncompressed_id + data
+        return self._header + compressed
+
+    def decode(self, data: bytes) -> Any:
+        algorithm, body = data[:1], memoryview(data)[1:]
+        if algorithm == _uncompressed_id:
+            data = bytes(body)
+        elif algorithm == _zlib_id:
+            data = zlib.decompress(body)
+        elif algorithm == _lz4_id:
+            if lz4_frame is None:
+                raise ImportError('lz4 must be installed to decode lz4 compressed values')
+            data = lz4_frame.decompress(body)
+        else:
+            raise ValueError(f'invalid compression header {algorithm!r}, value not written by CompressedCodec')
+        return self.codec.decode(data)
+
+    def __repr__(self) -> str:
+        return (
+            f'CompressedCodec(codec={self.codec!r}, compression={self.compression!r}, threshold={self.threshold}, '
+            f'level={self.level!r})'
+        )
@@ -2,23 +2,49 @@ from __future__ import annotations
 
 from abc import abstractmethod
 from datetime import datetime
-from typing import Any, Coroutine, Dict, List, Optional, Tuple, TypeVar, Union
+from functools import partial
+from typing import Any, Coroutine, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 
-from .typing import ArgType, CommandArgs, Literal, ReturnAs
-from .utils import apply_callback
+from .arrays import ArrayType, number_args, to_array, to_scored_array
+from .codecs import Codec
+from .scripts import Script
+from .typing import ArgType, Callback, CommandArgs, Literal, ReturnAs
 
 __all__ = ('AbstractCommands',)
 
 
-T = TypeVar('T', bytes, str, int, float, 'None')
+T = TypeVar('T')
 Result = Coroutine[Any, Any, T]
 
 
 class AbstractCommands:
+    # converts the values of string commands to and from bytes, see Redis.with_codec
+    _codec: Optional[Codec] = None
+
     @abstractmethod
-    def _execute(self, args: CommandArgs, return_as: ReturnAs) -> Any:
+    def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> Any:
         ...
 
+    @abstractmethod
+    def _register_script(self, script: Script) -> None:
+        """
+        Register a script with the client and load it on its connections, see register_script.
+        """
+
+    def _value(self, value: Any) -> ArgType:
+        return value if self._codec is None else self._codec.encode(value)
+
+    def _value_reply(self, decode: bool, many: bool = False) -> Tuple[ReturnAs, Optional[Callback]]:
+        """
+        How to convert replies containing values, with a codec values are decoded by it unless decode is False.
+        """
+        if not decode:
+            return None, None
+        elif self._codec is None:
+            return 'str', None
+        else:
+            return None, self._codec.decode_replies if many else self._codec.decode_reply
+
     """
     String commands, see http://redis.io/commands/#string
     """
@@ -40,7 +66,13 @@ class AbstractCommands:
             raise TypeError('both start and stop must be specified, or neither')
         return self._execute(command, 'int')
 
-    # TODO bitfield
+    def bitfield(self, key: ArgType, *args: ArgType, array: Optional[ArrayType] = None) -> Result[Any]:
+        """
+        Perform arbitrary bitfield integer operations on strings, args are the operations e.g.
+        'GET', 'u8', 0, 'INCRBY', 'i5', 100, 1. Returns a list of the results, or an array if array is set,
+        see ArrayType.
+        """
+        return self._execute((b'BITFIELD', key, *args), None, self._array_reply(array))
 
     def bitop(
         self, dest: ArgType, op: Literal['AND', 'OR', 'XOR', 'NOT'], key: ArgType, *keys: ArgType
@@ -79,7 +111,7 @@ class AbstractCommands:
         """
         Get the value of a key.
         """
-        return self._execute((b'GET', key), 'str' if decode else None)
+        return self._execute((b'GET', key), *self._value_reply(decode))
 
     def getbit(self, key: ArgType, offset: int) -> Result[int]:
         """
@@ -97,7 +129,7 @@ class AbstractCommands:
         """
         Set the string value of a key and return its old value.
         """
-        return self._execute((b'GETSET', key, value), 'str' if decode else None)
+        return self._execute((b'GETSET', key, self._value(value)), *self._value_reply(decode))
 
     def incr(self, key: ArgType) -> Result[int]:
         """
@@ -117,11 +149,16 @@ class AbstractCommands:
         """
         return self._execute((b'INCRBYFLOAT', key, increment), 'float')
 
-    def mget(self, key: ArgType, *keys: ArgType, decode: bool = True) -> Result[str]:
+    def mget(self, key: ArgType, *keys: ArgType, decode: bool = True, array: Optional[ArrayType] = None) -> Result[Any]:
         """
         Get the values of all the given keys.
+
+        If array is set the values must be numbers and are returned as an array, missing values are NaN for float
+        arrays and 0 otherwise, see ArrayType.
         """
-        return self._execute((b'MGET', key, *keys), 'str' if decode else None)
+        if array is not None:
+            return self._execute((b'MGET', key, *keys), None, self._array_reply(array))
+        return self._execute((b'MGET', key, *keys), *self._value_reply(decode, many=True))
 
     def mset(self, *args: Tuple[ArgType, ArgType], **kwargs: ArgType) -> Result[None]:
         """
@@ -129,9 +166,9 @@ class AbstractCommands:
         """
         command: List[ArgType] = [b'MSET']
         for k1, v1 in args:
-            command.extend([k1, v1])
+            command.extend([k1, self._value(v1)])
         for k2, v2 in kwargs.items():
-            command.extend([k2, v2])
+            command.extend([k2, self._value(v2)])
 
         return self._execute(command, 'ok')
 
@@ -141,9 +178,9 @@ class AbstractCommands:
         """
         command: List[ArgType] = [b'MSETNX']
         for k1, v1 in args:
-            command.extend([k1, v1])
+            command.extend([k1, self._value(v1)])
         for k2, v2 in kwargs.items():
-            command.extend([k2, v2])
+            command.extend([k2, self._value(v2)])
 
         return self._execute(command, 'int')
 
@@ -151,7 +188,7 @@ class AbstractCommands:
         """
         Set the value and expiration in milliseconds of a key.
         """
-        return self._execute((b'PSETEX', key, milliseconds, value), 'ok')
+        return self._execute((b'PSETEX', key, milliseconds, self._value(value)), 'ok')
 
     def set(
         self,
@@ -166,7 +203,7 @@ class AbstractCommands:
         """
         Set the string value of a key.
         """
-        args = [b'SET', key, value]
+        args = [b'SET', key, self._value(value)]
         if expire:
             args.extend([b'EX', expire])
         if pexpire:
@@ -193,13 +230,13 @@ class AbstractCommands:
         if isinstance(seconds, float):
             return self.psetex(key, int(seconds * 1000), value)
         else:
-            return self._execute((b'SETEX', key, seconds, value), 'ok')
+            return self._execute((b'SETEX', key, seconds, self._value(value)), 'ok')
 
     def setnx(self, key: ArgType, value: ArgType) -> Result[bool]:
         """
         Set the value of a key, only if the key does not exist.
         """
-        return self._execute((b'SETNX', key, value), 'bool')
+        return self._execute((b'SETNX', key, self._value(value)), 'bool')
 
     def setrange(self, key: ArgType, offset: int, value: ArgType) -> Result[int]:
         """
@@ -215,6 +252,94 @@ class AbstractCommands:
         """
         return self._execute((b'STRLEN', key), 'int')
 
+    """
+    List commands, see http://redis.io/commands/#list
+    """
+
+    def lrange(
+        self, key: ArgType, start: int, stop: int, *, decode: bool = True, array: Optional[ArrayType] = None
+    ) -> Result[Any]:
+        """
+        Get a range of elements from a list, if array is set the elements must be numbers and are returned as an
+        array, see ArrayType.
+        """
+        if array is not None:
+            return self._execute((b'LRANGE', key, start, stop), None, self._array_reply(array))
+        return self._execute((b'LRANGE', key, start, stop), 'str' if decode else None)
+
+    """
+    Sorted set commands, see http://redis.io/commands/#sorted_set
+    """
+
+    def zadd(
+        self,
+        key: ArgType,
+        scores: Sequence[float],
+        members: Sequence[ArgType],
+        *,
+        nx: bool = False,
+        xx: bool = False,
+        ch: bool = False,
+    ) -> Result[int]:
+        """
+        Add members with the matching scores to a sorted set, or update their scores if they already exist. scores
+        may be an array.array or numpy array, scores are encoded in one go with number_args.
+        """
+        if len(scores) != len(members):
+            raise ValueError('scores and members must be the same length')
+        command: List[ArgType] = [b'ZADD', key]
+        if nx:
+            command.append(b'NX')
+        if xx:
+            command.append(b'XX')
+        if ch:
+            command.append(b'CH')
+        pairs: List[ArgType] = [b''] * (len(members) * 2)
+        pairs[0::2] = number_args(scores)
+        pairs[1::2] = members
+        command += pairs
+        return self._execute(command, 'int')
+
+    def zrange(
+        self,
+        key: ArgType,
+        start: int,
+        stop: int,
+        *,
+        withscores: bool = False,
+        decode: bool = True,
+        array: Optional[ArrayType] = None,
+    ) -> Result[Any]:
+        """
+        Get a range of members of a sorted set by index, with withscores a list of members and their scores.
+
+        If array is set with withscores a list of members and an array of their scores is returned, without
+        withscores the members must be numbers and are returned as an array, see ArrayType.
+        """
+        command: List[ArgType] = [b'ZRANGE', key, start, stop]
+        return_as: ReturnAs = 'str' if decode else None
+        if not withscores:
+            if array is not None:
+                return self._execute(command, None, self._array_reply(array))
+            return self._execute(command, return_as)
+
+        command.append(b'WITHSCORES')
+        if array is not None:
+            return self._execute(command, return_as, partial(to_scored_array, array_type=array))
+        return self._execute(command, return_as, self._to_scored_members)
+
+    @staticmethod
+    def _array_reply(array: Optional[ArrayType]) -> Optional[Callback]:
+        return None if array is None else partial(to_array, array_type=array)
+
+    @staticmethod
+    def _to_scored_members(items: List[Any]) -> List[Tuple[Any, float]]:
+        if items and isinstance(items[0], list):
+            # RESP3 replies are pairs of member and score
+            return [(member, float(score)) for member, score in items]
+        it = iter(items)
+        return [(member, float(score)) for member, score in zip(it, it)]
+
     """
     For commands, see http://redis.io/commands/#server
     """
@@ -299,10 +424,13 @@ class AbstractCommands:
 
         If called without argument will return all parameters.
         """
-        return apply_callback(self._execute((b'CONFIG', b'GET', parameter), 'str'), self._config_as_dict)
+        return self._execute((b'CONFIG', b'GET', parameter), 'str', self._config_as_dict)
 
     @staticmethod
-    def _config_as_dict(v: List[str]) -> Dict[str, str]:
+    def _config_as_dict(v: Union[List[str], Dict[str, str]]) -> Dict[str, str]:
+        if isinstance(v, dict):
+            # RESP3 replies are already a map
+            return v
         it = iter(v)
         return dict(zip(it, it))
 
@@ -392,7 +520,7 @@ class AbstractCommands:
 
         If called without argument will return default set of sections.
         """
-        return apply_callback(self._execute((b'INFO', section), 'str'), self._parse_info)
+        return self._execute((b'INFO', section), 'str', self._parse_info)
 
     @staticmethod
     def _parse_info(info: str) -> Dict[str, Any]:
@@ -488,9 +616,159 @@ class AbstractCommands:
         """
         Return current server time.
         """
-        return apply_callback(self._execute((b'TIME',), 'int'), self._to_time)
+        return self._execute((b'TIME',), 'int', self._to_time)
 
     @staticmethod
     def _to_time(obj: Tuple[int, int]) -> datetime:
         s, ms = obj
         return datetime.fromtimestamp(s + ms / 1_000_000)
+
+    """
+    Scan commands, see http://redis.io/commands/scan, for iterating over all pages see Redis.scan_iter etc.
+    """
+
+    def scan(
+        self,
+        cursor: int = 0,
+        *,
+        match: Optional[ArgType] = None,
+        count: Optional[int] = None,
+        type: Optional[str] = None,
+        decode: bool = True,
+    ) -> Result[Tuple[int, List[str]]]:
+        """
+        Get a page of keys, returns the next cursor and the keys.
+        """
+        command = self._scan_args([b'SCAN', cursor], match, count)
+        if type is not None:
+            command.extend([b'TYPE', type])
+        return self._execute(command, 'str' if decode else None, self._to_scan_page)
+
+    def sscan(
+        self,
+        key: ArgType,
+        cursor: int = 0,
+        *,
+        match: Optional[ArgType] = None,
+        count: Optional[int] = None,
+        decode: bool = True,
+    ) -> Result[Tuple[int, List[str]]]:
+        """
+        Get a page of the members of a set, returns the next cursor and the members.
+        """
+        command = self._scan_args([b'SSCAN', key, cursor], match, count)
+        return self._execute(command, 'str' if decode else None, self._to_scan_page)
+
+    def hscan(
+        self,
+        key: ArgType,
+        cursor: int = 0,
+        *,
+        match: Optional[ArgType] = None,
+        count: Optional[int] = None,
+        decode: bool = True,
+    ) -> Result[Tuple[int, Dict[str, str]]]:
+        """
+        Get a page of the fields and values of a hash, returns the next cursor and a dict of fields and values.
+        """
+        command = self._scan_args([b'HSCAN', key, cursor], match, count)
+        return self._execute(command, 'str' if decode else None, self._to_hscan_page)
+
+    def zscan(
+        self,
+        key: ArgType,
+        cursor: int = 0,
+        *,
+        match: Optional[ArgType] = None,
+        count: Optional[int] = None,
+        decode: bool = True,
+    ) -> Result[Tuple[int, List[Tuple[str, float]]]]:
+        """
+        Get a page of the members of a sorted set, returns the next cursor and a list of members and their scores.
+        """
+        command = self._scan_args([b'ZSCAN', key, cursor], match, count)
+        return self._execute(command, 'str' if decode else None, self._to_zscan_page)
+
+    @staticmethod
+    def _scan_args(command: List[ArgType], match: Optional[ArgType], count: Optional[int]) -> List[ArgType]:
+        if match is not None:
+            command.extend([b'MATCH', match])
+        if count is not None:
+            command.extend([b'COUNT', count])
+        return command
+
+    @staticmethod
+    def _to_scan_page(obj: Tuple[Union[str, bytes], List[Any]]) -> Tuple[int, List[Any]]:
+        cursor, items = obj
+        return int(cursor), items
+
+    @staticmethod
+    def _to_hscan_page(obj: Tuple[Union[str, bytes], List[Any]]) -> Tuple[int, Dict[Any, Any]]:
+        cursor, items = obj
+        it = iter(items)
+        return int(cursor), dict(zip(it, it))
+
+    @staticmethod
+    def _to_zscan_page(obj: Tuple[Union[str, bytes], List[Any]]) -> Tuple[int, List[Tuple[Any, float]]]:
+        cursor, items = obj
+        it = iter(items)
+        return int(cursor), [(member, float(score)) for member, score in zip(it, it)]
+
+    """
+    Scripting commands, see http://redis.io/commands/#scripting
+    """
+
+    def eval(
+        self, script: ArgType, keys: Sequence[ArgType] = (), args: Sequence[ArgType] = (), *, decode: bool = True
+    ) -> Result[Any]:
+        """
+        Execute a Lua script, register_script is generally a better option since the script is only sent once.
+        """
+        return self._execute((b'EVAL', script, len(keys), *keys, *args), 'str' if decode else None)
+
+    def evalsha(
+        self, sha: ArgType, keys: Sequence[ArgType] = (), args: Sequence[ArgType] = (), *, decode: bool = True
+    ) -> Result[Any]:
+        """
+        Execute a Lua script by its SHA1 digest, scripts created with register_script are loaded and the command
+        retried if redis replies NOSCRIPT.
+        """
+        return self._execute((b'EVALSHA', sha, len(keys), *keys, *args), 'str' if decode else None)
+
+    def register_script(self, source: Union[str, bytes]) -> Script:
+        """
+        Create a Script which is run with EVALSHA and register it with this client, it's loaded on the client's
+        connections straight away, on all its new connections and whenever redis replies NOSCRIPT, call it with
+        this object or a pipeline: "await script(redis, keys, args)".
+        """
+        script = Script(source)
+        self._register_script(script)
+        return script
+
+    def script_exists(self, sha: ArgType, *shas: ArgType) -> Result[List[bool]]:
+        """
+        Check existence of scripts in the script cache.
+        """
+        return self._execute((b'SCRIPT', b'EXISTS', sha, *shas), 'bool')
+
+    def script_flush(self) -> Result[None]:
+        """
+        Remove all the scripts from the script cache.
+        """
+        return self._execute((b'SCRIPT', b'FLUSH'), 'ok')
+
+    def script_load(self, script: ArgType) -> Result[str]:
+        """
+        Load the specified Lua script into the script cache, returns its SHA1 digest.
+        """
+        return self._execute((b'SCRIPT', b'LOAD', script), 'str')
+
+    """
+    Pub/Sub commands, see http://redis.io/commands/#pubsub, for subscribing see PubSub
+    """
+
+    def publish(self, channel: ArgType, message: ArgType) -> Result[int]:
+        """
+        Post a message to a channel.
+        """
+        return self._execute((b'PUBLISH', channel, message), 'int')
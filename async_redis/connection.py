@@ -1,15 +1,35 @@
 from __future__ import annotations
 
-from asyncio import Lock, StreamWriter
+import socket
+import sys
+from asyncio import (
+    CancelledError,
+    Event,
+    Future,
+    Handle,
+    Lock,
+    Task,
+    TimeoutError,
+    get_event_loop,
+    wait,
+    wait_for,
+)
+from collections import deque
+from concurrent.futures import Executor
+from contextlib import suppress
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional, Sequence
+from mmap import mmap
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 from hiredis import hiredis
 
-from .streams import RedisStreamReader, open_connection
-from .typing import CommandArgs, ResultType, ReturnAs
+from .metrics import Metrics, command_name
+from .scripts import Script, Scripts, evalsha_script, noscript_script, script_load_commands
+from .streams import _push_type, BulkStream, RedisStreamReader, RedisWriter, SocketOption, open_connection
+from .typing import ArgType, Callback, Command, CommandArgs, Protocol, ResultType, ReturnAs
+from .utils import apply_callback
 
-__all__ = 'ConnectionSettings', 'create_raw_connection', 'RawConnection'
+__all__ = 'AbstractConnection', 'ConnectionSettings', 'create_raw_connection', 'open_stream', 'RawConnection'
 
 
 @dataclass
@@ -23,112 +43,811 @@ class ConnectionSettings:
     database: int = 0
     password: Optional[str] = None
     encoding: str = 'utf8'
+    # RESP protocol version, 3 is negotiated with HELLO and requires hiredis>=3.2
+    protocol: int = 2
+    # reply parser, see streams.parsers
+    parser: str = 'hiredis'
+    # metrics recorded by all connections created with these settings, see Metrics
+    metrics: Optional[Metrics] = None
+    # default deadline for commands in seconds, None for no deadline, see RawConnection.execute
+    command_timeout: Optional[float] = None
+    # the connection is closed if the reply to a command which timed out hasn't been received this long after
+    # the timeout
+    stuck_timeout: float = 10
+    # callbacks converting replies at least this many bytes long, e.g. parsing INFO or decoding values with a codec,
+    # are run in executor (by default the event loop's default executor) so they don't block the event loop,
+    # None to always run them on the event loop
+    offload_threshold: Optional[int] = None
+    executor: Optional[Executor] = None
+    # path of a unix socket to connect to instead of host and port
+    unix_socket: Optional[str] = None
+    # socket options, tcp_keepalive is the idle time in seconds before keepalive probes are sent, None to disable
+    # keepalive. Buffer sizes of None leave the OS defaults
+    tcp_nodelay: bool = True
+    tcp_keepalive: Optional[int] = None
+    recv_buffer_size: Optional[int] = None
+    send_buffer_size: Optional[int] = None
+    # reading from the socket is paused while more than twice read_limit bytes of replies are buffered, the limit
+    # is raised up to max_read_limit while replies bigger than it are received and lowered again afterwards
+    read_limit: int = 2 ** 16  # 64 KiB
+    max_read_limit: int = 2 ** 24  # 16 MiB
 
     def __repr__(self) -> str:
         # have to do it this way since asdict and __dict__ on dataclasses don't work with cython
-        fields = 'host', 'port', 'database', 'password', 'encoding'
+        fields = (
+            'host', 'port', 'database', 'password', 'encoding', 'protocol', 'parser', 'metrics', 'command_timeout',
+            'stuck_timeout', 'offload_threshold', 'executor', 'unix_socket', 'tcp_nodelay', 'tcp_keepalive',
+            'recv_buffer_size', 'send_buffer_size', 'read_limit', 'max_read_limit',
+        )
         return 'RedisSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
 
 
-async def create_raw_connection(conn_settings: ConnectionSettings) -> 'RawConnection':
+async def create_raw_connection(
+    conn_settings: ConnectionSettings, scripts: Optional[Scripts] = None
+) -> 'RawConnection':
     """
-    Connect to a redis database and create a new RawConnection.
+    Connect to a redis database and create a new RawConnection, scripts are the scripts registered with the client
+    the connection belongs to, they're loaded together with any other setup commands in one round trip.
     """
-    reader, writer = await open_connection(conn_settings.host, conn_settings.port)
-    return RawConnection(reader, writer, conn_settings.encoding)
+    if conn_settings.protocol == 3:
+        if _push_type is None:
+            raise RuntimeError('RESP3 requires hiredis>=3.2')
+    elif conn_settings.protocol != 2:
+        raise ValueError(f'invalid protocol {conn_settings.protocol!r}, must be 2 or 3')
+
+    reader, writer = await open_stream(conn_settings, conn_settings.parser)
+    conn = RawConnection(
+        reader, writer, conn_settings.encoding, conn_settings.metrics, conn_settings.command_timeout,
+        conn_settings.stuck_timeout, conn_settings.offload_threshold, conn_settings.executor,
+    )
+    commands: List[Command] = []
+    if conn_settings.protocol == 3:
+        command: List[ArgType] = [b'HELLO', 3]
+        if conn_settings.password is not None:
+            command += [b'AUTH', b'default', conn_settings.password]
+        commands.append((command, None, None))
+    if scripts is not None:
+        conn.scripts = scripts
+        # load all registered scripts so EVALSHA doesn't fail
+        commands += script_load_commands(list(scripts.values()))
+    if commands:
+        try:
+            await conn.execute_many(commands)
+        except BaseException:
+            await conn.close()
+            raise
+    return conn
+
+
+async def open_stream(
+    conn_settings: ConnectionSettings, parser: str = 'hiredis'
+) -> Tuple[RedisStreamReader, RedisWriter]:
+    """
+    Open a connection to redis as a reader and writer using the address, socket options and read limits of
+    conn_settings.
+    """
+    return await open_connection(
+        conn_settings.host,
+        conn_settings.port,
+        path=conn_settings.unix_socket,
+        limit=conn_settings.read_limit,
+        max_limit=conn_settings.max_read_limit,
+        parser=parser,
+        socket_options=_socket_options(conn_settings),
+    )
+
+
+def _socket_options(s: ConnectionSettings) -> List[SocketOption]:
+    options: List[SocketOption] = []
+    if s.unix_socket is None:
+        if not s.tcp_nodelay:
+            # asyncio enables TCP_NODELAY on all TCP connections
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 0))
+        if s.tcp_keepalive is not None:
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            # TCP_KEEPIDLE is called TCP_KEEPALIVE on macOS
+            idle = getattr(socket, 'TCP_KEEPIDLE', None) or getattr(socket, 'TCP_KEEPALIVE', None)
+            if idle is not None:
+                options.append((socket.IPPROTO_TCP, idle, s.tcp_keepalive))
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(s.tcp_keepalive // 3, 1)))
+    if s.recv_buffer_size is not None:
+        options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, s.recv_buffer_size))
+    if s.send_buffer_size is not None:
+        options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, s.send_buffer_size))
+    return options
 
 
 default_ok_msg: bytes = b'OK'
-return_as_lookup: Dict[str, Callable[[bytes], Any]] = {
+# used as the timeout argument to mean the connection's command_timeout
+default_timeout: Any = object()
+# execute() waits for the transport to drain when its write buffer exceeds this size
+_write_high_water = 2 ** 16  # 64 KiB
+# arguments at least this big are passed to the transport as separate buffers rather than being copied
+_zero_copy_threshold = 2 ** 16  # 64 KiB
+
+if sys.version_info >= (3, 12):
+
+    def _write_chunks(writer: RedisWriter, chunks: List[Union[bytes, bytearray, memoryview]]) -> None:
+        # writelines uses sendmsg so the chunks are never joined
+        writer.writelines(chunks)
+
+
+else:
+
+    def _write_chunks(writer: RedisWriter, chunks: List[Union[bytes, bytearray, memoryview]]) -> None:
+        # writelines joins the chunks before writing, writing them individually avoids that copy
+        for chunk in chunks:
+            writer.write(chunk)
+
+
+# conversions done by the parser, bool is converted afterwards since parsers use False to mean "no reply yet"
+return_as_lookup: Dict[str, Callable[[Any], Any]] = {
     'int': int,
     'float': float,
-    'bool': bool,
 }
 
 
+def _reply_size(reply: Any, limit: int) -> int:
+    """
+    Approximate size of a parsed reply in bytes, counting stops once limit is reached.
+    """
+    if isinstance(reply, (bytes, str)):
+        return len(reply)
+    elif isinstance(reply, list):
+        size = 0
+        for item in reply:
+            # each item costs at least a few bytes on the wire
+            size += max(_reply_size(item, limit - size), 4)
+            if size >= limit:
+                break
+        return size
+    return 0
+
+
+class AbstractConnection(Protocol):
+    """
+    Interface Redis, pipelines and transactions use to execute commands, implemented by RawConnection,
+    ConnectionPool and ShardedConnection.
+    """
+
+    async def execute(
+        self,
+        args: CommandArgs,
+        return_as: ReturnAs = None,
+        callback: Optional[Callback] = None,
+        timeout: Optional[float] = default_timeout,
+    ) -> Any:
+        ...
+
+    async def execute_many(self, commands: Sequence[Command], timeout: Optional[float] = default_timeout) -> List[Any]:
+        ...
+
+    async def execute_transaction(
+        self, commands: Sequence[Command], *, timeout: Optional[float] = default_timeout
+    ) -> Optional[List[Any]]:
+        ...
+
+    async def execute_stream(self, args: CommandArgs) -> Optional[BulkStream]:
+        ...
+
+    def register_script(self, script: Script) -> None:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
 class RawConnection:
     """
     Low level interface to write to and read from redis.
 
+    Commands from any number of coroutines are written as soon as they're issued, writes made in the same
+    iteration of the event loop are merged into one write. Replies are matched to callers via a FIFO queue of
+    futures.
+
     You probably don't want to use this directly
     """
 
-    __slots__ = '_reader', '_writer', '_encoding', '_hi_raw', '_hi_enc', '_lock', '_expected_ok_msg'
+    __slots__ = (
+        '_reader',
+        '_writer',
+        '_encoding',
+        '_expected_ok_msg',
+        '_loop',
+        '_pending',
+        '_write_buf',
+        '_write_chunks',
+        '_write_handle',
+        '_hold_writes',
+        '_writes_released',
+        '_stream_fut',
+        '_drain_lock',
+        'watch_lock',
+        'scripts',
+        '_reply_type',
+        '_push_handler',
+        '_metrics',
+        '_metric_starts',
+        '_command_timeout',
+        '_stuck_timeout',
+        '_timed_out',
+        '_offload_threshold',
+        '_executor',
+        '_stream_task',
+        '_exc',
+    )
 
-    def __init__(self, reader: RedisStreamReader, writer: StreamWriter, encoding: str):
+    def __init__(
+        self,
+        reader: RedisStreamReader,
+        writer: RedisWriter,
+        encoding: str,
+        metrics: Optional[Metrics] = None,
+        command_timeout: Optional[float] = None,
+        stuck_timeout: float = 10,
+        offload_threshold: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ):
         self._reader = reader
         self._writer = writer
         self._encoding = encoding
-        self._lock = Lock()
-        self._hi_raw = reader.hi_reader
-        self._hi_enc = hiredis.Reader(encoding=encoding)
         self._expected_ok_msg: bytes = default_ok_msg
+        self._loop = get_event_loop()
+        self._pending: Deque[Tuple[Future[Any], ReturnAs, Optional[Callback]]] = deque()
+        self._write_buf = bytearray()
+        # buffers to write before _write_buf, large arguments are queued here to avoid copying them
+        self._write_chunks: List[Union[bytes, bytearray, memoryview]] = []
+        self._write_handle: Optional[Handle] = None
+        # see execute_stream
+        self._hold_writes = False
+        self._writes_released = Event()
+        self._stream_fut: Optional[Future[Any]] = None
+        self._drain_lock = Lock()
+        # held while keys are watched, transactions from other callers wait since EXEC would cancel the watches
+        self.watch_lock = Lock()
+        # scripts registered with the client, EVALSHA of one of them is retried after loading it if redis replies
+        # NOSCRIPT, shared by all connections of a pool, see AbstractCommands.register_script
+        self.scripts: Scripts = {}
+        # the reply type the parser is set to, see _read_replies
+        self._reply_type: ReturnAs = None
+        self._push_handler: Optional[Callable[[List[Any]], None]] = None
+        # when metrics are enabled the name of each pending command and when it was queued
+        self._metrics = metrics
+        self._metric_starts: Deque[Tuple[str, float]] = deque()
+        reader.metrics = metrics
+        self._command_timeout = command_timeout
+        self._stuck_timeout = stuck_timeout
+        # futures of commands which timed out before their reply was read
+        self._timed_out: Set[Future[Any]] = set()
+        self._offload_threshold = offload_threshold
+        self._executor = executor
+        # reads the reply to a command from execute_stream, other replies are read as soon as they're received
+        self._stream_task: Optional[Task[None]] = None
+        self._exc: Optional[BaseException] = None
+        reader.on_data = self._on_data
 
-    async def execute(self, args: CommandArgs, return_as: ReturnAs = None) -> ResultType:
-        buf = bytearray()
-        self._encode_command(buf, args)
-        self._set_reader_encoding(return_as)
-        async with self._lock:
-            self._writer.write(buf)
-            del buf
-            await self._writer.drain()
-            return await self._read_result(return_as)
-
-    async def execute_many(self, commands: Sequence[CommandArgs], return_as: ReturnAs = None) -> List[ResultType]:
-        # TODO need tuples of command and return_as
-        buf = bytearray()
-        for args in commands:
-            self._encode_command(buf, args)
-        self._set_reader_encoding(None)
-        async with self._lock:
-            self._writer.write(buf)
-            del buf
-            await self._writer.drain()
-            # TODO need to raise an error but read all answers first
-            return [await self._read_result(return_as) for _ in range(len(commands))]
+    @property
+    def is_closed(self) -> bool:
+        return self._exc is not None or self._writer.is_closing()
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        return self._metrics
+
+    async def execute(
+        self,
+        args: CommandArgs,
+        return_as: ReturnAs = None,
+        callback: Optional[Callback] = None,
+        timeout: Optional[float] = default_timeout,
+    ) -> Any:
+        """
+        Execute a command, if the reply hasn't been received within timeout seconds (by default the connection's
+        command_timeout) asyncio.TimeoutError is raised. The reply is discarded when it arrives so the connection
+        can still be used, unless it doesn't arrive within stuck_timeout when the connection is closed.
+        """
+        deadline = self._deadline(timeout)
+        await self._maybe_drain(deadline)
+        fut = self._queue_command(args, return_as, callback)
+        if deadline is not None:
+            self._set_deadline([fut], deadline)
+        try:
+            return await fut
+        except hiredis.ReplyError as e:
+            script = noscript_script(args, e, self.scripts)
+            if script is None:
+                raise
+        # the script isn't in redis's script cache (e.g. after SCRIPT FLUSH or a restart), load it and retry within
+        # the time left of the original timeout
+        retry_timeout = None if deadline is None else deadline - self._loop.time()
+        retry = [*script_load_commands([script]), (args, return_as, callback)]
+        return (await self.execute_many(retry, retry_timeout))[1]
+
+    async def execute_many(self, commands: Sequence[Command], timeout: Optional[float] = default_timeout) -> List[Any]:
+        """
+        Execute many commands in one write, each reply is converted according to its command's return_as and
+        callback. If any command fails, the first error is raised once all replies have been read.
+
+        EVALSHA commands which fail with NOSCRIPT are retried after loading their scripts, so they run after
+        the other commands. timeout applies to the whole batch, see execute.
+        """
+        deadline = self._deadline(timeout)
+        await self._maybe_drain(deadline)
+        futures = [self._queue_command(args, return_as, callback) for args, return_as, callback in commands]
+        if deadline is not None:
+            self._set_deadline(futures, deadline)
+        results: List[Any] = []
+        retry: Dict[int, Script] = {}
+        for i, fut in enumerate(futures):
+            try:
+                results.append(await fut)
+            except Exception as e:
+                results.append(e)
+                script = noscript_script(commands[i][0], e, self.scripts)
+                if script is not None:
+                    retry[i] = script
+
+        if retry:
+            scripts = list({s.sha: s for s in retry.values()}.values())
+            retry_commands = [*script_load_commands(scripts), *(commands[i] for i in retry)]
+            retry_results = await self.execute_many(
+                retry_commands, None if deadline is None else deadline - self._loop.time()
+            )
+            for i, result in zip(retry, retry_results[len(scripts) :]):
+                results[i] = result
+
+        exc = next((r for r in results if isinstance(r, Exception)), None)
+        if exc is not None:
+            raise exc
+        return results
+
+    async def execute_transaction(
+        self, commands: Sequence[Command], *, watching: bool = False, timeout: Optional[float] = default_timeout
+    ) -> Optional[List[Any]]:
+        """
+        Execute commands in a MULTI/EXEC transaction, MULTI, the commands and EXEC are sent in one write and each
+        result in the reply to EXEC is converted according to its command's return_as and callback. If any command
+        fails, the first error is raised once all replies have been read. timeout applies as with execute_many.
+
+        Returns None if the transaction was aborted because a watched key was modified, watching should only be
+        set by the holder of watch_lock.
+        """
+        deadline = self._deadline(timeout)
+        await self._maybe_drain(deadline)
+        if not watching:
+            while self.watch_lock.locked():
+                async with self.watch_lock:
+                    pass
+
+        # EVALSHA can't be retried inside a transaction, so load the scripts first
+        scripts = {s.sha: s for s in (evalsha_script(c[0], self.scripts) for c in commands) if s is not None}
+        queue = [*script_load_commands(list(scripts.values())), ((b'MULTI',), 'ok', None)]
+        queue += [(args, None, None) for args, _, _ in commands]
+
+        futures: List[Future[Any]] = []
+        try:
+            for args, return_as, _ in queue:
+                futures.append(self._queue_command(args, return_as, None))
+            futures.append(self._queue_command((b'EXEC',), None, None))
+        except TypeError:
+            if len(futures) > len(scripts):
+                # MULTI has been sent
+                self._queue_command((b'DISCARD',), None, None)
+            raise
+        if deadline is not None:
+            self._set_deadline(futures, deadline)
+
+        exc: Optional[Exception] = None
+        replies: List[Any] = []
+        for fut in futures:
+            try:
+                replies.append(await fut)
+            except Exception as e:
+                # an error queuing a command is more useful than EXECABORT so the first error is raised
+                exc = exc or e
+        if exc is not None:
+            raise exc
+
+        exec_reply = replies[-1]
+        if exec_reply is None:
+            return None
+        elif self._offload(exec_reply) and any(callback is not None for _, _, callback in commands):
+            return await self._loop.run_in_executor(self._executor, self._convert_exec, exec_reply, commands)
+        return self._convert_exec(exec_reply, commands)
+
+    async def execute_stream(self, args: CommandArgs) -> Optional[BulkStream]:
+        """
+        Execute a command which replies with a bulk string and return a BulkStream of the value's chunks as they're
+        received rather than buffering the whole value, or None if the reply is nil.
+
+        Other commands can be executed while the stream is consumed, but their replies are only read once the
+        whole value has been received, so the stream should be consumed or closed promptly.
+        """
+        await self._maybe_drain()
+        while self._hold_writes:
+            # another streamed command is waiting for the start of its reply
+            await self._writes_released.wait()
+
+        # write everything queued so far, then hold back later writes until every earlier reply has been read,
+        # this way the reader can switch to streaming exactly where this reply starts
+        self._flush()
+        self._hold_writes = True
+        self._writes_released.clear()
+        try:
+            fut = self._queue_command(args, None, None)
+        except TypeError:
+            self._release_writes()
+            raise
+        self._stream_fut = fut
+        # the stream may start straight away if no earlier replies are pending
+        self._on_data()
+        return await fut
 
     async def close(self) -> None:
-        async with self._lock:
-            self._writer.close()
-            await self._writer.wait_closed()
+        """
+        Close the connection once the replies to pending commands have been received, commands whose replies don't
+        arrive within stuck_timeout fail with ConnectionError.
+        """
+        if self._pending:
+            _, not_done = await wait([p[0] for p in self._pending], timeout=self._stuck_timeout)
+            if not_done:
+                self._fail(ConnectionError('connection closed before all replies were received'))
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            with suppress(CancelledError):
+                await self._stream_task
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    def register_script(self, script: Script) -> None:
+        """
+        Add a script to scripts and load it, the load isn't waited for since it's run before any command queued
+        after it.
+        """
+        self.scripts[script.sha] = script
+        if self.is_closed:
+            return
+        ((args, return_as, callback),) = script_load_commands([script])
+        fut = self._queue_command(args, return_as, callback)
+        # if loading fails EVALSHA is retried after NOSCRIPT, retrieve the exception so it isn't logged
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
 
     def set_ok_msg(self, msg: bytes = default_ok_msg) -> None:
         self._expected_ok_msg = msg
 
-    def _set_reader_encoding(self, return_as: ReturnAs) -> None:
-        self._reader.hi_reader = self._hi_enc if return_as == 'str' else self._hi_raw
+    def set_push_handler(self, handler: Optional[Callable[[List[Any]], None]]) -> None:
+        """
+        Set a function to be called with RESP3 push messages (e.g. invalidation messages from CLIENT TRACKING),
+        without a handler push messages are discarded. Strings in push messages are always bytes.
+        """
+        self._push_handler = handler
 
-    async def _read_result(self, return_as: ReturnAs) -> ResultType:
-        result = await self._reader.read_redis()
+    def _queue_command(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback]) -> Future[Any]:
+        if self._exc is not None:
+            raise ConnectionError('redis connection lost') from self._exc
 
-        if return_as in (None, 'str'):
-            return result
-        elif return_as == 'ok':
-            if result != self._expected_ok_msg:
-                # TODO this needs to be deferred for execute_many
-                raise RuntimeError(f'unexpected result {result!r}')
-            return None
+        buf = self._write_buf
+        start, chunk_count = len(buf), len(self._write_chunks)
+        try:
+            self._encode_command(args)
+        except TypeError:
+            # remove the partially encoded command so it's never sent
+            if len(self._write_chunks) > chunk_count:
+                self._write_buf = buf
+                del self._write_chunks[chunk_count:]
+            del buf[start:]
+            raise
 
-        func = return_as_lookup[return_as]  # type: ignore
-        if isinstance(result, bytes):
-            return func(result)
+        fut: Future[Any] = self._loop.create_future()
+        self._pending.append((fut, return_as, callback))
+        if self._metrics is not None:
+            self._metrics.sent()
+            self._metric_starts.append((command_name(args), self._loop.time()))
+        if self._write_handle is None:
+            self._write_handle = self._loop.call_soon(self._flush)
+        return fut
+
+    def _flush(self) -> None:
+        if self._write_handle is not None:
+            self._write_handle.cancel()
+            self._write_handle = None
+        if self._hold_writes:
+            return
+        # the transport may keep a reference to the buffers, so we create new ones rather than clearing them
+        chunks = self._write_chunks
+        if self._metrics is not None:
+            self._metrics.bytes_written += len(self._write_buf) + sum(memoryview(c).nbytes for c in chunks)
+        if chunks:
+            self._write_chunks = []
+            if self._write_buf:
+                chunks.append(self._write_buf)
+                self._write_buf = bytearray()
+            _write_chunks(self._writer, chunks)
+        elif self._write_buf:
+            self._writer.write(self._write_buf)
+            self._write_buf = bytearray()
+
+    def _release_writes(self) -> None:
+        self._hold_writes = False
+        self._writes_released.set()
+        if self._write_handle is None:
+            self._write_handle = self._loop.call_soon(self._flush)
+
+    async def _maybe_drain(self, deadline: Optional[float] = None) -> None:
+        transport: Any = self._writer.transport
+        if transport.get_write_buffer_size() > _write_high_water:
+            if deadline is None:
+                async with self._drain_lock:
+                    await self._writer.drain()
+            else:
+                await wait_for(self._drain_locked(), deadline - self._loop.time())
+
+    async def _drain_locked(self) -> None:
+        async with self._drain_lock:
+            await self._writer.drain()
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        if timeout is default_timeout:
+            timeout = self._command_timeout
+        return None if timeout is None else self._loop.time() + timeout
+
+    def _set_deadline(self, futures: List[Future[Any]], deadline: float) -> None:
+        handle = self._loop.call_at(deadline, self._time_out, futures)
+        # cancel the timer once the last reply has been received, otherwise timers would pile up
+        futures[-1].add_done_callback(lambda _: handle.cancel())
+
+    def _time_out(self, futures: List[Future[Any]]) -> None:
+        timed_out = False
+        for fut in futures:
+            if not fut.done():
+                # the reply will be discarded when it's read, see _read_replies
+                fut.set_exception(TimeoutError('redis command timed out'))
+                self._timed_out.add(fut)
+                timed_out = True
+        if timed_out:
+            self._loop.call_later(self._stuck_timeout, self._check_stuck, futures)
+
+    def _check_stuck(self, futures: List[Future[Any]]) -> None:
+        if self._exc is None and any(fut in self._timed_out for fut in futures):
+            # replies aren't being received, the connection can't be used
+            self._writer.close()
+
+    def _on_data(self) -> None:
+        """
+        Called by the reader when data has been received or the connection has been lost.
+        """
+        if self._stream_task is not None or self._exc is not None:
+            return
+        try:
+            self._read_replies()
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, e: Exception) -> None:
+        self._exc = e
+        self._timed_out.clear()
+        while self._pending:
+            fut = self._pending.popleft()[0]
+            exc = ConnectionError(f'redis connection lost: {e!r}')
+            if not fut.done():
+                fut.set_exception(exc)
+            if self._metrics is not None:
+                self._record(exc)
+
+    def _read_replies(self) -> None:
+        """
+        Set the results of pending commands from every complete reply which has been received.
+        """
+        reader = self._reader
+        pending = self._pending
+        while True:
+            if not pending:
+                # no replies are expected, but there may be push messages
+                return_as: ReturnAs = None
+            else:
+                fut, return_as, callback = pending[0]
+                if fut is self._stream_fut:
+                    self._stream_fut = None
+                    self._set_reply_type(None)
+                    self._stream_task = self._loop.create_task(self._stream_reply(fut))
+                    return
+
+            if return_as != self._reply_type:
+                self._set_reply_type(return_as)
+
+            result = reader.read_nowait()
+            if result is False:
+                return
+            elif not pending or (_push_type is not None and isinstance(result, _push_type)):
+                self._on_push(result)
+                continue
+
+            pending.popleft()
+            if self._timed_out:
+                self._timed_out.discard(fut)
+            # if the future is done the caller was cancelled and the reply is discarded
+            error = None if fut.done() else self._set_reply(fut, result, return_as, callback)
+            if self._metrics is not None:
+                self._record(error)
+
+    def _set_reply_type(self, return_as: ReturnAs) -> None:
+        # strings are decoded and numbers converted by the parser
+        self._reply_type = return_as
+        self._reader.parser.set_reply_type(
+            self._encoding if return_as == 'str' else None, return_as_lookup.get(return_as)  # type: ignore
+        )
+
+    def _set_reply(
+        self, fut: Future[Any], result: Any, return_as: ReturnAs, callback: Optional[Callback]
+    ) -> Optional[Exception]:
+        """
+        Convert a reply and set it as the result of its future, returns the error if there was one.
+        """
+        try:
+            value = self._convert_result(result, return_as)
+            if callback is None:
+                fut.set_result(value)
+            elif self._offload(value):
+                self._apply_callback_in_executor(fut, value, callback)
+            else:
+                fut.set_result(apply_callback(value, callback))
+        except Exception as e:
+            fut.set_exception(e)
+            return e
+        return None
+
+    def _offload(self, reply: Any) -> bool:
+        """
+        Whether converting this reply should happen in the executor, see ConnectionSettings.offload_threshold.
+        """
+        threshold = self._offload_threshold
+        return threshold is not None and _reply_size(reply, threshold) >= threshold
+
+    def _apply_callback_in_executor(self, fut: Future[Any], value: Any, callback: Callback) -> None:
+        def set_result(executor_fut: Future[Any]) -> None:
+            # if fut is done the caller was cancelled or timed out
+            if fut.done():
+                return
+            elif executor_fut.cancelled():
+                fut.cancel()
+            elif executor_fut.exception() is not None:
+                fut.set_exception(executor_fut.exception())  # type: ignore
+            else:
+                fut.set_result(executor_fut.result())
+
+        self._loop.run_in_executor(self._executor, apply_callback, value, callback).add_done_callback(set_result)
+
+    async def _stream_reply(self, fut: Future[Any]) -> None:
+        try:
+            await self._read_stream(fut)
+        except Exception as e:
+            self._fail(e)
         else:
-            # result must be a list
-            return [func(r) for r in result]
+            self._stream_task = None
+            # replies received while the value was streamed
+            self._on_data()
 
-    def _to_str(self, b: bytes) -> str:
-        # TODO might be possible to change this once https://github.com/redis/hiredis-py/pull/96 gets released
-        return b.decode(self._encoding)
+    async def _read_stream(self, fut: Future[Any]) -> None:
+        """
+        Read the reply to a command from execute_stream, all earlier replies have been read.
+        """
+        reader = self._reader
+        reader.start_bulk()
+        self._release_writes()
+        result = await reader.read_bulk()
+        if _push_type is not None and isinstance(result, _push_type):
+            # a push message arrived first, the reply may already be buffered by hiredis so it can't be streamed
+            self._on_push(result)
+            result = await reader.read_redis()
+            if isinstance(result, bytes):
+                result = BulkStream.from_bytes(reader, result)
+        self._pending.popleft()
+        self._timed_out.discard(fut)
+        if self._metrics is not None:
+            self._record(result if isinstance(result, hiredis.ReplyError) else None)
+        if isinstance(result, BulkStream):
+            if fut.done():
+                # the caller was cancelled
+                result.close()
+            else:
+                fut.set_result(result)
+            # later replies follow the value, so wait until it's been received
+            await result.received
+        elif fut.done():
+            pass
+        elif result is None:
+            fut.set_result(None)
+        elif isinstance(result, hiredis.ReplyError):
+            fut.set_exception(result)
+        else:
+            fut.set_exception(RuntimeError(f'unexpected reply to streamed command {result!r}'))
 
-    def _encode_command(self, buf: bytearray, args: CommandArgs) -> None:
+    def _record(self, error: Optional[BaseException]) -> None:
+        name, start = self._metric_starts.popleft()
+        self._metrics.record(name, self._loop.time() - start, error)  # type: ignore
+
+    def _on_push(self, msg: Any) -> None:
+        if _push_type is None or not isinstance(msg, _push_type):
+            raise RuntimeError(f'unexpected reply with no command pending: {msg!r}')
+        if self._push_handler is not None:
+            try:
+                self._push_handler(self._push_as_bytes(msg))
+            except Exception as e:
+                self._loop.call_exception_handler({'message': 'error in push handler', 'exception': e})
+
+    def _push_as_bytes(self, msg: List[Any]) -> List[Any]:
+        """
+        Push messages are parsed with the encoding of the reply being read when they arrive, convert strings
+        back to bytes so handlers always get the same types.
+        """
+        r: List[Any] = []
+        for v in msg:
+            if isinstance(v, str):
+                v = v.encode(self._encoding)
+            elif isinstance(v, list):
+                v = self._push_as_bytes(v)
+            r.append(v)
+        return r
+
+    def _convert_exec(self, exec_reply: List[Any], commands: Sequence[Command]) -> List[Any]:
+        results: List[Any] = []
+        exc: Optional[Exception] = None
+        for result, (_, return_as, callback) in zip(exec_reply, commands):
+            try:
+                result = self._convert_result(self._convert_raw(result, return_as), return_as)
+                if callback is not None:
+                    result = apply_callback(result, callback)
+            except Exception as e:
+                exc = exc or e
+                result = e
+            results.append(result)
+        if exc is not None:
+            raise exc
+        return results
+
+    def _convert_raw(self, result: Any, return_as: ReturnAs) -> Any:
+        """
+        Convert a reply parsed without a reply type as the parser would have, used for the replies in EXEC's reply.
+        """
+        if isinstance(result, bytes):
+            if return_as == 'str':
+                return result.decode(self._encoding)
+            convert = return_as_lookup.get(return_as)  # type: ignore
+            return result if convert is None else convert(result)
+        elif isinstance(result, list):
+            return [self._convert_raw(r, return_as) for r in result]
+        return result
+
+    def _convert_result(self, result: Any, return_as: ReturnAs) -> ResultType:
+        if isinstance(result, Exception):
+            # either an error reply or an error converting the reply
+            raise result
+
+        if return_as == 'ok':
+            if result != self._expected_ok_msg:
+                raise RuntimeError(f'unexpected result {result!r}')
+            return None
+        elif return_as == 'bool':
+            if isinstance(result, list):
+                return [bool(r) for r in result]
+            return bool(result)
+        return result
+
+    def _encode_command(self, args: CommandArgs) -> None:
         """
         Encodes arguments into redis bulk-strings array.
 
-        Raises TypeError if any arg is not a bytes, bytearray, str, int, or float.
+        Small arguments are copied into the write buffer, large bytes-like arguments are queued as separate chunks
+        so they're written to the transport without being copied.
+
+        Raises TypeError if any arg is not a bytes, bytearray, memoryview, mmap, str, int, or float.
         """
-        buf.extend(b'*%d\r\n' % len(args))
+        buf = self._write_buf
+        buf += b'*%d\r\n' % len(args)
 
         for arg in args:
+            bin_arg: Union[bytes, bytearray, memoryview]
             if isinstance(arg, bytes):
                 bin_arg = arg
             elif isinstance(arg, str):
@@ -138,9 +857,20 @@ class RawConnection:
             elif isinstance(arg, float):
                 bin_arg = f'{arg}'.encode('ascii')
             elif isinstance(arg, bytearray):
-                bin_arg = bytes(arg)
+                bin_arg = arg
+            elif isinstance(arg, (memoryview, mmap)):
+                bin_arg = memoryview(arg).cast('B')
             else:
                 raise TypeError(
-                    f"Invalid argument: '{arg!r}' {arg.__class__} expected bytes, bytearray, str, int, or float"
+                    f"Invalid argument: '{arg!r}' {arg.__class__} expected bytes, bytearray, memoryview, mmap, str, "
+                    f'int, or float'
                 )
-            buf.extend(b'$%d\r\n%s\r\n' % (len(bin_arg), bin_arg))
+
+            size = len(bin_arg)
+            buf += b'$%d\r\n' % size
+            if size >= _zero_copy_threshold:
+                self._write_chunks += buf, bin_arg
+                self._write_buf = buf = bytearray(b'\r\n')
+            else:
+                buf += bin_arg
+                buf += b'\r\n'
@@ -1,48 +1,446 @@
 from __future__ import annotations
 
 import asyncio
+import random
+from copy import copy
 from types import TracebackType
-from typing import Any, Generator, Optional, Type
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
+from .cache import CacheSettings, ClientCache, cacheable_commands
+from .codecs import Codec
 from .commands import AbstractCommands
-from .connection import ConnectionSettings, RawConnection, create_raw_connection
+from .connection import AbstractConnection, ConnectionSettings, RawConnection, create_raw_connection, default_timeout
 from .pipeline import PipelineContext
-from .typing import CommandArgs, ResultType, ReturnAs
+from .pool import ConnectionPool, PoolSettings, create_pool
+from .replicas import ReplicaSet, ReplicaSettings, read_only_commands
+from .scan import ScanIterator
+from .scripts import Script
+from .streams import BulkStream
+from .transaction import Transaction, TransactionContext, WatchError
+from .typing import ArgType, Callback, Command, CommandArgs, ReturnAs
 
-__all__ = 'Redis', 'connect'
+__all__ = 'Redis', 'CachedRedis', 'ReplicaRedis', 'connect'
+
+Expire = Union[None, int, float, Mapping[Any, Union[int, float]]]
 
 
 class Redis(AbstractCommands):
-    __slots__ = ('_conn',)
+    __slots__ = '_conn', '_timeout', '_codec'
 
-    def __init__(self, raw_connection: RawConnection):
+    def __init__(self, raw_connection: AbstractConnection):
         self._conn = raw_connection
+        self._timeout: Optional[float] = default_timeout
+        self._codec: Optional[Codec] = None
+
+    async def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> Any:
+        return await self._conn.execute(args, return_as, callback, self._timeout)
+
+    def _register_script(self, script: Script) -> None:
+        self._conn.register_script(script)
+
+    def with_timeout(self, timeout: Optional[float]) -> 'Redis':
+        """
+        Copy of this object using the same connection where commands, pipelines and transactions time out after
+        timeout seconds instead of the connection's command_timeout, None for no timeout.
+
+        A command which times out raises asyncio.TimeoutError, its reply is discarded when it arrives so the
+        connection remains usable, see RawConnection.execute.
+        """
+        redis = copy(self)
+        redis._timeout = timeout
+        return redis
+
+    def with_codec(self, codec: Optional[Codec]) -> 'Redis':
+        """
+        Copy of this object using the same connection where values of get, set, mget, mset and the other string
+        commands which get or set whole values are encoded and decoded by codec, also in pipelines and
+        transactions. E.g. with CompressedCodec(JsonCodec()) any JSON value can be stored and large values are
+        compressed.
+
+        With decode=False values are returned as they're stored, without decoding or decompression.
+        """
+        redis = copy(self)
+        redis._codec = codec
+        return redis
+
+    async def get_stream(self, key: ArgType) -> Optional[BulkStream]:
+        """
+        Get the value of a key as an async iterator of chunks as they're received, None if the key doesn't exist.
+
+        The stream must be consumed or closed, see RawConnection.execute_stream.
+        """
+        return await self._conn.execute_stream((b'GET', key))
 
-    async def _execute(self, args: CommandArgs, return_as: ReturnAs) -> ResultType:
-        # TODO probably need to shield self._conn.execute to avoid reading part of an answer
-        return await self._conn.execute(args, return_as=return_as)
+    async def get_into(self, key: ArgType, sink: Any) -> Optional[int]:
+        """
+        Stream the value of a key into sink without buffering the whole value, returns the size of the value
+        or None if the key doesn't exist.
+
+        sink may be an object with a write method (e.g. a file or StreamWriter) or a writable buffer
+        (e.g. bytearray or memoryview) which is filled from the start.
+        """
+        stream = await self.get_stream(key)
+        if stream is None:
+            return None
+
+        try:
+            if hasattr(sink, 'write'):
+                async for chunk in stream:
+                    sink.write(chunk)
+            else:
+                buffer = memoryview(sink).cast('B')
+                if stream.size > len(buffer):
+                    raise ValueError(f'value of {stream.size} bytes does not fit in a buffer of {len(buffer)} bytes')
+                pos = 0
+                async for chunk in stream:
+                    end = pos + len(chunk)
+                    buffer[pos:end] = chunk
+                    pos = end
+        finally:
+            stream.close()
+        return stream.size
 
     def pipeline(self) -> PipelineContext:
-        return PipelineContext(self._conn)
+        return PipelineContext(self._conn, self._timeout, self._codec)
+
+    def transaction(self) -> TransactionContext:
+        """
+        Pipeline executed atomically with MULTI/EXEC in one round trip, see Transaction.
+        """
+        return TransactionContext(self._conn, self._timeout, self._codec)
+
+    async def watch(
+        self,
+        func: Callable[['Redis', Transaction], Awaitable[Any]],
+        key: ArgType,
+        *keys: ArgType,
+        retries: int = 10,
+        backoff: float = 0.01,
+        max_backoff: float = 1,
+    ) -> List[Any]:
+        """
+        Run an optimistic transaction and return the transaction's results.
+
+        The keys are watched with WATCH, then func is called with a Redis to read values and a Transaction to queue
+        commands which are executed with MULTI/EXEC. If a watched key is modified before EXEC, func is called
+        again after a random delay of up to backoff seconds, doubled after each attempt up to max_backoff.
+        WatchError is raised if the transaction is still aborted after retries retries.
+
+        Reads in func go to the primary on a dedicated connection: one acquired from the pool, or with a single
+        connection other transactions wait until the transaction has been executed.
+        """
+        if isinstance(self._conn, ConnectionPool):
+            conn = await self._conn.acquire()
+            try:
+                return await _watch(self, conn, func, (key, *keys), retries, backoff, max_backoff)
+            finally:
+                self._conn.release(conn)
+        elif isinstance(self._conn, RawConnection):
+            async with self._conn.watch_lock:
+                return await _watch(self, self._conn, func, (key, *keys), retries, backoff, max_backoff)
+        else:
+            raise TypeError(f'watch is not supported with {type(self._conn).__name__}')
+
+    async def get_many(
+        self,
+        keys: Sequence[ArgType],
+        *,
+        decode: bool = True,
+        as_dict: bool = False,
+        chunk_size: int = 1000,
+        concurrency: int = 4,
+    ) -> Union[List[Any], Dict[Any, Any]]:
+        """
+        Get the values of any number of keys, in the same order as keys or as a dict of keys to values.
+
+        Keys are fetched with one MGET per chunk_size keys, up to concurrency MGETs are in flight at once, with a
+        pool they're spread over several connections.
+        """
+        return_as, callback = self._value_reply(decode, many=True)
+        chunks = [keys[i : i + chunk_size] for i in range(0, len(keys), chunk_size)]
+
+        async def get_chunk(chunk: Sequence[ArgType]) -> List[Any]:
+            return await self._execute((b'MGET', *chunk), return_as, callback)
+
+        values: List[Any] = []
+        for chunk_values in await _run_concurrently(get_chunk, chunks, concurrency):
+            values += chunk_values
+        if as_dict:
+            return dict(zip(keys, values))
+        return values
+
+    async def set_many(
+        self,
+        items: Union[Mapping[ArgType, ArgType], Iterable[Tuple[ArgType, ArgType]]],
+        *,
+        expire: Expire = None,
+        chunk_size: int = 1000,
+        concurrency: int = 4,
+    ) -> None:
+        """
+        Set the values of any number of keys.
+
+        expire may be a TTL in seconds for all keys or a mapping of keys to TTLs, as with setex float TTLs are
+        set in milliseconds, positive TTLs below a millisecond are rounded up to one. Keys without a TTL are set
+        with one MSET per chunk_size keys, keys with a TTL with pipelines of chunk_size "SET key value EX ttl"
+        commands. Up to concurrency chunks are in flight at once.
+        """
+        pairs = [(k, self._value(v)) for k, v in (items.items() if isinstance(items, Mapping) else items)]
+        batches: List[List[Command]] = []
+        if expire is None:
+            plain = pairs
+        elif isinstance(expire, Mapping):
+            plain = [(k, v) for k, v in pairs if k not in expire]
+            batches += _set_ex_batches([(k, v, expire[k]) for k, v in pairs if k in expire], chunk_size)
+        else:
+            plain = []
+            batches += _set_ex_batches([(k, v, expire) for k, v in pairs], chunk_size)
+
+        for i in range(0, len(plain), chunk_size):
+            command: List[ArgType] = [b'MSET']
+            for k, v in plain[i : i + chunk_size]:
+                command += k, v
+            batches.append([(command, 'ok', None)])
+
+        async def execute_batch(batch: List[Command]) -> Any:
+            return await self._conn.execute_many(batch, self._timeout)
+
+        await _run_concurrently(execute_batch, batches, concurrency)
+
+    def scan_iter(
+        self,
+        *,
+        match: Optional[ArgType] = None,
+        count: int = 100,
+        type: Optional[str] = None,
+        target_latency: Optional[float] = 0.01,
+        decode: bool = True,
+    ) -> ScanIterator:
+        """
+        Iterate over all keys, see ScanIterator. count is the initial COUNT, it's adapted so fetching a page takes
+        about target_latency seconds unless target_latency is None.
+        """
+
+        def fetch(cursor: int, count_: int) -> Any:
+            return self.scan(cursor, match=match, count=count_, type=type, decode=decode)
+
+        return ScanIterator(fetch, count, target_latency)
+
+    def sscan_iter(
+        self,
+        key: ArgType,
+        *,
+        match: Optional[ArgType] = None,
+        count: int = 100,
+        target_latency: Optional[float] = 0.01,
+        decode: bool = True,
+    ) -> ScanIterator:
+        """
+        Iterate over the members of a set, see scan_iter.
+        """
+
+        def fetch(cursor: int, count_: int) -> Any:
+            return self.sscan(key, cursor, match=match, count=count_, decode=decode)
+
+        return ScanIterator(fetch, count, target_latency)
+
+    def hscan_iter(
+        self,
+        key: ArgType,
+        *,
+        match: Optional[ArgType] = None,
+        count: int = 100,
+        target_latency: Optional[float] = 0.01,
+        decode: bool = True,
+    ) -> ScanIterator:
+        """
+        Iterate over the fields and values of a hash as tuples, see scan_iter.
+        """
+
+        async def fetch(cursor: int, count_: int) -> Tuple[int, List[Tuple[Any, Any]]]:
+            cursor, fields = await self.hscan(key, cursor, match=match, count=count_, decode=decode)
+            return cursor, list(fields.items())
+
+        return ScanIterator(fetch, count, target_latency)
+
+    def zscan_iter(
+        self,
+        key: ArgType,
+        *,
+        match: Optional[ArgType] = None,
+        count: int = 100,
+        target_latency: Optional[float] = 0.01,
+        decode: bool = True,
+    ) -> ScanIterator:
+        """
+        Iterate over the members of a sorted set and their scores as tuples, see scan_iter.
+        """
+
+        def fetch(cursor: int, count_: int) -> Any:
+            return self.zscan(key, cursor, match=match, count=count_, decode=decode)
+
+        return ScanIterator(fetch, count, target_latency)
 
     async def close(self) -> None:
         await self._conn.close()
 
 
+async def _run_concurrently(func: Callable[[Any], Awaitable[Any]], items: List[Any], concurrency: int) -> List[Any]:
+    """
+    Call func for each item with at most concurrency calls in progress at once, returns the results in order.
+    """
+    results: List[Any] = [None] * len(items)
+    it = iter(enumerate(items))
+
+    async def worker() -> None:
+        for i, item in it:
+            results[i] = await func(item)
+
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, len(items)))])
+    return results
+
+
+async def _watch(
+    owner: Redis,
+    conn: RawConnection,
+    func: Callable[[Redis, Transaction], Awaitable[Any]],
+    keys: Sequence[ArgType],
+    retries: int,
+    backoff: float,
+    max_backoff: float,
+) -> List[Any]:
+    # commands run on conn with the owner's timeout and codec
+    timeout = owner._timeout
+    redis = Redis(conn).with_timeout(timeout).with_codec(owner._codec)
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(random.uniform(0, min(backoff * 2 ** (attempt - 1), max_backoff)))
+        await conn.execute((b'WATCH', *keys), 'ok', timeout=timeout)
+        tr = Transaction(conn, timeout, watching=True, codec=owner._codec)
+        try:
+            await func(redis, tr)
+            if not tr._pipeline:
+                await conn.execute((b'UNWATCH',), 'ok', timeout=timeout)
+                return []
+            return await tr.execute()
+        except WatchError:
+            pass
+        except BaseException:
+            if not conn.is_closed:
+                await conn.execute((b'UNWATCH',), 'ok', timeout=timeout)
+            raise
+    raise WatchError(f'transaction aborted {retries + 1} times, watched keys were modified')
+
+
+def _set_ex_batches(items: List[Tuple[ArgType, ArgType, Union[int, float]]], chunk_size: int) -> List[List[Command]]:
+    commands: List[Command] = []
+    for key, value, ttl in items:
+        if isinstance(ttl, float):
+            # redis rejects PX 0, so positive TTLs below a millisecond are rounded up to one
+            px = int(ttl * 1000)
+            commands.append(((b'SET', key, value, b'PX', 1 if px == 0 and ttl > 0 else px), 'ok', None))
+        else:
+            commands.append(((b'SET', key, value, b'EX', ttl), 'ok', None))
+    return [commands[i : i + chunk_size] for i in range(0, len(commands), chunk_size)]
+
+
+class CachedRedis(Redis):
+    """
+    Redis with a local cache of the replies to read commands, see ClientCache. Keys written with this client are
+    removed from the cache when the write is sent, so it always reads its own writes.
+
+    Pipelines bypass the cache.
+    """
+
+    __slots__ = ('cache',)
+
+    def __init__(self, raw_connection: AbstractConnection, cache: ClientCache):
+        super().__init__(raw_connection)
+        self.cache = cache
+
+    async def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> Any:
+        if self.cache.enabled:
+            command = args[0]
+            # replies are cached before callbacks are applied, e.g. values are decoded by the codec on each read
+            if command in cacheable_commands:
+                value = await self.cache.execute(args, return_as)
+                return value if callback is None else callback(value)
+            elif command == b'MGET':
+                values = await self.cache.mget(args[1:], return_as)
+                return values if callback is None else callback(values)
+            # keys are invalidated again once the command is done in case they were read while it was running
+            self.cache.invalidate_command(args)
+            try:
+                return await self._conn.execute(args, return_as, callback, self._timeout)
+            finally:
+                self.cache.invalidate_command(args)
+        return await self._conn.execute(args, return_as, callback, self._timeout)
+
+    async def close(self) -> None:
+        await self.cache.close()
+        await super().close()
+
+
+class ReplicaRedis(Redis):
+    """
+    Redis with read commands sent to replicas, see ReplicaSet. All other commands, pipelines and streamed reads
+    go to the primary.
+    """
+
+    __slots__ = ('replicas',)
+
+    def __init__(self, raw_connection: AbstractConnection, replicas: ReplicaSet):
+        super().__init__(raw_connection)
+        self.replicas = replicas
+
+    async def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> Any:
+        if args[0] in read_only_commands:
+            return await self.replicas.execute(args, return_as, callback, self._timeout)
+        return await self._conn.execute(args, return_as, callback, self._timeout)
+
+    async def close(self) -> None:
+        await self.replicas.close()
+        await super().close()
+
+
 def connect(
     connection_settings: Optional[ConnectionSettings] = None,
     *,
     host: str = None,
     port: int = None,
     database: int = None,
+    pool_settings: Optional[PoolSettings] = None,
+    cache_settings: Optional[CacheSettings] = None,
+    replica_settings: Optional[ReplicaSettings] = None,
 ) -> 'RedisConnector':
+    """
+    Connect to redis, if pool_settings is provided the returned Redis uses a pool of connections rather than
+    a single connection. If cache_settings is provided a CachedRedis is returned, if replica_settings is provided
+    a ReplicaRedis is returned, connection_settings are then those of the primary.
+    """
+    if cache_settings is not None and replica_settings is not None:
+        raise ValueError('cache_settings and replica_settings cannot be used together')
     if connection_settings:
         conn_settings = connection_settings
     else:
         kwargs = dict(host=host, port=port, database=database)
         conn_settings = ConnectionSettings(**{k: v for k, v in kwargs.items() if v is not None})  # type: ignore
 
-    return RedisConnector(conn_settings)
+    return RedisConnector(conn_settings, pool_settings, cache_settings, replica_settings)
 
 
 class RedisConnector:
@@ -50,16 +448,47 @@ class RedisConnector:
     Simple shim to allow both "await async_redis.connect(...)" and "async with async_redis.connect(...)" to work
     """
 
-    def __init__(self, conn_settings: ConnectionSettings):
+    def __init__(
+        self,
+        conn_settings: ConnectionSettings,
+        pool_settings: Optional[PoolSettings] = None,
+        cache_settings: Optional[CacheSettings] = None,
+        replica_settings: Optional[ReplicaSettings] = None,
+    ):
         self.conn_settings = conn_settings
+        self.pool_settings = pool_settings
+        self.cache_settings = cache_settings
+        self.replica_settings = replica_settings
         self.redis: Optional[Redis] = None
         self.lock = asyncio.Lock()
 
     async def open(self) -> Redis:
         async with self.lock:
             if self.redis is None:
-                conn = await create_raw_connection(self.conn_settings)
-                self.redis = Redis(conn)
+                conn: AbstractConnection
+                if self.pool_settings is None:
+                    conn = await create_raw_connection(self.conn_settings)
+                else:
+                    conn = await create_pool(self.conn_settings, self.pool_settings)
+
+                if self.cache_settings is not None:
+                    cache = ClientCache(self.conn_settings, self.cache_settings)
+                    try:
+                        await cache.open()
+                    except BaseException:
+                        await conn.close()
+                        raise
+                    self.redis = CachedRedis(conn, cache)
+                elif self.replica_settings is not None:
+                    replicas = ReplicaSet(self.replica_settings)
+                    try:
+                        await replicas.open(self.pool_settings)
+                    except BaseException:
+                        await conn.close()
+                        raise
+                    self.redis = ReplicaRedis(conn, replicas)
+                else:
+                    self.redis = Redis(conn)
         return self.redis
 
     def __await__(self) -> Generator[Any, None, Redis]:
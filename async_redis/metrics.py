@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from asyncio import get_event_loop
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .typing import CommandArgs
+
+__all__ = 'Histogram', 'CommandMetrics', 'Metrics', 'command_name'
+
+# values are recorded in microseconds, values below 2 * _sub_buckets are counted exactly, above that each power of
+# two is split into _sub_buckets linear buckets so the relative error is at most 1 / _sub_buckets
+_sub_bits = 5
+_sub_buckets = 1 << _sub_bits
+_max_value = (1 << 36) - 1  # about 19 hours
+_bucket_count = _sub_buckets * (_max_value.bit_length() - _sub_bits + 1)
+# commands where the sub-command is part of the name, e.g. "CONFIG GET"
+_container_commands = {b'CLIENT', b'CLUSTER', b'COMMAND', b'CONFIG', b'MEMORY', b'OBJECT', b'SCRIPT', b'SLOWLOG'}
+
+# called with the command name, its latency in seconds and the error if it failed
+MetricsHook = Callable[[str, float, Optional[BaseException]], Any]
+
+
+def _bucket_index(value: int) -> int:
+    if value < 2 * _sub_buckets:
+        return value
+    shift = value.bit_length() - _sub_bits - 1
+    return _sub_buckets * (shift + 1) + (value >> shift) - _sub_buckets
+
+
+def _bucket_upper(index: int) -> int:
+    if index < 2 * _sub_buckets:
+        return index
+    shift = index // _sub_buckets - 1
+    return ((index % _sub_buckets + _sub_buckets + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    Latency histogram using fixed memory in the style of HdrHistogram, values are in seconds and are stored with
+    microsecond resolution and about 3% relative error.
+    """
+
+    __slots__ = 'counts', 'count', 'total', 'min', 'max'
+
+    def __init__(self) -> None:
+        self.counts = [0] * _bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.counts[_bucket_index(min(max(int(value * 1_000_000), 0), _max_value))] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Value below which percentile percent of recorded values fall, 0 if nothing has been recorded.
+        """
+        if self.count == 0:
+            return 0.0
+        target = max(self.count * percentile / 100, 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_bucket_upper(index) / 1_000_000, self.max)
+        return self.max
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """
+        Upper bound in seconds and count of each non-empty bucket, e.g. to export as a Prometheus histogram.
+        """
+        return [(_bucket_upper(i) / 1_000_000, c) for i, c in enumerate(self.counts) if c]
+
+    def reset(self) -> None:
+        self.__init__()  # type: ignore
+
+    def __repr__(self) -> str:
+        return (
+            f'Histogram(count={self.count}, mean={self.mean:0.6f}, p50={self.percentile(50):0.6f}, '
+            f'p99={self.percentile(99):0.6f}, max={self.max:0.6f})'
+        )
+
+
+class CommandMetrics:
+    __slots__ = 'latency', 'errors'
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.errors = 0
+
+    @property
+    def calls(self) -> int:
+        return self.latency.count
+
+    def __repr__(self) -> str:
+        return f'CommandMetrics(calls={self.calls}, errors={self.errors}, latency={self.latency!r})'
+
+
+def command_name(args: CommandArgs) -> str:
+    """
+    Name of a command as used in metrics, upper case and including the sub-command for commands like CONFIG.
+    """
+    name = args[0]
+    name = name.upper() if isinstance(name, bytes) else str(name).upper().encode()
+    if name in _container_commands and len(args) > 1:
+        sub = args[1]
+        name += b' ' + (sub.upper() if isinstance(sub, bytes) else str(sub).upper().encode())
+    return name.decode()
+
+
+class Metrics:
+    """
+    Metrics of all the connections created with a ConnectionSettings with metrics set: latency histograms and
+    error counts per command, bytes written and read and the number of commands awaiting replies.
+
+    Latency is measured from when a command is queued until its reply has been read. Hooks are called with every
+    command's name, latency and error so metrics can be forwarded to e.g. OpenTelemetry, snapshot() can be
+    used to export them e.g. from a Prometheus collector. Without metrics set connections don't record anything.
+    """
+
+    __slots__ = 'commands', 'bytes_written', 'bytes_read', 'in_flight', 'max_in_flight', '_hooks'
+
+    def __init__(self) -> None:
+        self.commands: Dict[str, CommandMetrics] = {}
+        self.bytes_written = 0
+        self.bytes_read = 0
+        # commands sent which haven't had a reply yet, and the highest this has been
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._hooks: List[MetricsHook] = []
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: MetricsHook) -> None:
+        self._hooks.remove(hook)
+
+    def sent(self) -> None:
+        self.in_flight += 1
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+
+    def record(self, command: str, latency: float, error: Optional[BaseException] = None) -> None:
+        """
+        Record the reply to a command.
+        """
+        self.in_flight -= 1
+        m = self.commands.get(command)
+        if m is None:
+            m = self.commands[command] = CommandMetrics()
+        m.latency.record(latency)
+        if error is not None:
+            m.errors += 1
+        for hook in self._hooks:
+            try:
+                hook(command, latency, error)
+            except Exception as e:
+                get_event_loop().call_exception_handler({'message': 'error in metrics hook', 'exception': e})
+
+    def snapshot(self, percentiles: Tuple[float, ...] = (50, 90, 99, 99.9)) -> Dict[str, Any]:
+        """
+        Current metrics as a dict of plain values.
+        """
+        return {
+            'bytes_written': self.bytes_written,
+            'bytes_read': self.bytes_read,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'commands': {
+                name: {
+                    'calls': m.calls,
+                    'errors': m.errors,
+                    'latency_sum': m.latency.total,
+                    'latency_max': m.latency.max,
+                    'latency_percentiles': {p: m.latency.percentile(p) for p in percentiles},
+                    'latency_buckets': m.latency.buckets(),
+                }
+                for name, m in self.commands.items()
+            },
+        }
+
+    def reset(self) -> None:
+        """
+        Clear all metrics except in_flight.
+        """
+        self.commands.clear()
+        self.bytes_written = self.bytes_read = 0
+        self.max_in_flight = self.in_flight
+
+    def __repr__(self) -> str:
+        return f'Metrics(commands={len(self.commands)}, in_flight={self.in_flight})'
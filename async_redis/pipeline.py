@@ -3,19 +3,27 @@ from __future__ import annotations
 from types import TracebackType
 from typing import Optional, Type
 
-from .connection import RawConnection
+from .codecs import Codec
+from .connection import AbstractConnection, default_timeout
 from .pipeline_commands import CommandsPipeline
 
 __all__ = ('PipelineContext',)
 
 
 class PipelineContext:
-    def __init__(self, raw_connection: RawConnection) -> None:
+    def __init__(
+        self,
+        raw_connection: AbstractConnection,
+        timeout: Optional[float] = default_timeout,
+        codec: Optional[Codec] = None,
+    ) -> None:
         self._conn = raw_connection
+        self._timeout = timeout
+        self._codec = codec
         self._pipeline: Optional[CommandsPipeline] = None
 
     async def __aenter__(self) -> CommandsPipeline:
-        self._pipeline = CommandsPipeline(self._conn)
+        self._pipeline = CommandsPipeline(self._conn, self._timeout, self._codec)
         return self._pipeline
 
     async def __aexit__(
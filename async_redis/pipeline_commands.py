@@ -1,25 +1,37 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Any, List, Optional
 
+from .codecs import Codec
 from .commands import AbstractCommands
-from .connection import RawConnection
-from .typing import CommandArgs, ResultType, ReturnAs
+from .connection import AbstractConnection, default_timeout
+from .scripts import Script
+from .typing import Callback, Command, CommandArgs, ReturnAs
 
 __all__ = ('CommandsPipeline',)
 
 
 class CommandsPipeline(AbstractCommands):
-    def __init__(self, raw_connection: RawConnection) -> None:
+    def __init__(
+        self,
+        raw_connection: AbstractConnection,
+        timeout: Optional[float] = default_timeout,
+        codec: Optional[Codec] = None,
+    ) -> None:
         self._conn = raw_connection
-        self._pipeline: List[CommandArgs] = []
+        self._timeout = timeout
+        self._codec = codec
+        self._pipeline: List[Command] = []
 
-    def _execute(self, args: CommandArgs, return_as: ReturnAs) -> None:
-        self._pipeline.append(args)
+    def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> None:
+        self._pipeline.append((args, return_as, callback))
 
-    async def execute(self, return_as: ReturnAs = None) -> List[ResultType]:
-        r: List[ResultType] = []
+    def _register_script(self, script: Script) -> None:
+        self._conn.register_script(script)
+
+    async def execute(self) -> List[Any]:
+        r: List[Any] = []
         if self._pipeline:
-            r = await self._conn.execute_many(self._pipeline, return_as)
-            self._pipeline = []
+            commands, self._pipeline = self._pipeline, []
+            r = await self._conn.execute_many(commands, self._timeout)
         return r
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+from asyncio import CancelledError, Future, Task, TimeoutError, TimerHandle, gather, get_event_loop
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, List, Optional, Sequence, Set, Tuple
+
+from .connection import ConnectionSettings, RawConnection, create_raw_connection, default_timeout
+from .scripts import Script, Scripts
+from .streams import BulkStream
+from .typing import Callback, Command, CommandArgs, ReturnAs
+
+__all__ = 'PoolSettings', 'PoolStats', 'ConnectionPool', 'create_pool'
+
+
+@dataclass
+class PoolSettings:
+    """
+    Connection pool settings
+    """
+
+    min_size: int = 1
+    max_size: int = 10
+    # idle connections above min_size are closed after this many seconds
+    max_idle_time: float = 300
+    # connections idle for longer than this many seconds are checked with PING before they're handed out, those
+    # which don't reply within health_check_timeout are discarded. None to disable the check
+    health_check_interval: Optional[float] = 30
+    health_check_timeout: float = 5
+
+    def __repr__(self) -> str:
+        fields = 'min_size', 'max_size', 'max_idle_time', 'health_check_interval', 'health_check_timeout'
+        return 'PoolSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
+
+
+@dataclass
+class PoolStats:
+    """
+    Snapshot of the state of a connection pool.
+    """
+
+    size: int
+    idle: int
+    in_use: int
+    opening: int
+    waiting: int
+    created: int
+    discarded: int
+
+
+async def create_pool(
+    conn_settings: ConnectionSettings, pool_settings: Optional[PoolSettings] = None
+) -> 'ConnectionPool':
+    """
+    Create a new ConnectionPool and open its first min_size connections.
+    """
+    pool = ConnectionPool(conn_settings, pool_settings)
+    await pool.open()
+    return pool
+
+
+class ConnectionPool:
+    """
+    Pool of RawConnections with the same execute interface as RawConnection.
+
+    Idle connections are reused LIFO so surplus connections stay idle and get closed once they've been idle for
+    longer than max_idle_time, connections which have been idle for a while are checked with PING before they're
+    reused. When the pool is exhausted callers are queued and served in the order they arrived.
+    """
+
+    __slots__ = (
+        '_conn_settings',
+        '_settings',
+        '_loop',
+        '_idle',
+        '_in_use',
+        '_opening',
+        '_waiters',
+        '_closing',
+        '_closed',
+        '_created',
+        '_discarded',
+        '_scripts',
+        '_prune_handle',
+    )
+
+    def __init__(self, conn_settings: ConnectionSettings, pool_settings: Optional[PoolSettings] = None):
+        settings = pool_settings or PoolSettings()
+        if settings.max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        if not 0 <= settings.min_size <= settings.max_size:
+            raise ValueError('min_size must be between 0 and max_size')
+
+        self._conn_settings = conn_settings
+        self._settings = settings
+        self._loop = get_event_loop()
+        # stack of (connection, time released), the most recently released connection is last
+        self._idle: List[Tuple[RawConnection, float]] = []
+        self._in_use: Set[RawConnection] = set()
+        self._opening = 0
+        # a waiter's future is resolved with a connection, or None if it's free to open a new connection
+        self._waiters: Deque[Future[Optional[RawConnection]]] = deque()
+        self._closing: Set[Task[None]] = set()
+        self._closed = False
+        self._created = 0
+        self._discarded = 0
+        self._scripts: Scripts = {}
+        # closes connections once they've been idle too long, even if the pool isn't used, see _prune_idle
+        self._prune_handle: Optional[TimerHandle] = None
+
+    @property
+    def scripts(self) -> Scripts:
+        """
+        Scripts registered with the pool, shared by all its connections, see RawConnection.scripts.
+        """
+        return self._scripts
+
+    @scripts.setter
+    def scripts(self, scripts: Scripts) -> None:
+        self._scripts = scripts
+        for conn, _ in self._idle:
+            conn.scripts = scripts
+        for conn in self._in_use:
+            conn.scripts = scripts
+
+    def register_script(self, script: Script) -> None:
+        """
+        Add a script to scripts and load it on every open connection, see RawConnection.register_script.
+        """
+        self._scripts[script.sha] = script
+        for conn, _ in self._idle:
+            conn.register_script(script)
+        for conn in self._in_use:
+            conn.register_script(script)
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            size=self.size,
+            idle=len(self._idle),
+            in_use=len(self._in_use),
+            opening=self._opening,
+            waiting=len(self._waiters),
+            created=self._created,
+            discarded=self._discarded,
+        )
+
+    async def open(self) -> None:
+        """
+        Open connections until the pool has min_size connections.
+        """
+        missing = self._settings.min_size - self.size
+        if missing > 0:
+            now = self._loop.time()
+            conns = await gather(*[self._create() for _ in range(missing)])
+            self._idle.extend((conn, now) for conn in conns)
+
+    async def execute(
+        self,
+        args: CommandArgs,
+        return_as: ReturnAs = None,
+        callback: Optional[Callback] = None,
+        timeout: Optional[float] = default_timeout,
+    ) -> Any:
+        conn = await self.acquire()
+        try:
+            return await conn.execute(args, return_as, callback, timeout)
+        finally:
+            self.release(conn)
+
+    async def execute_many(self, commands: Sequence[Command], timeout: Optional[float] = default_timeout) -> List[Any]:
+        conn = await self.acquire()
+        try:
+            return await conn.execute_many(commands, timeout)
+        finally:
+            self.release(conn)
+
+    async def execute_transaction(
+        self, commands: Sequence[Command], *, timeout: Optional[float] = default_timeout
+    ) -> Optional[List[Any]]:
+        conn = await self.acquire()
+        try:
+            return await conn.execute_transaction(commands, timeout=timeout)
+        finally:
+            self.release(conn)
+
+    async def execute_stream(self, args: CommandArgs) -> Optional[BulkStream]:
+        conn = await self.acquire()
+        try:
+            stream = await conn.execute_stream(args)
+        except BaseException:
+            self.release(conn)
+            raise
+        if stream is None:
+            self.release(conn)
+        else:
+            # keep the connection until the whole value has been received
+            stream.received.add_done_callback(lambda _: self.release(conn))
+        return stream
+
+    async def acquire(self) -> RawConnection:
+        """
+        Get a connection from the pool, the connection must be returned with release().
+        """
+        while True:
+            if self._closed:
+                raise RuntimeError('connection pool is closed')
+
+            self._prune_idle()
+            while self._idle:
+                conn, released = self._idle.pop()
+                if conn.is_closed:
+                    self._discard(conn)
+                elif await self._check(conn, released):
+                    return conn
+
+            if self.size < self._settings.max_size and not self._waiters:
+                conn = await self._create()
+                self._in_use.add(conn)
+                return conn
+
+            waiter: Future[Optional[RawConnection]] = self._loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                conn_ = await waiter
+            except CancelledError:
+                if not waiter.done() or waiter.cancelled():
+                    self._waiters.remove(waiter)
+                else:
+                    # we were given a connection or a free slot after being cancelled, pass it on
+                    conn_ = waiter.result()
+                    if conn_ is None:
+                        self._opening -= 1
+                    self._hand_on(conn_)
+                raise
+            if conn_ is not None:
+                self._in_use.add(conn_)
+                return conn_
+            # we've been given a free slot, it was reserved for us by _hand_on
+            conn = await self._create(reserved=True)
+            self._in_use.add(conn)
+            return conn
+
+    def release(self, conn: RawConnection) -> None:
+        """
+        Return a connection to the pool.
+        """
+        self._in_use.discard(conn)
+        if self._closed or conn.is_closed:
+            self._discard(conn)
+        else:
+            self._prune_idle()
+            self._hand_on(conn)
+
+    async def close(self) -> None:
+        """
+        Close all idle connections, connections in use are closed when they're released.
+        """
+        self._closed = True
+        if self._prune_handle is not None:
+            self._prune_handle.cancel()
+            self._prune_handle = None
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(RuntimeError('connection pool is closed'))
+        while self._idle:
+            conn, _ = self._idle.pop()
+            self._discard(conn)
+        if self._closing:
+            await gather(*self._closing)
+
+    def _hand_on(self, conn: Optional[RawConnection]) -> None:
+        """
+        Give a connection (or free slot when conn is None) to the longest waiting caller, otherwise put the
+        connection back on the idle stack.
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                if conn is None:
+                    # reserve the slot so nobody else can take it before the waiter opens a connection
+                    self._opening += 1
+                waiter.set_result(conn)
+                return
+        if conn is not None:
+            self._idle.append((conn, self._loop.time()))
+            if self._prune_handle is None:
+                self._schedule_prune()
+
+    async def _check(self, conn: RawConnection, released: float) -> bool:
+        """
+        Take an idle connection, if it's been idle for longer than health_check_interval it's only kept if it
+        replies to PING. Returns whether the connection can be used, otherwise it's been discarded.
+        """
+        self._in_use.add(conn)
+        interval = self._settings.health_check_interval
+        if interval is None or self._loop.time() - released < interval:
+            return True
+        try:
+            await conn.execute((b'PING',), None, None, self._settings.health_check_timeout)
+        except (OSError, ConnectionError, TimeoutError):
+            # e.g. the server closed the connection or the socket is half open
+            self._in_use.discard(conn)
+            self._discard(conn)
+            return False
+        except BaseException:
+            self.release(conn)
+            raise
+        return True
+
+    def _prune_idle(self) -> None:
+        """
+        Discard connections above min_size which have been idle too long, these are always at the bottom of the stack.
+        """
+        cutoff = self._loop.time() - self._settings.max_idle_time
+        while self._idle and self._idle[0][1] <= cutoff and self.size > self._settings.min_size:
+            conn, _ = self._idle.pop(0)
+            self._discard(conn)
+
+    def _schedule_prune(self) -> None:
+        """
+        Prune when the longest idle connection would expire, so idle connections are closed without the pool being
+        used.
+        """
+        self._prune_handle = None
+        if self._idle and not self._closed and self.size > self._settings.min_size:
+            self._prune_handle = self._loop.call_at(
+                self._idle[0][1] + self._settings.max_idle_time, self._on_prune_timer
+            )
+
+    def _on_prune_timer(self) -> None:
+        self._prune_idle()
+        self._schedule_prune()
+
+    async def _create(self, reserved: bool = False) -> RawConnection:
+        if not reserved:
+            self._opening += 1
+        try:
+            conn = await create_raw_connection(self._conn_settings, self._scripts)
+        except BaseException:
+            self._opening -= 1
+            self._hand_on(None)
+            raise
+        self._opening -= 1
+        self._created += 1
+        return conn
+
+    def _discard(self, conn: RawConnection) -> None:
+        self._discarded += 1
+        task = self._loop.create_task(self._close_conn(conn))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        if not self._closed:
+            self._hand_on(None)
+
+    async def _close_conn(self, conn: RawConnection) -> None:
+        try:
+            await conn.close()
+        except (OSError, ConnectionError):
+            # the connection was already broken
+            pass
@@ -0,0 +1,490 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from hiredis import hiredis
+
+from .connection import ConnectionSettings, open_stream
+from .streams import RedisStreamReader, RedisWriter
+from .typing import Literal
+from .utils import encode_command
+
+__all__ = 'PubSubSettings', 'Message', 'Subscription', 'PubSub', 'create_pubsub'
+
+Overflow = Literal['drop_oldest', 'drop_newest', 'block']
+# used as the max_queue argument to mean PubSubSettings.max_queue
+default_max_queue: Any = object()
+BatchCallback = Callable[[List['Message']], Any]
+
+
+@dataclass
+class PubSubSettings:
+    """
+    Pub/Sub settings
+    """
+
+    # default maximum number of undelivered messages per subscription, at least 1 or None for no limit
+    max_queue: Optional[int] = 10_000
+    # what happens when a subscription's queue is full: the oldest or newest messages are dropped, or with "block"
+    # reading from the connection stops until the subscriber catches up
+    overflow: Overflow = 'drop_oldest'
+    # how long to wait before reconnecting when the connection is lost, doubled after each failure
+    reconnect_delay: float = 0.1
+    max_reconnect_delay: float = 10
+
+    def __repr__(self) -> str:
+        fields = 'max_queue', 'overflow', 'reconnect_delay', 'max_reconnect_delay'
+        return 'PubSubSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
+
+
+class Message:
+    """
+    A message received on a channel, pattern is set for messages received via a pattern subscription.
+    """
+
+    __slots__ = 'channel', 'data', 'pattern'
+
+    def __init__(self, channel: Union[bytes, str], data: Union[bytes, str], pattern: Union[None, bytes, str] = None):
+        self.channel = channel
+        self.data = data
+        self.pattern = pattern
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.channel, self.data, self.pattern) == (other.channel, other.data, other.pattern)
+
+    def __repr__(self) -> str:
+        return f'Message(channel={self.channel!r}, data={self.data!r}, pattern={self.pattern!r})'
+
+
+async def create_pubsub(
+    conn_settings: ConnectionSettings, pubsub_settings: Optional[PubSubSettings] = None
+) -> 'PubSub':
+    """
+    Create a new PubSub and connect it.
+    """
+    pubsub = PubSub(conn_settings, pubsub_settings)
+    await pubsub.open()
+    return pubsub
+
+
+class Subscription:
+    """
+    Messages received for one or more channels or patterns, either iterate over the subscription
+    (or its batches()) or provide a callback when subscribing.
+    """
+
+    __slots__ = (
+        '_pubsub',
+        'names',
+        'is_pattern',
+        'decode',
+        'dropped',
+        '_callback',
+        '_max_queue',
+        '_overflow',
+        '_queue',
+        '_waiter',
+        '_space_waiter',
+        '_closed',
+    )
+
+    def __init__(
+        self,
+        pubsub: 'PubSub',
+        names: List[bytes],
+        is_pattern: bool,
+        decode: bool,
+        callback: Optional[BatchCallback],
+        max_queue: Optional[int],
+        overflow: Overflow,
+    ):
+        self._pubsub = pubsub
+        self.names = names
+        self.is_pattern = is_pattern
+        self.decode = decode
+        # number of messages dropped because the queue was full
+        self.dropped = 0
+        self._callback = callback
+        self._max_queue = max_queue
+        self._overflow = overflow
+        # with drop_oldest the deque drops old messages itself
+        self._queue: Deque[Message] = deque(maxlen=max_queue if overflow == 'drop_oldest' else None)
+        self._waiter: Optional[asyncio.Future[None]] = None
+        self._space_waiter: Optional[asyncio.Future[None]] = None
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self) -> Message:
+        if not self._queue and not await self._wait_messages():
+            raise StopAsyncIteration
+        msg = self._queue.popleft()
+        self._wakeup_space()
+        return msg
+
+    async def batches(self) -> AsyncIterator[List[Message]]:
+        """
+        Iterate over messages in batches of all the messages received since the last batch.
+        """
+        while await self._wait_messages():
+            batch = list(self._queue)
+            self._queue.clear()
+            self._wakeup_space()
+            yield batch
+
+    async def unsubscribe(self) -> None:
+        """
+        Stop receiving messages, iteration stops once the messages already queued have been consumed.
+        """
+        await self._pubsub._unsubscribe(self)
+
+    def _deliver(self, messages: List[Message]) -> List[Message]:
+        """
+        Queue messages or pass them to the callback, returns messages which couldn't be delivered because
+        the queue is full and the overflow policy is "block".
+        """
+        if self._closed:
+            return []
+        elif self._callback is not None:
+            try:
+                self._callback(messages)
+            except Exception as e:
+                self._pubsub._loop.call_exception_handler({'message': 'error in pubsub callback', 'exception': e})
+            return []
+
+        queue = self._queue
+        remaining: List[Message] = []
+        space = len(messages) if self._max_queue is None else self._max_queue - len(queue)
+        if len(messages) <= space:
+            queue.extend(messages)
+        elif self._overflow == 'drop_oldest':
+            self.dropped += len(queue) + len(messages) - self._max_queue  # type: ignore
+            queue.extend(messages)
+        elif self._overflow == 'drop_newest':
+            self.dropped += len(messages) - space
+            queue.extend(messages[:space])
+        else:
+            queue.extend(messages[:space])
+            remaining = messages[space:]
+
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        return remaining
+
+    async def _wait_space(self) -> None:
+        if not self._closed and len(self._queue) >= self._max_queue:  # type: ignore
+            self._space_waiter = self._pubsub._loop.create_future()
+            try:
+                await self._space_waiter
+            finally:
+                self._space_waiter = None
+
+    async def _wait_messages(self) -> bool:
+        while not self._queue:
+            if self._closed:
+                return False
+            self._waiter = self._pubsub._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return True
+
+    def _wakeup_space(self) -> None:
+        if self._space_waiter is not None and not self._space_waiter.done():
+            self._space_waiter.set_result(None)
+
+    def _close(self) -> None:
+        self._closed = True
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        self._wakeup_space()
+
+
+class PubSub:
+    """
+    Subscribes to channels and patterns on a dedicated connection and dispatches messages to subscriptions.
+
+    All messages parsed from the data received in one read are dispatched together, each subscription gets one
+    batch so consumers are woken once per batch rather than once per message. The connection is reopened when it's
+    lost and all channels and patterns are subscribed to again, messages published while disconnected are lost.
+    """
+
+    __slots__ = (
+        '_conn_settings',
+        '_settings',
+        '_loop',
+        '_channels',
+        '_patterns',
+        '_confirming',
+        '_writer',
+        '_task',
+    )
+
+    def __init__(self, conn_settings: ConnectionSettings, pubsub_settings: Optional[PubSubSettings] = None):
+        self._conn_settings = conn_settings
+        self._settings = pubsub_settings or PubSubSettings()
+        _check_max_queue(self._settings.max_queue)
+        self._loop = asyncio.get_event_loop()
+        # subscriptions by channel and pattern
+        self._channels: Dict[bytes, List[Subscription]] = {}
+        self._patterns: Dict[bytes, List[Subscription]] = {}
+        # futures waiting for redis to confirm a subscription by message type and channel or pattern
+        self._confirming: Dict[Tuple[bytes, bytes], List[asyncio.Future[None]]] = {}
+        self._writer: Optional[RedisWriter] = None
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def open(self) -> None:
+        """
+        Connect, errors connecting the first time are raised.
+        """
+        ready: asyncio.Future[None] = self._loop.create_future()
+        self._task = self._loop.create_task(self._run(ready))
+        await ready
+
+    async def close(self) -> None:
+        """
+        Disconnect and end all subscriptions.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subs in (*self._channels.values(), *self._patterns.values()):
+            for sub in subs:
+                sub._close()
+        self._channels.clear()
+        self._patterns.clear()
+        for futures in self._confirming.values():
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(ConnectionError('pubsub closed'))
+        self._confirming.clear()
+
+    async def __aenter__(self) -> 'PubSub':
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        await self.close()
+
+    async def subscribe(
+        self,
+        channel: Union[bytes, str],
+        *channels: Union[bytes, str],
+        callback: Optional[BatchCallback] = None,
+        decode: bool = True,
+        max_queue: Optional[int] = default_max_queue,
+        overflow: Optional[Overflow] = None,
+    ) -> Subscription:
+        """
+        Subscribe to one or more channels, returns once redis has confirmed the subscription.
+
+        If callback is provided it's called with each batch of messages, otherwise the returned Subscription
+        should be iterated over. max_queue and overflow default to the values in PubSubSettings, max_queue must
+        be at least 1 or None for no limit. With decode=True channels and data are decoded, invalid data is
+        decoded with errors='replace'.
+        """
+        return await self._subscribe(b'SUBSCRIBE', (channel, *channels), callback, decode, max_queue, overflow)
+
+    async def psubscribe(
+        self,
+        pattern: Union[bytes, str],
+        *patterns: Union[bytes, str],
+        callback: Optional[BatchCallback] = None,
+        decode: bool = True,
+        max_queue: Optional[int] = default_max_queue,
+        overflow: Optional[Overflow] = None,
+    ) -> Subscription:
+        """
+        Subscribe to one or more glob-style patterns, see subscribe.
+        """
+        return await self._subscribe(b'PSUBSCRIBE', (pattern, *patterns), callback, decode, max_queue, overflow)
+
+    async def _subscribe(
+        self,
+        command: bytes,
+        names: Sequence[Union[bytes, str]],
+        callback: Optional[BatchCallback],
+        decode: bool,
+        max_queue: Optional[int],
+        overflow: Optional[Overflow],
+    ) -> Subscription:
+        if self._task is None:
+            raise RuntimeError('pubsub is not open')
+        if max_queue is default_max_queue:
+            max_queue = self._settings.max_queue
+        _check_max_queue(max_queue)
+        is_pattern = command == b'PSUBSCRIBE'
+        # duplicate names would deliver each message more than once
+        bnames = list(dict.fromkeys(n.encode(self._conn_settings.encoding) if isinstance(n, str) else n for n in names))
+        sub = Subscription(
+            self,
+            bnames,
+            is_pattern,
+            decode,
+            callback,
+            max_queue,
+            overflow or self._settings.overflow,
+        )
+
+        registry = self._patterns if is_pattern else self._channels
+        confirmation = b'psubscribe' if is_pattern else b'subscribe'
+        new: List[bytes] = []
+        futures: List[asyncio.Future[None]] = []
+        for name in bnames:
+            subs = registry.get(name)
+            if subs is None:
+                registry[name] = [sub]
+                new.append(name)
+            else:
+                subs.append(sub)
+            if subs is None or (confirmation, name) in self._confirming:
+                fut = self._loop.create_future()
+                self._confirming.setdefault((confirmation, name), []).append(fut)
+                futures.append(fut)
+
+        if new and self._writer is not None:
+            self._writer.write(encode_command(command, new))
+        try:
+            await asyncio.gather(*futures)
+        except BaseException:
+            await self._unsubscribe(sub)
+            raise
+        return sub
+
+    async def _unsubscribe(self, sub: Subscription) -> None:
+        registry = self._patterns if sub.is_pattern else self._channels
+        unused: List[bytes] = []
+        for name in sub.names:
+            subs = registry.get(name)
+            if subs is not None and sub in subs:
+                subs.remove(sub)
+                if not subs:
+                    del registry[name]
+                    unused.append(name)
+        sub._close()
+        if unused and self._writer is not None:
+            self._writer.write(encode_command(b'PUNSUBSCRIBE' if sub.is_pattern else b'UNSUBSCRIBE', unused))
+
+    async def _run(self, ready: asyncio.Future[None]) -> None:
+        """
+        Maintain the connection, reconnecting and subscribing again when it's lost.
+        """
+        delay = self._settings.reconnect_delay
+        while True:
+            try:
+                reader, writer = await open_stream(self._conn_settings)
+                try:
+                    await self._connected(reader, writer)
+                    if not ready.done():
+                        ready.set_result(None)
+                    delay = self._settings.reconnect_delay
+                    await self._listen(reader)
+                finally:
+                    self._writer = None
+                    writer.close()
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                    return
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._settings.max_reconnect_delay)
+
+    async def _connected(self, reader: RedisStreamReader, writer: RedisWriter) -> None:
+        if self._conn_settings.password is not None:
+            writer.write(encode_command(b'AUTH', [self._conn_settings.password.encode()]))
+            result = await reader.read_redis()
+            if isinstance(result, hiredis.ReplyError):
+                raise result
+
+        # subscribe to everything again, confirmations are handled by _listen
+        if self._channels:
+            writer.write(encode_command(b'SUBSCRIBE', list(self._channels)))
+        if self._patterns:
+            writer.write(encode_command(b'PSUBSCRIBE', list(self._patterns)))
+        self._writer = writer
+
+    async def _listen(self, reader: RedisStreamReader) -> None:
+        while True:
+            msg = await reader.read_redis()
+            # collect all the messages which have been received, then dispatch them together
+            batches: Dict[Subscription, List[Message]] = {}
+            while msg is not False:
+                self._on_message(msg, batches)
+                msg = reader.read_nowait()
+
+            for sub, messages in batches.items():
+                while messages:
+                    messages = sub._deliver(messages)
+                    if messages:
+                        # overflow is "block", stop reading until the subscriber has caught up
+                        await sub._wait_space()
+
+    def _on_message(self, msg: Any, batches: Dict[Subscription, List[Message]]) -> None:
+        kind = msg[0]
+        if kind == b'message':
+            subs = self._channels.get(msg[1])
+            pattern = None
+            channel, data = msg[1], msg[2]
+        elif kind == b'pmessage':
+            subs = self._patterns.get(msg[1])
+            pattern, channel, data = msg[1], msg[2], msg[3]
+        else:
+            if kind == b'subscribe' or kind == b'psubscribe':
+                for fut in self._confirming.pop((kind, msg[1]), ()):
+                    if not fut.done():
+                        fut.set_result(None)
+            return
+
+        if not subs:
+            # unsubscribed since the message was sent
+            return
+        raw: Optional[Message] = None
+        decoded: Optional[Message] = None
+        for sub in subs:
+            if sub.decode:
+                if decoded is None:
+                    encoding = self._conn_settings.encoding
+                    decoded = Message(
+                        channel.decode(encoding, 'replace'),
+                        data.decode(encoding, 'replace'),
+                        None if pattern is None else pattern.decode(encoding, 'replace'),
+                    )
+                message = decoded
+            else:
+                if raw is None:
+                    raw = Message(channel, data, pattern)
+                message = raw
+            messages = batches.get(sub)
+            if messages is None:
+                batches[sub] = [message]
+            else:
+                messages.append(message)
+
+
+def _check_max_queue(max_queue: Optional[int]) -> None:
+    # with no room in the queue "block" would stop reading for good and "drop_oldest" would drop every message
+    if max_queue is not None and max_queue < 1:
+        raise ValueError('max_queue must be at least 1, or None for no limit')
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, List, Optional, Sequence, Union
+
+from hiredis import ReplyError
+
+from .connection import ConnectionSettings, RawConnection, create_raw_connection, default_timeout
+from .pool import ConnectionPool, PoolSettings, create_pool
+from .typing import Callback, CommandArgs, ReturnAs
+
+__all__ = 'ReplicaSettings', 'ReplicaSet', 'read_only_commands'
+
+# commands which are sent to replicas
+read_only_commands = {b'GET', b'MGET', b'STRLEN', b'GETRANGE', b'GETBIT', b'BITCOUNT', b'BITPOS', b'EXISTS'}
+# number of latencies used to calculate the hedge delay and how often it's recalculated
+_latency_window = 1000
+_latency_update = 100
+
+
+@dataclass
+class ReplicaSettings:
+    """
+    Replica settings
+    """
+
+    replicas: Sequence[ConnectionSettings] = field(default_factory=list)
+    # send a duplicate read to a second replica when the first hasn't replied after the hedge_percentile latency
+    hedge: bool = False
+    hedge_percentile: float = 95
+    # bounds of the hedge delay, max_hedge_delay is used until enough latencies have been recorded
+    min_hedge_delay: float = 0.001
+    max_hedge_delay: float = 0.1
+
+    def __repr__(self) -> str:
+        fields = 'replicas', 'hedge', 'hedge_percentile', 'min_hedge_delay', 'max_hedge_delay'
+        return 'ReplicaSettings({})'.format(', '.join(f'{f}={getattr(self, f)!r}' for f in fields))
+
+
+class _Replica:
+    __slots__ = 'conn', 'outstanding'
+
+    def __init__(self, conn: Union[RawConnection, ConnectionPool]):
+        self.conn = conn
+        # requests sent to this replica which haven't completed
+        self.outstanding = 0
+
+
+class ReplicaSet:
+    """
+    Sends read commands to the replica with the fewest outstanding requests.
+
+    With hedging, if the replica hasn't replied after the hedge delay the command is also sent to another replica and
+    the first reply is used. The hedge delay is the hedge_percentile of recent read latencies so roughly
+    100 - hedge_percentile percent of reads are duplicated.
+    """
+
+    __slots__ = '_settings', '_loop', '_replicas', '_next', '_latencies', '_latency_count', 'hedge_delay', 'hedged'
+
+    def __init__(self, replica_settings: ReplicaSettings):
+        self._settings = replica_settings
+        self._loop = asyncio.get_event_loop()
+        self._replicas: List[_Replica] = []
+        # where the search for the least busy replica starts, rotated so idle replicas are used in turn
+        self._next = 0
+        self._latencies: Deque[float] = deque(maxlen=_latency_window)
+        self._latency_count = 0
+        self.hedge_delay = replica_settings.max_hedge_delay
+        # number of reads sent to a second replica
+        self.hedged = 0
+
+    @property
+    def outstanding(self) -> List[int]:
+        return [r.outstanding for r in self._replicas]
+
+    async def open(self, pool_settings: Optional[PoolSettings] = None) -> None:
+        """
+        Connect to all replicas, with a pool of connections to each if pool_settings is provided.
+        """
+        if not self._settings.replicas:
+            raise ValueError('at least one replica is required')
+        conns: List[Union[RawConnection, ConnectionPool]] = []
+        try:
+            for conn_settings in self._settings.replicas:
+                if pool_settings is None:
+                    conns.append(await create_raw_connection(conn_settings))
+                else:
+                    conns.append(await create_pool(conn_settings, pool_settings))
+        except BaseException:
+            await asyncio.gather(*[c.close() for c in conns])
+            raise
+        self._replicas = [_Replica(c) for c in conns]
+
+    async def close(self) -> None:
+        replicas, self._replicas = self._replicas, []
+        await asyncio.gather(*[r.conn.close() for r in replicas])
+
+    async def execute(
+        self,
+        args: CommandArgs,
+        return_as: ReturnAs,
+        callback: Optional[Callback] = None,
+        timeout: Optional[float] = default_timeout,
+    ) -> Any:
+        first = self._pick(None)
+        if not self._settings.hedge or len(self._replicas) < 2:
+            return await self._read(first, args, return_as, callback, timeout)
+
+        tasks = {self._loop.create_task(self._read(first, args, return_as, callback, timeout))}
+        try:
+            done, tasks = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done:
+                self.hedged += 1
+                second = self._pick(first)
+                tasks.add(self._loop.create_task(self._read(second, args, return_as, callback, timeout)))
+
+            exc: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    task_exc = task.exception()
+                    if task_exc is None:
+                        return task.result()
+                    elif isinstance(task_exc, ReplyError):
+                        # the other replica would reply with the same error
+                        raise task_exc
+                    elif exc is None:
+                        exc = task_exc
+                if not tasks:
+                    raise exc  # type: ignore
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _pick(self, exclude: Optional[_Replica]) -> _Replica:
+        replicas = self._replicas
+        count = len(replicas)
+        start = self._next
+        self._next = (start + 1) % count
+        best: Optional[_Replica] = None
+        for i in range(count):
+            replica = replicas[(start + i) % count]
+            if replica is not exclude and (best is None or replica.outstanding < best.outstanding):
+                best = replica
+        return best  # type: ignore
+
+    async def _read(
+        self,
+        replica: _Replica,
+        args: CommandArgs,
+        return_as: ReturnAs,
+        callback: Optional[Callback],
+        timeout: Optional[float],
+    ) -> Any:
+        replica.outstanding += 1
+        start = self._loop.time()
+        try:
+            result = await replica.conn.execute(args, return_as, callback, timeout)
+        except asyncio.CancelledError:
+            # e.g. a read which lost the race with a hedged read, it took at least this long, leaving it out would
+            # bias the hedge delay low
+            self._record(self._loop.time() - start)
+            raise
+        finally:
+            replica.outstanding -= 1
+        self._record(self._loop.time() - start)
+        return result
+
+    def _record(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._latency_count += 1
+        if self._latency_count % _latency_update == 0:
+            latencies = sorted(self._latencies)
+            delay = latencies[min(int(len(latencies) * self._settings.hedge_percentile / 100), len(latencies) - 1)]
+            self.hedge_delay = min(max(delay, self._settings.min_hedge_delay), self._settings.max_hedge_delay)
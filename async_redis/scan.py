@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+__all__ = ('ScanIterator',)
+
+# bounds of COUNT when it's adapted to the target latency
+min_count = 10
+max_count = 100_000
+
+# function taking the cursor and COUNT and returning the next cursor and the items of a page
+FetchPage = Callable[[int, int], Awaitable[Tuple[int, List[Any]]]]
+
+
+class ScanIterator:
+    """
+    Async iterator over all the items of a SCAN, SSCAN, HSCAN or ZSCAN, pages() iterates over whole pages.
+
+    The next page is requested as soon as a page is received so it's fetched while the caller processes the
+    current one. If target_latency is set, COUNT is adjusted after each page so pages take roughly that long to fetch.
+    """
+
+    __slots__ = '_fetch', 'count', '_target_latency', 'pages_fetched'
+
+    def __init__(self, fetch: FetchPage, count: int = 100, target_latency: Optional[float] = None):
+        self._fetch = fetch
+        self.count = count
+        self._target_latency = target_latency
+        self.pages_fetched = 0
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._items()
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        loop = asyncio.get_event_loop()
+        task: Optional[asyncio.Task[Tuple[int, List[Any]]]] = loop.create_task(self._fetch_page(0))
+        try:
+            while task is not None:
+                cursor, page = await task
+                # fetch the next page while this one is processed
+                task = loop.create_task(self._fetch_page(cursor)) if cursor != 0 else None
+                if page:
+                    yield page
+        finally:
+            if task is not None:
+                if task.done():
+                    # avoid "exception was never retrieved" if the prefetch failed
+                    task.cancelled() or task.exception()
+                else:
+                    task.cancel()
+
+    async def _items(self) -> AsyncIterator[Any]:
+        async for page in self.pages():
+            for item in page:
+                yield item
+
+    async def _fetch_page(self, cursor: int) -> Tuple[int, List[Any]]:
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        result = await self._fetch(cursor, self.count)
+        self.pages_fetched += 1
+        if self._target_latency is not None:
+            self._adapt(loop.time() - start)
+        return result
+
+    def _adapt(self, latency: float) -> None:
+        # change COUNT in proportion to how far the latency is from the target, but by at most a factor of 2
+        ratio = min(max(self._target_latency / max(latency, 1e-6), 0.5), 2)  # type: ignore
+        self.count = min(max(int(self.count * ratio), min_count), max_count)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Union
+
+from .typing import ArgType, Command, CommandArgs
+
+if TYPE_CHECKING:
+    from .commands import AbstractCommands
+
+__all__ = 'Script', 'script_load_commands', 'evalsha_script', 'noscript_script'
+
+# scripts registered with a client by SHA1, they're loaded when redis replies NOSCRIPT, see RawConnection.scripts
+Scripts = Dict[str, 'Script']
+
+
+class Script:
+    """
+    Lua script which is always run with EVALSHA, see AbstractCommands.register_script.
+    """
+
+    __slots__ = 'source', 'sha'
+
+    def __init__(self, source: Union[str, bytes]):
+        self.source = source.encode() if isinstance(source, str) else source
+        self.sha = hashlib.sha1(self.source).hexdigest()
+
+    def __call__(
+        self,
+        commands: 'AbstractCommands',
+        keys: Sequence[ArgType] = (),
+        args: Sequence[ArgType] = (),
+        *,
+        decode: bool = True,
+    ) -> Any:
+        """
+        Run the script with a Redis instance or pipeline.
+        """
+        return commands.evalsha(self.sha, keys, args, decode=decode)
+
+    def __repr__(self) -> str:
+        return f'Script(sha={self.sha!r})'
+
+
+def script_load_commands(scripts: Sequence[Script]) -> List[Command]:
+    return [((b'SCRIPT', b'LOAD', script.source), None, None) for script in scripts]
+
+
+def evalsha_script(args: CommandArgs, scripts: Scripts) -> Optional[Script]:
+    """
+    If args is EVALSHA of a script in scripts, return the script.
+    """
+    if args[0] == b'EVALSHA':
+        sha = args[1]
+        return scripts.get(sha.decode() if isinstance(sha, bytes) else sha)  # type: ignore
+    return None
+
+
+def noscript_script(args: CommandArgs, exc: Exception, scripts: Scripts) -> Optional[Script]:
+    """
+    If exc is a NOSCRIPT error in reply to EVALSHA of a script in scripts, return the script.
+    """
+    return evalsha_script(args, scripts) if str(exc).startswith('NOSCRIPT') else None
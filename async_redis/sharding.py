@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from bisect import bisect_left
+from hashlib import md5
+from types import TracebackType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from .cluster import _hash_tag, broadcast_commands, keyless_commands, script_commands
+from .connection import ConnectionSettings, RawConnection, create_raw_connection, default_timeout
+from .main import Redis
+from .pool import ConnectionPool, PoolSettings, create_pool
+from .scripts import Script, Scripts
+from .streams import BulkStream
+from .transaction import Transaction
+from .typing import ArgType, Callback, Command, CommandArgs, ReturnAs
+from .utils import apply_callback
+
+__all__ = 'HashRing', 'ShardedConnection', 'ShardedRedis', 'create_sharded'
+
+Connection = Union[RawConnection, ConnectionPool]
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(md5(data).digest()[:4], 'little')
+
+
+class HashRing:
+    """
+    Ketama consistent hash ring: each node is placed at vnodes points on a ring of 32 bit hashes and a key belongs
+    to the node at the first point after the key's hash. Removing one of N nodes only moves the keys of that node,
+    about 1/N of all keys, adding a node only moves the keys it takes over.
+
+    Points are derived from node names, so every client with the same names routes keys the same way.
+    """
+
+    __slots__ = 'names', '_points', '_nodes'
+
+    def __init__(self, names: Sequence[str], vnodes: int = 160):
+        if not names:
+            raise ValueError('at least one node is required')
+        if len(set(names)) != len(names):
+            raise ValueError('node names must be unique')
+        self.names = list(names)
+        points: List[Tuple[int, int]] = []
+        for node, name in enumerate(names):
+            # as in libketama each md5 digest gives four points
+            for i in range((vnodes + 3) // 4):
+                digest = md5(f'{name}-{i}'.encode()).digest()
+                for h in range(4):
+                    points.append((int.from_bytes(digest[h * 4 : h * 4 + 4], 'little'), node))
+        points.sort()
+        self._points = [p for p, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def node(self, key: bytes) -> int:
+        """
+        Index of the node a key belongs to, if the key contains a hash tag "{...}" only the tag is hashed.
+        """
+        index = bisect_left(self._points, _hash(_hash_tag(key)))
+        return self._nodes[index if index < len(self._nodes) else 0]
+
+
+def shard_name(conn_settings: ConnectionSettings) -> str:
+    """
+    Name of a shard on the hash ring, keys only move between shards if their names change.
+    """
+    return f'{conn_settings.host}:{conn_settings.port}/{conn_settings.database}'
+
+
+class ShardedConnection:
+    """
+    Connection interface over several independent redis instances, each command is sent to the shard its key
+    belongs to on a HashRing, see ShardedRedis.
+
+    MGET and MSET are split into one command per shard, pipelines are split into one batch per shard, shards are
+    queried concurrently and results are returned in order. Other commands with several keys are sent to the shard
+    of their first key, so keys used together should share a hash tag. FLUSHALL, FLUSHDB and SCRIPT are sent to
+    every shard, other commands without keys to a random shard.
+    """
+
+    __slots__ = '_conns', '_settings', '_ring', 'scripts'
+
+    def __init__(self, conns: Sequence[Connection], settings: Sequence[ConnectionSettings], vnodes: int = 160):
+        if len(conns) != len(settings):
+            raise ValueError('one connection is required per shard')
+        self._conns = list(conns)
+        self._settings = list(settings)
+        self._ring = HashRing([shard_name(s) for s in settings], vnodes)
+        # scripts registered with the client, shared by every shard, see RawConnection.scripts
+        self.scripts: Scripts = {}
+        for conn in self._conns:
+            conn.scripts = self.scripts
+
+    @property
+    def shards(self) -> List[ConnectionSettings]:
+        return list(self._settings)
+
+    def shard_for_key(self, key: ArgType) -> int:
+        return self._ring.node(self._key(key))
+
+    def connection(self, shard: int) -> Connection:
+        return self._conns[shard]
+
+    def register_script(self, script: Script) -> None:
+        """
+        Add a script to scripts and load it on every shard.
+        """
+        for conn in self._conns:
+            conn.register_script(script)
+
+    async def execute(
+        self,
+        args: CommandArgs,
+        return_as: ReturnAs = None,
+        callback: Optional[Callback] = None,
+        timeout: Optional[float] = default_timeout,
+    ) -> Any:
+        shard = self._shard(args)
+        if shard is None:
+            return await self._execute_split(args, return_as, callback, timeout)
+        return await self._conns[shard].execute(args, return_as, callback, timeout)
+
+    async def execute_many(self, commands: Sequence[Command], timeout: Optional[float] = default_timeout) -> List[Any]:
+        """
+        Execute commands with one execute_many per shard, if any command fails the first error is raised once all
+        replies have been read.
+        """
+        by_shard: Dict[int, List[int]] = {}
+        split: List[int] = []
+        for i, (args, _, _) in enumerate(commands):
+            shard = self._shard(args)
+            if shard is None:
+                split.append(i)
+            else:
+                by_shard.setdefault(shard, []).append(i)
+
+        aws: List[Awaitable[Any]] = [
+            self._conns[shard].execute_many([commands[i] for i in indices], timeout)
+            for shard, indices in by_shard.items()
+        ]
+        aws += [self._execute_split(*commands[i], timeout) for i in split]
+        gathered = await asyncio.gather(*aws, return_exceptions=True)
+        replies: List[Any] = []
+        for reply in gathered:
+            if isinstance(reply, BaseException):
+                raise reply
+            replies.append(reply)
+
+        results: List[Any] = [None] * len(commands)
+        shard_replies: List[List[Any]] = replies[: len(by_shard)]
+        for indices, shard_results in zip(by_shard.values(), shard_replies):
+            for i, result in zip(indices, shard_results):
+                results[i] = result
+        for i, result in zip(split, replies[len(by_shard) :]):
+            results[i] = result
+        return results
+
+    async def execute_transaction(
+        self, commands: Sequence[Command], *, timeout: Optional[float] = default_timeout
+    ) -> Optional[List[Any]]:
+        """
+        Execute a transaction, all the commands' keys must belong to the same shard.
+        """
+        shards = {self._shard(args) for args, _, _ in commands}
+        shard = shards.pop() if len(shards) == 1 else None
+        if shard is None:
+            raise ValueError('all keys in a transaction must belong to the same shard, use a hash tag')
+        return await self._conns[shard].execute_transaction(commands, timeout=timeout)
+
+    async def execute_stream(self, args: CommandArgs) -> Optional[BulkStream]:
+        return await self._conns[self.shard_for_key(args[1])].execute_stream(args)
+
+    async def close(self) -> None:
+        await asyncio.gather(*[conn.close() for conn in self._conns])
+
+    def _shard(self, args: CommandArgs) -> Optional[int]:
+        """
+        Index of the shard a command should be sent to, None if it has to be split or sent to every shard.
+        """
+        command = args[0]
+        if command == b'MGET' or command == b'MSET':
+            step = 1 if command == b'MGET' else 2
+            shards = {self.shard_for_key(key) for key in args[1::step]}
+            return shards.pop() if len(shards) == 1 else None
+        elif command in broadcast_commands:
+            return None
+        elif command in script_commands:
+            # the first key is after the script and the number of keys
+            return self.shard_for_key(args[3]) if int(args[2]) > 0 else random.randrange(len(self._conns))
+        elif command in keyless_commands or len(args) < 2:
+            return random.randrange(len(self._conns))
+        else:
+            return self.shard_for_key(args[1])
+
+    async def _execute_split(
+        self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback], timeout: Optional[float]
+    ) -> Any:
+        command = args[0]
+        if command == b'MGET':
+            by_shard: Dict[int, List[int]] = {}
+            for i, key in enumerate(args[1:]):
+                by_shard.setdefault(self.shard_for_key(key), []).append(i)
+            replies = await asyncio.gather(
+                *[
+                    self._conns[shard].execute([b'MGET', *(args[i + 1] for i in indices)], return_as, None, timeout)
+                    for shard, indices in by_shard.items()
+                ]
+            )
+            values: List[Any] = [None] * (len(args) - 1)
+            for indices, reply in zip(by_shard.values(), replies):
+                for i, value in zip(indices, reply):
+                    values[i] = value
+            # the callback applies to the whole reply, e.g. decoding the values with a codec
+            return values if callback is None else apply_callback(values, callback)
+        elif command == b'MSET':
+            shard_args: Dict[int, List[ArgType]] = {}
+            for i in range(1, len(args), 2):
+                shard_args.setdefault(self.shard_for_key(args[i]), [b'MSET']).extend(args[i : i + 2])
+            await asyncio.gather(*[self._conns[s].execute(a, return_as, None, timeout) for s, a in shard_args.items()])
+            return None
+        else:
+            # broadcast, the reply from the first shard is returned
+            results = await asyncio.gather(*[conn.execute(args, return_as, callback, timeout) for conn in self._conns])
+            return results[0]
+
+    def _key(self, key: ArgType) -> bytes:
+        if isinstance(key, bytes):
+            return key
+        elif isinstance(key, str):
+            return key.encode(self._settings[0].encoding)
+        elif isinstance(key, (int, float)):
+            return str(key).encode()
+        else:
+            return bytes(key)
+
+
+class ShardedRedis(Redis):
+    """
+    Redis client over several independent redis instances with keys distributed by consistent hashing, see
+    ShardedConnection and HashRing. Use create_sharded to connect.
+
+    Pipelines are split per shard, transactions and watch require all their keys to belong to one shard.
+    """
+
+    __slots__ = ()
+
+    _conn: ShardedConnection
+
+    def shard_for_key(self, key: ArgType) -> ConnectionSettings:
+        """
+        Settings of the shard a key belongs to.
+        """
+        return self._conn.shards[self._conn.shard_for_key(key)]
+
+    async def watch(
+        self,
+        func: Callable[[Redis, Transaction], Awaitable[Any]],
+        key: ArgType,
+        *keys: ArgType,
+        retries: int = 10,
+        backoff: float = 0.01,
+        max_backoff: float = 1,
+    ) -> List[Any]:
+        """
+        As Redis.watch, func is called with a Redis using the connection to the watched keys' shard.
+        """
+        shards = {self._conn.shard_for_key(k) for k in (key, *keys)}
+        if len(shards) != 1:
+            raise ValueError('all watched keys must belong to the same shard, use a hash tag')
+        redis = Redis(self._conn.connection(shards.pop())).with_timeout(self._timeout).with_codec(self._codec)
+        return await redis.watch(func, key, *keys, retries=retries, backoff=backoff, max_backoff=max_backoff)
+
+    async def __aenter__(self) -> 'ShardedRedis':
+        return self
+
+    async def __aexit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        await self.close()
+
+
+async def create_sharded(
+    shards: Sequence[ConnectionSettings], pool_settings: Optional[PoolSettings] = None, *, vnodes: int = 160
+) -> ShardedRedis:
+    """
+    Connect to every shard, with a pool of connections to each if pool_settings is provided, and create a
+    ShardedRedis. Shards are identified on the hash ring by host, port and database.
+    """
+    aws: List[Awaitable[Connection]]
+    if pool_settings is None:
+        aws = [create_raw_connection(s) for s in shards]
+    else:
+        aws = [create_pool(s, pool_settings) for s in shards]
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    conns: List[Connection] = [r for r in results if not isinstance(r, BaseException)]
+    try:
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
+        return ShardedRedis(ShardedConnection(conns, shards, vnodes))
+    except BaseException:
+        await asyncio.gather(*[c.close() for c in conns])
+        raise
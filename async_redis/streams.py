@@ -1,58 +1,504 @@
 from __future__ import annotations
 
 import asyncio
-from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Union
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Type, Union
 
 from hiredis import hiredis
 
-__all__ = ('open_connection', 'RedisStreamReader')
+from .metrics import Metrics
+
+__all__ = (
+    'open_connection',
+    'RedisProtocol',
+    'RedisWriter',
+    'RedisStreamReader',
+    'BulkStream',
+    'HiredisParser',
+    'PythonParser',
+    'parsers',
+)
 
 _DEFAULT_LIMIT = 2 ** 16  # 64 KiB
+# a raised read limit is halved after this many replies have been read without needing it
+_shrink_after = 128
+# socket options as passed to setsockopt: level, option and value
+SocketOption = Tuple[int, int, int]
+# type of RESP3 push messages, only available with hiredis>=3.2
+_push_type: Any = getattr(hiredis, 'PushNotification', None)
 
 
 async def open_connection(
-    host: str, port: int, *, limit: int = _DEFAULT_LIMIT, **kwds: Any
-) -> Tuple['RedisStreamReader', asyncio.StreamWriter]:
+    host: str,
+    port: int,
+    *,
+    path: Optional[str] = None,
+    limit: int = _DEFAULT_LIMIT,
+    max_limit: Optional[int] = None,
+    parser: str = 'hiredis',
+    socket_options: Sequence[SocketOption] = (),
+    **kwds: Any,
+) -> Tuple['RedisStreamReader', 'RedisWriter']:
+    """
+    Connect to host and port, or to the unix socket at path if it's set, and set socket_options on the socket.
+    """
     loop = asyncio.get_event_loop()
-    reader = RedisStreamReader(limit=limit, loop=loop)
-    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
-    transport, _ = await loop.create_connection(lambda: protocol, host, port, **kwds)
-    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
-    return reader, writer
+    reader = RedisStreamReader(limit=limit, loop=loop, parser=parser, max_limit=max_limit)
+    protocol = RedisProtocol(reader, loop)
+    if path is None:
+        transport, _ = await loop.create_connection(lambda: protocol, host, port, **kwds)
+    else:
+        transport, _ = await loop.create_unix_connection(lambda: protocol, path, **kwds)
+    sock = transport.get_extra_info('socket')
+    try:
+        for level, option, value in socket_options:
+            sock.setsockopt(level, option, value)
+    except BaseException:
+        transport.close()
+        raise
+    return reader, RedisWriter(transport, protocol)
+
+
+class RedisProtocol(asyncio.Protocol):
+    """
+    Protocol which passes received data straight to a RedisStreamReader, it replaces asyncio.StreamReaderProtocol
+    which has extra machinery for SSL, servers and callbacks we don't need.
+    """
+
+    __slots__ = '_reader', '_loop', '_transport', '_paused', '_drain_waiters', '_lost', 'closed'
+
+    def __init__(self, reader: 'RedisStreamReader', loop: asyncio.AbstractEventLoop):
+        self._reader = reader
+        self._loop = loop
+        self._transport: Optional[asyncio.Transport] = None
+        # whether the transport's write buffer is over its high-water mark
+        self._paused = False
+        self._drain_waiters: Deque[asyncio.Future[None]] = deque()
+        self._lost = False
+        self.closed: asyncio.Future[None] = loop.create_future()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = transport  # type: ignore
+        self._reader.set_transport(transport)  # type: ignore
+
+    def data_received(self, data: bytes) -> None:
+        self._reader.feed_data(data)
+
+    def eof_received(self) -> bool:
+        self._reader.feed_eof()
+        # returning False closes the transport, redis never half-closes connections
+        return False
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._lost = True
+        if exc is None:
+            self._reader.feed_eof()
+        else:
+            self._reader.set_exception(exc)
+        if not self.closed.done():
+            self.closed.set_result(None)
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(ConnectionResetError('Connection lost'))
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self) -> None:
+        if self._lost:
+            raise ConnectionResetError('Connection lost')
+        if not self._paused:
+            return
+        waiter = self._loop.create_future()
+        self._drain_waiters.append(waiter)
+        await waiter
+
+
+class RedisWriter:
+    """
+    Minimal replacement for asyncio.StreamWriter, writes go straight to the transport.
+    """
+
+    __slots__ = 'transport', '_protocol'
+
+    def __init__(self, transport: asyncio.Transport, protocol: RedisProtocol):
+        self.transport = transport
+        self._protocol = protocol
+
+    def write(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data: Sequence[Union[bytes, bytearray, memoryview]]) -> None:
+        self.transport.writelines(data)
+
+    def close(self) -> None:
+        self.transport.close()
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.transport.get_extra_info(name, default)
+
+    async def drain(self) -> None:
+        """
+        Wait until the transport's write buffer is below its high-water mark.
+        """
+        await self._protocol.drain()
+
+    async def wait_closed(self) -> None:
+        await self._protocol.closed
+
+
+# types of reply which are converted by a reply type's convert function
+_scalars = bytes, str, int, float
+
 
+class HiredisParser:
+    """
+    Parses replies with hiredis, typed replies are converted once hiredis has parsed them.
+    """
+
+    __slots__ = '_reader', '_encoding', '_convert'
+
+    def __init__(self) -> None:
+        self._reader = hiredis.Reader()
+        self._encoding: Optional[str] = None
+        self._convert: Optional[Callable[[Any], Any]] = None
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        # hiredis accepts any buffer but its stubs only allow bytes, converting would copy the data
+        self._reader.feed(data)  # type: ignore
+
+    def len(self) -> int:
+        return self._reader.len()
+
+    def set_reply_type(self, encoding: Optional[str], convert: Optional[Callable[[Any], Any]]) -> None:
+        """
+        Set how strings in the next reply are decoded and the function used to convert a reply or the elements of
+        an array reply, e.g. int or float.
+        """
+        if encoding != self._encoding:
+            self._encoding = encoding
+            self._reader.set_encoding(encoding)
+        self._convert = convert
+
+    def gets(self) -> Any:
+        """
+        Return the next reply, False if it hasn't been received in full. Errors converting the reply are returned,
+        not raised.
+        """
+        result = self._reader.gets()
+        convert = self._convert
+        if convert is None or result is False or result is None or type(result) is convert:
+            # RESP3 replies may already have the right type
+            return result
+        elif _push_type is not None and isinstance(result, _push_type):
+            return result
+        try:
+            if isinstance(result, list):
+                return [None if r is None else convert(r) for r in result]
+            elif isinstance(result, _scalars):
+                return convert(result)
+            else:
+                # errors and maps are returned as they are
+                return result
+        except (ValueError, TypeError) as e:
+            if isinstance(result, list):
+                return self._convert_elements(result, convert)
+            return e
+
+    @staticmethod
+    def _convert_elements(result: List[Any], convert: Callable[[Any], Any]) -> Any:
+        """
+        Slow path for arrays which contain errors or nested aggregates, they're kept as they are as PythonParser
+        does, only strings and numbers are converted.
+        """
+        try:
+            return [convert(r) if isinstance(r, _scalars) else r for r in result]
+        except (ValueError, TypeError) as e:
+            return e
+
+
+class _Aggregate:
+    __slots__ = 'kind', 'items', 'remaining'
+
+    def __init__(self, kind: int, remaining: int):
+        self.kind = kind
+        self.items: List[Any] = []
+        self.remaining = remaining
 
-class RedisStreamReader(asyncio.StreamReader):
+    def finish(self) -> Any:
+        if self.kind == _MAP:
+            items = self.items
+            return {items[i]: items[i + 1] for i in range(0, len(items), 2)}
+        elif self.kind == _PUSH and _push_type is not None:
+            return _push_type(self.items)
+        else:
+            return self.items
+
+
+# reply type bytes
+_BULK, _SIMPLE, _ERROR, _INT, _ARRAY = b'$+-:*'
+_NULL, _DOUBLE, _BOOL, _BIG_NUMBER, _VERBATIM, _BLOB_ERROR, _MAP, _SET, _PUSH = b'_,#(=!%~>'
+
+
+class PythonParser:
     """
-    Modified asyncio.StreamReader that uses a hiredis.Reader instead of bytearray as a buffer, otherwise
-    this class attempts to keep the flow control logic unchanged
+    RESP2 and RESP3 parser which decodes strings and converts numeric values as replies are parsed, straight from
+    the receive buffer. Converting large replies this way avoids creating a bytes object per element and a second
+    list. This module is compiled along with the rest of the package when it's built with cython.
+
+    Replies are returned as hiredis would return them.
     """
 
-    __slots__ = '_limit', '_loop', '_eof', '_waiter', '_exception', '_transport', '_paused', 'hi_reader'
-    _source_traceback = None
+    __slots__ = '_buf', '_pos', '_stack', '_encoding', '_convert', '_error'
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        # start of the unparsed data in _buf
+        self._pos = 0
+        # arrays and maps of the current reply which haven't been received in full
+        self._stack: List[_Aggregate] = []
+        self._encoding: Optional[str] = None
+        self._convert: Optional[Callable[[Any], Any]] = None
+        self._error: Optional[Exception] = None
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        self._buf += data
+
+    def len(self) -> int:
+        return len(self._buf) - self._pos
+
+    def set_reply_type(self, encoding: Optional[str], convert: Optional[Callable[[Any], Any]]) -> None:
+        """
+        Set how strings in the next reply are decoded and the function used to convert a reply or the elements of
+        an array reply, e.g. int or float.
+        """
+        self._encoding = encoding
+        self._convert = convert
+
+    def gets(self) -> Any:
+        """
+        Return the next reply, False if it hasn't been received in full. Errors converting the reply are returned,
+        not raised.
+        """
+        buf = self._buf
+        view = memoryview(buf)
+        try:
+            result = self._parse(buf, view)
+        finally:
+            view.release()
+
+        if result is not False:
+            if self._pos == len(buf):
+                buf.clear()
+                self._pos = 0
+            elif self._pos > _DEFAULT_LIMIT:
+                del buf[: self._pos]
+                self._pos = 0
+            if self._error is not None:
+                result, self._error = self._error, None
+        return result
+
+    def _parse(self, buf: bytearray, view: memoryview) -> Any:  # noqa: C901
+        stack = self._stack
+        pos = self._pos
+        while True:
+            end = buf.find(b'\r\n', pos)
+            if end == -1:
+                return False
+            kind = buf[pos]
+            value: Any
+            if kind == _BULK or kind == _VERBATIM or kind == _BLOB_ERROR:
+                size = int(buf[pos + 1 : end])
+                if size < 0:
+                    value = None
+                    pos = end + 2
+                else:
+                    start = end + 2
+                    pos = start + size + 2
+                    if len(buf) < pos:
+                        return False
+                    if kind == _BULK:
+                        value = self._decode(buf, view, start, start + size)
+                    elif kind == _VERBATIM:
+                        # skip the format, e.g. "txt:"
+                        value = self._decode(buf, view, start + 4, start + size)
+                    else:
+                        value = hiredis.ReplyError(str(view[start : start + size], 'utf8', 'replace'))
+            elif kind in _aggregates:
+                count = int(buf[pos + 1 : end])
+                pos = end + 2
+                if count < 0:
+                    value = None
+                else:
+                    aggregate = _Aggregate(kind, count * 2 if kind == _MAP else count)
+                    if aggregate.remaining:
+                        stack.append(aggregate)
+                        self._pos = pos
+                        continue
+                    value = aggregate.finish()
+            else:
+                value = self._parse_line(buf, view, kind, pos + 1, end)
+                pos = end + 2
 
-    def __init__(self, limit: int, loop: asyncio.AbstractEventLoop):
+            self._pos = pos
+            while stack:
+                aggregate = stack[-1]
+                aggregate.items.append(value)
+                aggregate.remaining -= 1
+                if aggregate.remaining:
+                    break
+                stack.pop()
+                value = aggregate.finish()
+            else:
+                return value
+
+    def _parse_line(self, buf: bytearray, view: memoryview, kind: int, start: int, end: int) -> Any:
+        if kind == _SIMPLE:
+            return self._decode(buf, view, start, end)
+        elif kind == _INT:
+            return self._convert_value(int(buf[start:end]))
+        elif kind == _ERROR:
+            return hiredis.ReplyError(str(view[start:end], 'utf8', 'replace'))
+        elif kind == _NULL:
+            return None
+        elif kind == _DOUBLE:
+            return self._convert_value(float(buf[start:end]))
+        elif kind == _BOOL:
+            return self._convert_value(buf[start] == 116)  # t
+        elif kind == _BIG_NUMBER:
+            return self._decode(buf, view, start, end)
+        else:
+            raise hiredis.ProtocolError(f'Protocol error, got {chr(kind)!r} as reply type byte')
+
+    def _decode(self, buf: bytearray, view: memoryview, start: int, end: int) -> Any:
+        convert = self._convert
+        if convert is not None and self._converting():
+            if convert is int or convert is float:
+                # int() and float() accept bytearray, so the value is converted without creating bytes
+                return self._convert_value(buf[start:end])
+            return self._convert_value(view[start:end].tobytes())
+        elif self._encoding is None:
+            return view[start:end].tobytes()
+        else:
+            return str(view[start:end], self._encoding)
+
+    def _converting(self) -> bool:
+        # like HiredisParser, only a reply or the elements of an array reply are converted, never push messages
+        stack = self._stack
+        return not stack or (len(stack) == 1 and stack[0].kind != _PUSH and stack[0].kind != _MAP)
+
+    def _convert_value(self, value: Any) -> Any:
+        convert = self._convert
+        if convert is None or type(value) is convert or not self._converting():
+            return value
+        try:
+            return convert(value)
+        except (ValueError, TypeError) as e:
+            if self._error is None:
+                self._error = e
+            return None
+
+
+_aggregates = {_ARRAY, _MAP, _SET, _PUSH}
+parsers: Dict[str, Type[Union[HiredisParser, PythonParser]]] = {'hiredis': HiredisParser, 'python': PythonParser}
+
+
+class RedisStreamReader:
+    """
+    Reader in the style of asyncio.StreamReader which uses a reply parser (by default based on hiredis.Reader)
+    instead of bytearray as a buffer, the flow control logic is the same as asyncio.StreamReader's.
+
+    Replies can be awaited with read_redis(), or read_nowait() can be called from on_data which is called
+    whenever data has been received or the connection has been lost.
+    """
+
+    __slots__ = (
+        '_limit',
+        '_base_limit',
+        '_max_limit',
+        '_calm_replies',
+        '_loop',
+        '_eof',
+        '_waiter',
+        '_exception',
+        '_transport',
+        '_paused',
+        'parser',
+        '_parser_class',
+        '_bulk_header',
+        '_bulk_result',
+        '_bulk',
+        'metrics',
+        'on_data',
+    )
+
+    def __init__(
+        self, limit: int, loop: asyncio.AbstractEventLoop, parser: str = 'hiredis', max_limit: Optional[int] = None
+    ):
         if limit <= 0:
             raise ValueError('Limit cannot be <= 0')
+        try:
+            self._parser_class = parsers[parser]
+        except KeyError:
+            raise ValueError(f'unknown parser {parser!r}, must be one of: {", ".join(parsers)}')
 
-        self._limit = limit
+        # reading is paused while more than twice _limit bytes are buffered, _limit is raised up to _max_limit
+        # while replies bigger than it are received, see _raise_limit
+        self._limit = self._base_limit = limit
+        self._max_limit = max(max_limit or limit, limit)
+        self._calm_replies = 0
         self._loop = loop
         self._eof: bool = False  # Whether we're done.
         self._waiter: Optional[asyncio.Future[None]] = None  # A future used by _wait_for_data()
         self._exception: Optional[Exception] = None
         self._transport: Optional[asyncio.Transport] = None
         self._paused: bool = False
-        self.hi_reader = hiredis.Reader()
+        self.parser = self._parser_class()
+        # set by start_bulk() while waiting for the first line of a bulk string reply which is to be streamed
+        self._bulk_header: Optional[bytearray] = None
+        self._bulk_result: Any = None
+        self._bulk: Optional[BulkStream] = None
+        # set by RawConnection to count bytes read
+        self.metrics: Optional[Metrics] = None
+        self.on_data: Optional[Callable[[], None]] = None
+
+    def set_transport(self, transport: asyncio.Transport) -> None:
+        assert self._transport is None, 'Transport already set'
+        self._transport = transport
 
     def feed_data(self, data: bytes) -> None:
         assert not self._eof, 'feed_data after feed_eof'
 
         if not data:
             return
+        if self.metrics is not None:
+            self.metrics.bytes_read += len(data)
 
-        self.hi_reader.feed(data)
+        if self._bulk_header is not None:
+            data = self._feed_bulk_header(data)
+        if self._bulk is not None and data:
+            view = memoryview(data)
+            consumed = self._bulk._feed(view)
+            if self._bulk.received.done():
+                self._bulk = None
+            data = view[consumed:]  # type: ignore
+
+        if data:
+            self.parser.feed(data)
         self._wakeup_waiter()
 
-        if self._transport is not None and not self._paused and self.hi_reader.len() > 2 * self._limit:
+        if self._transport is not None and not self._paused and self._buffered() > 2 * self._limit:
             try:
                 self._transport.pause_reading()
             except NotImplementedError:
@@ -62,6 +508,8 @@ class RedisStreamReader(asyncio.StreamReader):
                 self._transport = None
             else:
                 self._paused = True
+        if self.on_data is not None:
+            self.on_data()
 
     async def read_redis(self) -> Union[bytes, List[bytes]]:
         """
@@ -71,28 +519,261 @@ class RedisStreamReader(asyncio.StreamReader):
             raise self._exception
 
         while True:
-            obj = self.hi_reader.gets()
+            obj = self.parser.gets()
 
             if obj is not False:
                 self._maybe_resume_transport()
+                if self._limit != self._base_limit:
+                    self._maybe_lower_limit()
                 return obj
 
             if self._eof:
-                self.hi_reader = hiredis.Reader()
+                self.parser = self._parser_class()
                 raise asyncio.IncompleteReadError(b'<redis>', None)
 
             await self._wait_for_data('read_redis')
 
+    def read_nowait(self) -> Any:
+        """
+        Return a parsed Redis object if a complete one has been received, otherwise False.
+        """
+        if self._exception is not None:
+            raise self._exception
+
+        obj = self.parser.gets()
+        if obj is not False:
+            self._maybe_resume_transport()
+            if self._limit != self._base_limit:
+                self._maybe_lower_limit()
+        elif self._eof:
+            self.parser = self._parser_class()
+            raise asyncio.IncompleteReadError(b'<redis>', None)
+        elif self._paused:
+            # a reply bigger than the limit is being received
+            self._resume_reading()
+        return obj
+
+    def start_bulk(self) -> None:
+        """
+        Stream the next reply rather than passing it to hiredis, it must be read with read_bulk().
+
+        This must only be called when hiredis has no unparsed data, i.e. when all earlier replies have been read.
+        """
+        self._bulk_header = bytearray()
+        self._bulk_result = None
+
+    async def read_bulk(self) -> Any:
+        """
+        Wait for the first line of a reply started with start_bulk(). Returns a BulkStream for a bulk string,
+        None for a nil reply, a ReplyError for an error or the parsed reply for any other type of reply.
+        """
+        while self._bulk_header is not None:
+            if self._exception is not None:
+                raise self._exception
+            if self._eof:
+                raise asyncio.IncompleteReadError(b'<redis>', None)
+            await self._wait_for_data('read_bulk')
+
+        result, self._bulk_result = self._bulk_result, None
+        if result is _not_bulk:
+            return await self.read_redis()
+        return result
+
+    def feed_eof(self) -> None:
+        self._abort_bulk(asyncio.IncompleteReadError(b'<redis>', None))
+        self._eof = True
+        self._wakeup_waiter()
+        if self.on_data is not None:
+            self.on_data()
+
+    def set_exception(self, exc: Exception) -> None:
+        self._abort_bulk(exc)
+        self._exception = exc
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            if not waiter.cancelled():
+                waiter.set_exception(exc)
+        if self.on_data is not None:
+            self.on_data()
+
+    async def _wait_for_data(self, func_name: str) -> None:
+        """
+        Wait until feed_data() or feed_eof() is called, resuming reading first if it's paused.
+        """
+        if self._waiter is not None:
+            raise RuntimeError(f'{func_name}() called while another coroutine is already waiting for incoming data')
+        assert not self._eof, '_wait_for_data after EOF'
+        if self._paused:
+            self._resume_reading()
+
+        self._waiter = self._loop.create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+    def _wakeup_waiter(self) -> None:
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            if not waiter.cancelled():
+                waiter.set_result(None)
+
+    def _feed_bulk_header(self, data: bytes) -> bytes:
+        """
+        Consume the first line of a streamed reply from data, returns the remaining data.
+        """
+        header: bytearray = self._bulk_header  # type: ignore
+        end = data.find(b'\n')
+        if end == -1:
+            header += data
+            return b''
+
+        header += data[: end + 1]
+        self._bulk_header = None
+        line = bytes(header)
+        if line[:1] == b'$':
+            size = int(line[1:-2])
+            if size < 0:
+                self._bulk_result = None
+            else:
+                self._bulk = self._bulk_result = BulkStream(self, size)
+        elif line[:1] == b'_':
+            # RESP3 null
+            self._bulk_result = None
+        elif line[:1] == b'-':
+            self._bulk_result = hiredis.ReplyError(line[1:-2].decode(errors='replace'))
+        else:
+            # not a bulk string, let the parser parse it
+            self.parser.feed(line)
+            self._bulk_result = _not_bulk
+        return memoryview(data)[end + 1 :]  # type: ignore
+
+    def _abort_bulk(self, exc: Exception) -> None:
+        if self._bulk is not None:
+            self._bulk._abort(exc)
+            self._bulk = None
+
+    def _buffered(self) -> int:
+        if self._bulk is None:
+            return self.parser.len()
+        else:
+            return self.parser.len() + self._bulk.buffered
+
+    def _raise_limit(self) -> None:
+        """
+        Called when more data is needed while reading is paused, i.e. a reply bigger than the limit is being
+        received. The limit is doubled so the rest of it isn't read in small bursts between pauses.
+        """
+        self._limit = min(self._limit * 2, self._max_limit)
+        self._calm_replies = 0
+
+    def _maybe_lower_limit(self) -> None:
+        self._calm_replies += 1
+        if self._calm_replies >= _shrink_after:
+            self._limit = max(self._limit // 2, self._base_limit)
+            self._calm_replies = 0
+
     def _maybe_resume_transport(self) -> None:
-        if self._paused and self.hi_reader.len() <= self._limit:
+        if self._paused and self._buffered() <= self._limit:
             self._paused = False
             self._transport.resume_reading()  # type: ignore
 
-    # to satisfy mypy since the type hints for asyncio.StreamReader are wrong
-    if TYPE_CHECKING:
+    def _resume_reading(self) -> None:
+        self._raise_limit()
+        self._paused = False
+        self._transport.resume_reading()  # type: ignore
+
+
+_not_bulk = object()
+
+
+class BulkStream:
+    """
+    Async iterator over the chunks of a bulk string reply as they're received from the connection.
+
+    Chunks are memoryviews of the data read from the socket, so the value is never buffered in full. The stream must
+    be consumed or closed, reading from the connection is paused while too much unconsumed data is buffered.
+    """
+
+    __slots__ = '_reader', 'size', '_remaining', '_chunks', 'buffered', '_waiter', '_discard', '_exc', 'received'
+
+    def __init__(self, reader: RedisStreamReader, size: int):
+        self._reader = reader
+        self.size = size
+        # bytes of the reply still to be received, including the trailing CRLF
+        self._remaining = size + 2
+        self._chunks: Deque[memoryview] = deque()
+        # bytes received but not yet consumed
+        self.buffered = 0
+        self._waiter: Optional[asyncio.Future[None]] = None
+        self._discard = False
+        self._exc: Optional[Exception] = None
+        # resolved once the whole reply has been received, regardless of how much has been consumed
+        self.received: asyncio.Future[None] = reader._loop.create_future()
+
+    @classmethod
+    def from_bytes(cls, reader: RedisStreamReader, value: bytes) -> 'BulkStream':
+        """
+        Create a stream of a value which has already been received in full.
+        """
+        stream = cls(reader, len(value))
+        stream._feed(memoryview(value))
+        stream._feed(memoryview(b'\r\n'))
+        return stream
+
+    def __aiter__(self) -> 'BulkStream':
+        return self
+
+    async def __anext__(self) -> memoryview:
+        while not self._chunks:
+            if self._exc is not None:
+                raise self._exc
+            if self._discard or self.received.done():
+                raise StopAsyncIteration
+            self._waiter = self._reader._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        chunk = self._chunks.popleft()
+        self.buffered -= len(chunk)
+        self._reader._maybe_resume_transport()
+        return chunk
+
+    def close(self) -> None:
+        """
+        Discard any data not yet consumed, the rest of the reply is still read from the connection but ignored.
+        """
+        self._discard = True
+        self._chunks.clear()
+        self.buffered = 0
+        self._reader._maybe_resume_transport()
+        self._wakeup()
+
+    def _feed(self, data: memoryview) -> int:
+        """
+        Take the part of data which belongs to this reply, returns the number of bytes consumed.
+        """
+        consumed = min(len(data), self._remaining)
+        value_size = min(consumed, self._remaining - 2)
+        if value_size > 0 and not self._discard:
+            self._chunks.append(data[:value_size])
+            self.buffered += value_size
+        self._remaining -= consumed
+        if self._remaining == 0:
+            self.received.set_result(None)
+        self._wakeup()
+        return consumed
 
-        def _wakeup_waiter(self) -> None:
-            ...
+    def _abort(self, exc: Exception) -> None:
+        self._exc = exc
+        if not self.received.done():
+            self.received.set_exception(exc)
+        self._wakeup()
 
-        async def _wait_for_data(self, func: str) -> None:
-            ...
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
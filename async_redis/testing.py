@@ -0,0 +1,682 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from hiredis import hiredis
+
+from .connection import ConnectionSettings
+
+__all__ = ('RespServer',)
+
+Args = List[bytes]
+
+
+class _Error(Exception):
+    """
+    Error replied to the client, the message should start with an error code like "ERR".
+    """
+
+
+class _Simple(bytes):
+    """
+    Reply sent as a simple string rather than a bulk string.
+    """
+
+
+OK = _Simple(b'OK')
+QUEUED = _Simple(b'QUEUED')
+_not_int = 'ERR value is not an integer or out of range'
+_not_float = 'ERR value is not a valid float'
+_syntax = 'ERR syntax error'
+
+
+def _int(value: bytes, msg: str = _not_int) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise _Error(msg)
+
+
+def _float(value: bytes) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise _Error(_not_float)
+
+
+def _format_float(value: float) -> bytes:
+    return (b'%.17g' % value).lower()
+
+
+def _range(length: int, start: int, end: int) -> Tuple[int, int]:
+    """
+    Convert an inclusive range which may use negative indexes, as used by GETRANGE and BITCOUNT, to a slice.
+    """
+    if start < 0:
+        start = max(length + start, 0)
+    if end < 0:
+        end = length + end
+    return start, max(min(end, length - 1) + 1, start)
+
+
+def encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b'$-1\r\n'
+    elif isinstance(reply, _Simple):
+        return b'+%s\r\n' % reply
+    elif isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    elif isinstance(reply, int):
+        return b':%d\r\n' % reply
+    elif isinstance(reply, _Error):
+        return b'-%s\r\n' % str(reply).encode()
+    else:
+        return b'*%d\r\n%s' % (len(reply), b''.join(encode_reply(r) for r in reply))
+
+
+class _Client:
+    __slots__ = 'authenticated', 'multi', 'multi_error', 'watched'
+
+    def __init__(self, authenticated: bool):
+        self.authenticated = authenticated
+        # commands queued after MULTI, and whether one of them couldn't be queued
+        self.multi: Optional[List[Args]] = None
+        self.multi_error = False
+        # version of each watched key when WATCH was called
+        self.watched: Dict[bytes, int] = {}
+
+
+class RespServer:
+    """
+    In-memory asyncio server speaking RESP2 for tests and benchmarks, so the client can be used without
+    redis-server and client overhead can be measured without the variance of a real server.
+
+    It implements the string commands plus basic key, server, transaction and script cache commands; keys can
+    be set directly in data. Faults can be injected: latency delays all replies as if the network were slow,
+    command_delays delays the replies to particular commands (and those after them on the same connection, as
+    redis would) and write_chunk_size splits replies into chunks written chunk_delay apart.
+
+    The server listens on host and port, or on a unix socket if unix_socket is set. It either runs on the current
+    event loop, see start() and close(), or on its own event loop in a thread, see start_thread() and stop_thread().
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        unix_socket: Optional[str] = None,
+        password: Optional[str] = None,
+        latency: float = 0,
+        command_delays: Optional[Dict[str, float]] = None,
+        write_chunk_size: Optional[int] = None,
+        chunk_delay: float = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.password = password
+        self.latency = latency
+        self.command_delays = {k.upper().encode(): v for k, v in (command_delays or {}).items()}
+        self.write_chunk_size = write_chunk_size
+        self.chunk_delay = chunk_delay
+        self.data: Dict[bytes, bytes] = {}
+        self.config: Dict[bytes, bytes] = {b'maxmemory': b'0'}
+        # number of commands received
+        self.commands = 0
+        self._expires: Dict[bytes, float] = {}
+        # incremented each time a key is modified, used by WATCH
+        self._versions: Dict[bytes, int] = {}
+        self._version = 0
+        self._scripts: Set[str] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task[None]] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def settings(self, **kwargs: Any) -> ConnectionSettings:
+        """
+        Settings to connect to the server.
+        """
+        return ConnectionSettings(
+            host=self.host, port=self.port, unix_socket=self.unix_socket, password=self.password, **kwargs
+        )
+
+    async def start(self) -> None:
+        if self.unix_socket is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+        else:
+            self._server = await asyncio.start_unix_server(self._handle, self.unix_socket)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self) -> 'RespServer':
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        await self.close()
+
+    def start_thread(self) -> None:
+        """
+        Run the server on a new event loop in a daemon thread, returns once it's listening. If the server fails to
+        start, the error is raised here.
+        """
+        loop = self._thread_loop = asyncio.new_event_loop()
+        started = threading.Event()
+        errors: List[BaseException] = []
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+            except BaseException as e:
+                errors.append(e)
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name='resp-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread.join()
+            self._thread = self._thread_loop = None
+            raise errors[0]
+
+    def stop_thread(self) -> None:
+        if self._thread is not None:
+            self._thread_loop.call_soon_threadsafe(self._thread_loop.stop)  # type: ignore
+            self._thread.join()
+            self._thread = self._thread_loop = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task: asyncio.Task[None] = asyncio.current_task()  # type: ignore
+        self._tasks.add(task)
+        replies: asyncio.Queue[Tuple[float, bytes]] = asyncio.Queue()
+        write_task = asyncio.get_event_loop().create_task(self._write_replies(writer, replies))
+        parser = hiredis.Reader()
+        client = _Client(self.password is None)
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                parser.feed(data)
+                out: List[bytes] = []
+                args = parser.gets()
+                while args is not False:
+                    delay = self.command_delays.get(args[0].upper()) if self.command_delays else None
+                    if delay:
+                        # replies to earlier commands aren't delayed
+                        if out:
+                            replies.put_nowait((time.monotonic() + self.latency, b''.join(out)))
+                            out = []
+                        await asyncio.sleep(delay)
+                    out.append(encode_reply(self._execute(client, args)))
+                    args = parser.gets()
+                if out:
+                    replies.put_nowait((time.monotonic() + self.latency, b''.join(out)))
+            # the client has closed its end, wait for the remaining replies to be written
+            await replies.join()
+        except (ConnectionError, hiredis.ProtocolError):
+            pass
+        finally:
+            write_task.cancel()
+            writer.close()
+            self._tasks.discard(task)
+
+    async def _write_replies(self, writer: asyncio.StreamWriter, replies: asyncio.Queue[Tuple[float, bytes]]) -> None:
+        while True:
+            due, data = await replies.get()
+            try:
+                wait = due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                chunk_size = self.write_chunk_size
+                if chunk_size:
+                    for i in range(0, len(data), chunk_size):
+                        if i and self.chunk_delay:
+                            await asyncio.sleep(self.chunk_delay)
+                        writer.write(data[i : i + chunk_size])
+                else:
+                    writer.write(data)
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                replies.task_done()
+
+    def _execute(self, client: _Client, args: Args) -> Any:
+        self.commands += 1
+        name = args[0].upper()
+        if not client.authenticated and name not in (b'AUTH', b'HELLO'):
+            return _Error('NOAUTH Authentication required.')
+        if client.multi is not None and name not in (b'EXEC', b'DISCARD', b'MULTI', b'WATCH'):
+            if name not in _commands:
+                client.multi_error = True
+                return _Error(f"ERR unknown command '{args[0].decode()}'")
+            client.multi.append(args)
+            return QUEUED
+        if name in (b'MULTI', b'EXEC', b'DISCARD', b'WATCH', b'UNWATCH', b'AUTH'):
+            return self._run(_client_commands[name], self, client, args)
+        func = _commands.get(name)
+        if func is None:
+            return _Error(f"ERR unknown command '{args[0].decode()}', with args beginning with: ")
+        return self._run(func, self, args)
+
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return func(*args)
+        except _Error as e:
+            return e
+        except (IndexError, ValueError):
+            return _Error(f"ERR wrong number of arguments for '{args[-1][0].decode().lower()}' command")
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._delete(key)
+        return self.data.get(key)
+
+    def _set(self, key: bytes, value: bytes, expire: Optional[float] = None) -> None:
+        self.data[key] = value
+        if expire is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = time.monotonic() + expire
+        self._touch(key)
+
+    def _delete(self, key: bytes) -> bool:
+        self._expires.pop(key, None)
+        if self.data.pop(key, None) is None:
+            return False
+        self._touch(key)
+        return True
+
+    def _touch(self, key: bytes) -> None:
+        self._version += 1
+        self._versions[key] = self._version
+
+    def _incr(self, key: bytes, increment: int) -> int:
+        value = self._get(key)
+        new = (0 if value is None else _int(value)) + increment
+        self._update(key, b'%d' % new)
+        return new
+
+    def _update(self, key: bytes, value: bytes) -> None:
+        """
+        Change the value of a key keeping its TTL.
+        """
+        self.data[key] = value
+        self._touch(key)
+
+    # string commands
+
+    def cmd_append(self, args: Args) -> int:
+        value = (self._get(args[1]) or b'') + args[2]
+        self._update(args[1], value)
+        return len(value)
+
+    def cmd_bitcount(self, args: Args) -> int:
+        value = self._get(args[1]) or b''
+        if len(args) == 4:
+            start, end = _range(len(value), _int(args[2]), _int(args[3]))
+            value = value[start:end]
+        elif len(args) != 2:
+            raise _Error(_syntax)
+        return sum(bin(b).count('1') for b in value)
+
+    def cmd_bitop(self, args: Args) -> int:
+        op = args[1].upper()
+        values = [self._get(k) or b'' for k in args[3:]]
+        if op == b'NOT':
+            if len(values) != 1:
+                raise _Error('ERR BITOP NOT must be called with a single source key.')
+            result = bytes(~b & 0xFF for b in values[0])
+        elif op in (b'AND', b'OR', b'XOR') and values:
+            length = max(len(v) for v in values)
+            ints = [int.from_bytes(v.ljust(length, b'\0'), 'big') for v in values]
+            r = ints[0]
+            for i in ints[1:]:
+                r = r & i if op == b'AND' else r | i if op == b'OR' else r ^ i
+            result = r.to_bytes(length, 'big')
+        else:
+            raise _Error(_syntax)
+        if result:
+            self._set(args[2], result)
+        else:
+            self._delete(args[2])
+        return len(result)
+
+    def cmd_bitpos(self, args: Args) -> int:
+        value = self._get(args[1]) or b''
+        bit = _int(args[2])
+        if bit not in (0, 1):
+            raise _Error('ERR The bit argument must be 1 or 0.')
+        start = _int(args[3]) if len(args) > 3 else 0
+        end_given = len(args) > 4
+        start, end = _range(len(value), start, _int(args[4]) if end_given else -1)
+        for i in range(start, end):
+            b = value[i] if bit else ~value[i] & 0xFF
+            if b:
+                return i * 8 + 8 - b.bit_length()
+        if bit == 0 and not end_given:
+            # bits beyond the end of the value are 0
+            return end * 8
+        return -1
+
+    def cmd_decr(self, args: Args) -> int:
+        return self._incr(args[1], -1)
+
+    def cmd_decrby(self, args: Args) -> int:
+        return self._incr(args[1], -_int(args[2]))
+
+    def cmd_get(self, args: Args) -> Optional[bytes]:
+        return self._get(args[1])
+
+    def cmd_getbit(self, args: Args) -> int:
+        value = self._get(args[1]) or b''
+        byte, bit = divmod(_int(args[2], 'ERR bit offset is not an integer or out of range'), 8)
+        return (value[byte] >> (7 - bit)) & 1 if byte < len(value) else 0
+
+    def cmd_getrange(self, args: Args) -> bytes:
+        value = self._get(args[1]) or b''
+        start, end = _range(len(value), _int(args[2]), _int(args[3]))
+        return value[start:end]
+
+    def cmd_getset(self, args: Args) -> Optional[bytes]:
+        old = self._get(args[1])
+        self._set(args[1], args[2])
+        return old
+
+    def cmd_incr(self, args: Args) -> int:
+        return self._incr(args[1], 1)
+
+    def cmd_incrby(self, args: Args) -> int:
+        return self._incr(args[1], _int(args[2]))
+
+    def cmd_incrbyfloat(self, args: Args) -> bytes:
+        value = self._get(args[1])
+        new = _format_float((0 if value is None else _float(value)) + _float(args[2]))
+        self._update(args[1], new)
+        return new
+
+    def cmd_mget(self, args: Args) -> List[Optional[bytes]]:
+        if len(args) < 2:
+            raise IndexError
+        return [self._get(k) for k in args[1:]]
+
+    def cmd_mset(self, args: Args) -> bytes:
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise IndexError
+        for i in range(1, len(args), 2):
+            self._set(args[i], args[i + 1])
+        return OK
+
+    def cmd_msetnx(self, args: Args) -> int:
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise IndexError
+        if any(self._get(args[i]) is not None for i in range(1, len(args), 2)):
+            return 0
+        self.cmd_mset(args)
+        return 1
+
+    def cmd_psetex(self, args: Args) -> bytes:
+        return self._setex(args[1], _int(args[2]) / 1000, args[3])
+
+    def cmd_set(self, args: Args) -> Optional[bytes]:
+        key, value = args[1], args[2]
+        expire: Optional[float] = None
+        nx = xx = False
+        i = 3
+        while i < len(args):
+            option = args[i].upper()
+            if option in (b'EX', b'PX') and i + 1 < len(args):
+                expire = _int(args[i + 1])
+                if expire <= 0:
+                    raise _Error('ERR invalid expire time in set')
+                expire = expire / 1000 if option == b'PX' else expire
+                i += 2
+            elif option in (b'NX', b'XX'):
+                nx, xx = nx or option == b'NX', xx or option == b'XX'
+                i += 1
+            else:
+                raise _Error(_syntax)
+        exists = self._get(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._set(key, value, expire)
+        return OK
+
+    def cmd_setbit(self, args: Args) -> int:
+        byte, bit = divmod(_int(args[2], 'ERR bit offset is not an integer or out of range'), 8)
+        new_bit = _int(args[3])
+        if new_bit not in (0, 1):
+            raise _Error('ERR bit is not an integer or out of range')
+        value = bytearray((self._get(args[1]) or b'').ljust(byte + 1, b'\0'))
+        mask = 1 << (7 - bit)
+        old = 1 if value[byte] & mask else 0
+        value[byte] = value[byte] | mask if new_bit else value[byte] & ~mask
+        self._update(args[1], bytes(value))
+        return old
+
+    def cmd_setex(self, args: Args) -> bytes:
+        return self._setex(args[1], _int(args[2]), args[3])
+
+    def _setex(self, key: bytes, expire: float, value: bytes) -> bytes:
+        if expire <= 0:
+            raise _Error('ERR invalid expire time in setex')
+        self._set(key, value, expire)
+        return OK
+
+    def cmd_setnx(self, args: Args) -> int:
+        if self._get(args[1]) is not None:
+            return 0
+        self._set(args[1], args[2])
+        return 1
+
+    def cmd_setrange(self, args: Args) -> int:
+        offset = _int(args[2])
+        if offset < 0:
+            raise _Error('ERR offset is out of range')
+        value = self._get(args[1]) or b''
+        value = value.ljust(offset, b'\0')[:offset] + args[3] + value[offset + len(args[3]) :]
+        self._update(args[1], value)
+        return len(value)
+
+    def cmd_strlen(self, args: Args) -> int:
+        return len(self._get(args[1]) or b'')
+
+    # key commands
+
+    def cmd_del(self, args: Args) -> int:
+        if len(args) < 2:
+            raise IndexError
+        return sum(self._get(k) is not None and self._delete(k) for k in args[1:])
+
+    cmd_unlink = cmd_del
+
+    def cmd_exists(self, args: Args) -> int:
+        if len(args) < 2:
+            raise IndexError
+        return sum(self._get(k) is not None for k in args[1:])
+
+    def cmd_expire(self, args: Args) -> int:
+        return self._expire(args[1], _int(args[2]))
+
+    def cmd_pexpire(self, args: Args) -> int:
+        return self._expire(args[1], _int(args[2]) / 1000)
+
+    def _expire(self, key: bytes, expire: float) -> int:
+        value = self._get(key)
+        if value is None:
+            return 0
+        if expire <= 0:
+            self._delete(key)
+        else:
+            self._set(key, value, expire)
+        return 1
+
+    def cmd_ttl(self, args: Args) -> int:
+        return self._ttl(args[1], 1)
+
+    def cmd_pttl(self, args: Args) -> int:
+        return self._ttl(args[1], 1000)
+
+    def _ttl(self, key: bytes, scale: int) -> int:
+        if self._get(key) is None:
+            return -2
+        expires = self._expires.get(key)
+        return -1 if expires is None else round((expires - time.monotonic()) * scale)
+
+    # server commands
+
+    def cmd_client(self, args: Args) -> Any:
+        return OK if args[1].upper() == b'SETNAME' else _Error(_syntax)
+
+    def cmd_config(self, args: Args) -> Any:
+        sub = args[1].upper()
+        if sub == b'GET':
+            value = self.config.get(args[2])
+            return [] if value is None else [args[2], value]
+        elif sub == b'SET':
+            self.config[args[2]] = args[3]
+            return OK
+        raise _Error(_syntax)
+
+    def cmd_dbsize(self, args: Args) -> int:
+        return sum(self._get(k) is not None for k in list(self.data))
+
+    def cmd_echo(self, args: Args) -> bytes:
+        return args[1]
+
+    def cmd_flushall(self, args: Args) -> bytes:
+        for key in list(self.data):
+            self._delete(key)
+        return OK
+
+    cmd_flushdb = cmd_flushall
+
+    def cmd_hello(self, args: Args) -> Any:
+        if len(args) > 1 and args[1] != b'2':
+            return _Error('NOPROTO unsupported protocol version')
+        return [b'server', b'redis', b'proto', 2]
+
+    def cmd_ping(self, args: Args) -> bytes:
+        return args[1] if len(args) > 1 else _Simple(b'PONG')
+
+    def cmd_select(self, args: Args) -> bytes:
+        return OK
+
+    def cmd_time(self, args: Args) -> List[bytes]:
+        now = time.time()
+        return [b'%d' % now, b'%d' % (now % 1 * 1_000_000)]
+
+    # scripting commands, scripts are cached but can't be run
+
+    def cmd_script(self, args: Args) -> Any:
+        sub = args[1].upper()
+        if sub == b'LOAD':
+            sha = hashlib.sha1(args[2]).hexdigest()
+            self._scripts.add(sha)
+            return sha.encode()
+        elif sub == b'EXISTS':
+            return [int(sha.decode().lower() in self._scripts) for sha in args[2:]]
+        elif sub == b'FLUSH':
+            self._scripts.clear()
+            return OK
+        raise _Error(_syntax)
+
+    def cmd_evalsha(self, args: Args) -> Any:
+        if args[1].decode().lower() not in self._scripts:
+            return _Error('NOSCRIPT No matching script. Please use EVAL.')
+        return _Error('ERR scripts are not supported by RespServer')
+
+
+def _auth(server: RespServer, client: _Client, args: Args) -> Any:
+    password = args[-1].decode()
+    if server.password is None:
+        raise _Error('ERR AUTH <password> called without any password configured for the default user.')
+    if password != server.password:
+        raise _Error('WRONGPASS invalid username-password pair')
+    client.authenticated = True
+    return OK
+
+
+def _multi(server: RespServer, client: _Client, args: Args) -> Any:
+    if client.multi is not None:
+        raise _Error('ERR MULTI calls can not be nested')
+    client.multi = []
+    client.multi_error = False
+    return OK
+
+
+def _exec(server: RespServer, client: _Client, args: Args) -> Any:
+    if client.multi is None:
+        raise _Error('ERR EXEC without MULTI')
+    commands, error, watched = client.multi, client.multi_error, client.watched
+    client.multi, client.multi_error, client.watched = None, False, {}
+    if error:
+        raise _Error('EXECABORT Transaction discarded because of previous errors.')
+    for key in watched:
+        # the key may have expired
+        server._get(key)
+    if any(server._versions.get(key, 0) != version for key, version in watched.items()):
+        return None
+    return [server._execute(client, c) for c in commands]
+
+
+def _discard(server: RespServer, client: _Client, args: Args) -> Any:
+    if client.multi is None:
+        raise _Error('ERR DISCARD without MULTI')
+    client.multi, client.multi_error, client.watched = None, False, {}
+    return OK
+
+
+def _watch(server: RespServer, client: _Client, args: Args) -> Any:
+    if client.multi is not None:
+        raise _Error('ERR WATCH inside MULTI is not allowed')
+    if len(args) < 2:
+        raise IndexError
+    for key in args[1:]:
+        server._get(key)
+        client.watched.setdefault(key, server._versions.get(key, 0))
+    return OK
+
+
+def _unwatch(server: RespServer, client: _Client, args: Args) -> Any:
+    client.watched = {}
+    return OK
+
+
+_commands: Dict[bytes, Callable[[RespServer, Args], Any]] = {
+    name[4:].upper().encode(): func for name, func in vars(RespServer).items() if name.startswith('cmd_')
+}
+_client_commands: Dict[bytes, Callable[[RespServer, _Client, Args], Any]] = {
+    b'AUTH': _auth,
+    b'MULTI': _multi,
+    b'EXEC': _exec,
+    b'DISCARD': _discard,
+    b'WATCH': _watch,
+    b'UNWATCH': _unwatch,
+}
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from types import TracebackType
+from typing import Any, List, Optional, Type
+
+from .codecs import Codec
+from .connection import AbstractConnection, RawConnection, default_timeout
+from .pipeline_commands import CommandsPipeline
+
+__all__ = 'Transaction', 'TransactionContext', 'WatchError'
+
+
+class WatchError(RuntimeError):
+    """
+    Raised when a transaction is still aborted by changes to the watched keys after all retries, see Redis.watch.
+    """
+
+
+class Transaction(CommandsPipeline):
+    """
+    Pipeline executed atomically with MULTI/EXEC, the commands, MULTI and EXEC are written together and results
+    are converted as for a pipeline.
+    """
+
+    def __init__(
+        self,
+        raw_connection: AbstractConnection,
+        timeout: Optional[float] = default_timeout,
+        watching: bool = False,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        super().__init__(raw_connection, timeout, codec)
+        self._watching = watching
+
+    async def execute(self) -> List[Any]:
+        r: List[Any] = []
+        if self._pipeline:
+            commands, self._pipeline = self._pipeline, []
+            if self._watching:
+                # watched keys are only valid on the connection WATCH was sent on, see Redis.watch
+                assert isinstance(self._conn, RawConnection), 'a watching transaction requires a RawConnection'
+                result = await self._conn.execute_transaction(commands, watching=True, timeout=self._timeout)
+            else:
+                result = await self._conn.execute_transaction(commands, timeout=self._timeout)
+            if result is None:
+                raise WatchError('transaction aborted, a watched key was modified')
+            r = result
+        return r
+
+
+class TransactionContext:
+    def __init__(
+        self,
+        raw_connection: AbstractConnection,
+        timeout: Optional[float] = default_timeout,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        self._conn = raw_connection
+        self._timeout = timeout
+        self._codec = codec
+        self._transaction: Optional[Transaction] = None
+
+    async def __aenter__(self) -> Transaction:
+        self._transaction = Transaction(self._conn, self._timeout, codec=self._codec)
+        return self._transaction
+
+    async def __aexit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        if exc_type:
+            self._transaction = None
+        elif self._transaction is not None:
+            await self._transaction.execute()
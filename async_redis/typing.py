@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 import sys
-from typing import List, Optional, Sequence, Union
+from mmap import mmap
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
-__all__ = 'Literal', 'ArgType', 'CommandArgs', 'ReturnAs', 'ResultType'
+__all__ = 'Literal', 'Protocol', 'ArgType', 'CommandArgs', 'ReturnAs', 'ResultType', 'Callback', 'Command'
 
 if sys.version_info >= (3, 8):
-    from typing import Literal
+    from typing import Literal, Protocol
 else:
-    from typing_extensions import Literal
+    from typing_extensions import Literal, Protocol
 
-ArgType = Union[bytes, bytearray, str, int, float]
+ArgType = Union[bytes, bytearray, memoryview, mmap, str, int, float]
 CommandArgs = Sequence[ArgType]
-ResultType = Union[None, bytes, str, int, float, List[bytes], List[str], List[int], List[float]]
+ResultType = Union[None, bytes, str, int, float, bool, List[bytes], List[str], List[int], List[float], List[bool]]
 
 ReturnAs = Optional[Literal['ok', 'str', 'int', 'float', 'bool']]
+Callback = Callable[[Any], Any]
+# a command as queued in a pipeline: arguments, how to convert the reply and an optional callback
+Command = Tuple[CommandArgs, ReturnAs, Optional[Callback]]
@@ -1,16 +1,27 @@
 from __future__ import annotations
 
-from asyncio import Future
-from typing import Any, Callable, List, TypeVar
+from typing import Any, List
 
-__all__ = ('apply_callback',)
+from .typing import Callback
 
-T = TypeVar('T', str, List[str])
+__all__ = 'apply_callback', 'encode_command'
 
 
-async def apply_callback(fut: Future[T], converter: Callable[[T], Any]) -> Any:
-    result = await fut
+def apply_callback(result: Any, converter: Callback) -> Any:
+    """
+    Apply a command's callback to its result, results of commands queued inside MULTI are left as None.
+    """
     if result == b'QUEUED':
         return None
     else:
         return converter(result)
+
+
+def encode_command(command: bytes, args: List[bytes]) -> bytes:
+    """
+    Encode a command as RESP, for writing to connections which aren't a RawConnection, e.g. pubsub connections.
+    """
+    parts = [b'*%d\r\n$%d\r\n%s\r\n' % (len(args) + 1, len(command), command)]
+    for arg in args:
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
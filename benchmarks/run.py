@@ -3,13 +3,17 @@ import os
 from datetime import datetime
 from statistics import mean, stdev
 
-import uvloop
 from test_async_redis import TestAsyncRedis
-from test_aioredis import TestAioredis
+
+try:
+    from test_aioredis import TestAioredis
+except ImportError:
+    # aioredis isn't installed, only async-redis is benchmarked
+    TestAioredis = None
 
 
 async def main():
-    classes = [TestAsyncRedis, TestAioredis]
+    classes = [TestAsyncRedis] if TestAioredis is None else [TestAsyncRedis, TestAioredis]
 
     repeats = int(os.getenv('BENCHMARK_REPEATS', '5'))
 
@@ -41,5 +45,10 @@ async def main():
 
 
 if __name__ == '__main__':
-    uvloop.install()
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        uvloop.install()
     asyncio.run(main())
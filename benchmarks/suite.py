@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Benchmark a matrix of scenarios: command, concurrency, pipeline depth, value size and event loop. Results are
+written as JSON and may be compared with a baseline, regressions are reported and cause a non-zero exit code.
+
+To compare the cython build with pure python, run the suite after "make compile" and save the results, then
+remove the compiled modules and run it again with the first results as the baseline.
+
+Examples:
+    python benchmarks/suite.py --quick --output results.json
+    python benchmarks/suite.py --filter 'get-.*/s1000/' --baseline results.json
+    python benchmarks/suite.py --compare new.json --baseline old.json
+
+With "--server memory" the in-process RespServer is used instead of redis-server so the client's own overhead is
+measured without the variance of a real server, the server runs on its own event loop in a thread.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import hiredis
+
+import async_redis
+from async_redis import ConnectionSettings, Histogram, Redis, connect
+from async_redis.testing import RespServer
+
+commands = 'set', 'get-str', 'get-bytes'
+concurrencies = 1, 10, 100
+depths = 1, 10, 100
+sizes = 10, 1_000, 100_000, 10_000_000
+quick = {'concurrencies': (1, 100), 'depths': (1, 100), 'sizes': (10, 100_000)}
+# the number of commands in each scenario is chosen so roughly this much data is transferred, within these limits
+transfer_budget = 200_000_000
+min_commands, max_commands = 100, 20_000
+# scenarios with more data than this in flight at once are skipped
+max_in_flight_bytes = 64_000_000
+
+
+@dataclass
+class Scenario:
+    command: str
+    concurrency: int
+    depth: int
+    size: int
+    loop: str
+
+    @property
+    def name(self) -> str:
+        return f'{self.command}/c{self.concurrency}/d{self.depth}/s{self.size}/{self.loop}'
+
+    @property
+    def batches(self) -> int:
+        """
+        Number of batches of depth commands executed by each of the concurrent workers.
+        """
+        commands = min(max(transfer_budget // self.size, min_commands), max_commands)
+        return math.ceil(commands / (self.concurrency * self.depth))
+
+
+def scenarios(args: argparse.Namespace) -> List[Scenario]:
+    dims = quick if args.quick else {'concurrencies': concurrencies, 'depths': depths, 'sizes': sizes}
+    pattern = args.filter and re.compile(args.filter)
+    r = []
+    for loop, command, concurrency, depth, size in itertools.product(
+        args.loops, commands, dims['concurrencies'], dims['depths'], dims['sizes']
+    ):
+        s = Scenario(command, concurrency, depth, size, loop)
+        if size * concurrency * depth <= max_in_flight_bytes and (not pattern or pattern.search(s.name)):
+            r.append(s)
+    return r
+
+
+async def run_scenario(redis: Redis, s: Scenario) -> Dict[str, Any]:
+    key = f'benchmark:{s.size}'
+    value = b'x' * s.size
+    decode = s.command == 'get-str'
+    if s.command != 'set':
+        await redis.set(key, value)
+
+    loop = asyncio.get_event_loop()
+    latency = Histogram()
+
+    async def worker() -> None:
+        for _ in range(s.batches):
+            start = loop.time()
+            if s.depth == 1:
+                if s.command == 'set':
+                    await redis.set(key, value)
+                else:
+                    await redis.get(key, decode=decode)
+            else:
+                async with redis.pipeline() as p:
+                    for _ in range(s.depth):
+                        if s.command == 'set':
+                            p.set(key, value)
+                        else:
+                            p.get(key, decode=decode)
+                    await p.execute()
+            latency.record(loop.time() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(s.concurrency)])
+    duration = time.perf_counter() - start
+    total = s.batches * s.concurrency * s.depth
+    return {
+        'commands': total,
+        'duration': duration,
+        'commands_per_sec': total / duration,
+        'mb_per_sec': total * s.size / duration / 1e6,
+        'batch_latency_p50': latency.percentile(50),
+        'batch_latency_p99': latency.percentile(99),
+    }
+
+
+async def run_loop(args: argparse.Namespace, loop_scenarios: List[Scenario]) -> List[Dict[str, Any]]:
+    results = []
+    async with connect(ConnectionSettings(host=args.host, port=args.port)) as redis:
+        for s in loop_scenarios:
+            runs = [await run_scenario(redis, s) for _ in range(args.repeats)]
+            best = max(runs, key=lambda r: r['commands_per_sec'])
+            result = {'name': s.name, **s.__dict__, **best, 'repeats': [r['commands_per_sec'] for r in runs]}
+            print(
+                f'{s.name:>40} {best["commands_per_sec"]:>12,.0f} cmd/s {best["mb_per_sec"]:>10,.1f} MB/s '
+                f'p99={best["batch_latency_p99"] * 1000:0.3f}ms'
+            )
+            results.append(result)
+        await redis._execute((b'DEL', *{f'benchmark:{s.size}' for s in loop_scenarios}), 'int')
+    return results
+
+
+def set_loop(name: str) -> None:
+    if name == 'uvloop':
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    else:
+        asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
+
+
+def build() -> str:
+    """
+    Whether async_redis has been compiled with cython.
+    """
+    return 'cython' if async_redis.connection.__file__.endswith(('.so', '.pyd')) else 'python'
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    all_scenarios = scenarios(args)
+    meta = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'async_redis': async_redis.VERSION,
+        'hiredis': hiredis.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'build': build(),
+        'server': args.server,
+        'repeats': args.repeats,
+    }
+    print(f'running {len(all_scenarios)} scenarios, build={meta["build"]}, python {meta["python"]}')
+    results = []
+    server = None
+    if args.server == 'memory':
+        server = RespServer()
+        server.start_thread()
+        args.host, args.port = server.host, server.port
+    try:
+        for loop_name in args.loops:
+            set_loop(loop_name)
+            results += asyncio.run(run_loop(args, [s for s in all_scenarios if s.loop == loop_name]))
+    finally:
+        if server is not None:
+            server.stop_thread()
+    return {'meta': meta, 'results': results}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """
+    Compare throughput with the baseline, returns the number of regressions.
+    """
+    base_meta, meta = baseline['meta'], results['meta']
+    print(f'\ncomparing with baseline from {base_meta["time"]}')
+    for field in 'build', 'server', 'python', 'hiredis', 'async_redis':
+        if base_meta.get(field) != meta.get(field):
+            print(f'  note: {field} differs, baseline {base_meta.get(field)}, now {meta.get(field)}')
+
+    base_results = {r['name']: r for r in baseline['results']}
+    regressions = 0
+    for r in results['results']:
+        base = base_results.get(r['name'])
+        if base is None:
+            continue
+        change = r['commands_per_sec'] / base['commands_per_sec'] - 1
+        if change < -threshold:
+            regressions += 1
+            flag = 'REGRESSION'
+        elif change > threshold:
+            flag = 'improved'
+        else:
+            flag = ''
+        print(
+            f'{r["name"]:>40} {base["commands_per_sec"]:>12,.0f} -> {r["commands_per_sec"]:>12,.0f} cmd/s '
+            f'{change:>+7.1%} {flag}'
+        )
+    print(f'{regressions} regressions with threshold {threshold:0.0%}')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--server', choices=('redis', 'memory'), default='redis', help='server to benchmark against')
+    parser.add_argument('--quick', action='store_true', help='run a smaller matrix')
+    parser.add_argument('--filter', help='only run scenarios whose name matches this regex')
+    parser.add_argument('--loops', default=None, help='comma separated event loops, default asyncio and uvloop')
+    parser.add_argument('--repeats', type=int, default=3, help='times to run each scenario, the best is used')
+    parser.add_argument('--output', type=Path, help='file to write results to as JSON')
+    parser.add_argument('--baseline', type=Path, help='results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown considered a regression')
+    parser.add_argument('--compare', type=Path, help='compare these results with the baseline instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare requires --baseline')
+        results = json.loads(args.compare.read_text())
+    else:
+        if args.loops:
+            args.loops = args.loops.split(',')
+        else:
+            try:
+                import uvloop  # noqa F401
+            except ImportError:
+                args.loops = ['asyncio']
+            else:
+                args.loops = ['asyncio', 'uvloop']
+        results = run(args)
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+            print(f'results written to {args.output}')
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        return 1 if compare(results, baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
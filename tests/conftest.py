@@ -4,6 +4,7 @@ from pytest import fixture
 
 from async_redis import ConnectionSettings, Redis, connect
 from async_redis.connection import RawConnection, create_raw_connection
+from async_redis.testing import RespServer
 
 
 @fixture(name='settings')
@@ -26,3 +27,11 @@ def fix_redis(loop, settings: ConnectionSettings):
     loop.run_until_complete(conn.flushall())
     yield conn
     loop.run_until_complete(conn.close())
+
+
+@fixture(name='resp_server')
+def fix_resp_server(loop):
+    server = RespServer()
+    loop.run_until_complete(server.start())
+    yield server
+    loop.run_until_complete(server.close())
@@ -0,0 +1,103 @@
+import math
+from array import array
+from decimal import Decimal
+
+import pytest
+
+from async_redis import ConnectionSettings, Redis, connect, number_args, to_array
+
+
+async def test_mget(redis: Redis):
+    await redis.mset(('a', 1), ('b', -20))
+    result = await redis.mget('a', 'b', 'missing', array='q')
+    assert result == array('q', [1, -20, 0])
+    result = await redis.mget('a', 'missing', array='d')
+    assert result[0] == 1.0 and math.isnan(result[1])
+
+
+async def test_lrange(redis: Redis):
+    await redis._execute((b'RPUSH', b'list', *number_args(array('d', [1.5, -2.25, 3]))), 'int')
+    assert array('d', [1.5, -2.25, 3]) == await redis.lrange('list', 0, -1, array='d')
+    assert ['1.5', '-2.25', '3.0'] == await redis.lrange('list', 0, -1)
+    assert [b'1.5'] == await redis.lrange('list', 0, 0, decode=False)
+
+
+async def test_zadd_zrange(redis: Redis):
+    assert 3 == await redis.zadd('z', array('d', [2.5, 1, float('inf')]), ['b', 'a', 'c'])
+    assert 0 == await redis.zadd('z', [5], ['a'], nx=True)
+    assert ['a', 'b', 'c'] == await redis.zrange('z', 0, -1)
+    assert [('a', 1.0), ('b', 2.5), ('c', math.inf)] == await redis.zrange('z', 0, -1, withscores=True)
+    members, scores = await redis.zrange('z', 0, 1, withscores=True, decode=False, array='d')
+    assert (members, scores) == ([b'a', b'b'], array('d', [1, 2.5]))
+    with pytest.raises(ValueError, match='scores and members must be the same length'):
+        await redis.zadd('z', [1, 2], ['a'])
+
+
+async def test_zrange_resp3(redis: Redis):
+    await redis.zadd('z', [1, 2.5], ['a', 'b'])
+    async with connect(ConnectionSettings(protocol=3)) as r:
+        assert [('a', 1.0), ('b', 2.5)] == await r.zrange('z', 0, -1, withscores=True)
+        assert (['a', 'b'], array('d', [1, 2.5])) == await r.zrange('z', 0, -1, withscores=True, array='d')
+
+
+async def test_bitfield(redis: Redis):
+    assert [0, 100] == await redis.bitfield('bits', 'GET', 'u8', 0, 'INCRBY', 'u8', 0, 100)
+    result = await redis.bitfield('bits', 'OVERFLOW', 'FAIL', 'INCRBY', 'u8', 0, 200, 'GET', 'u8', 0, array='q')
+    assert result == array('q', [0, 100])
+
+
+async def test_pipeline(redis: Redis):
+    async with redis.pipeline() as p:
+        p.zadd('z', [1, 2], ['a', 'b'])
+        p.zrange('z', 0, -1, withscores=True, array='f')
+        p.mget('missing', array='q')
+        assert [2, (['a', 'b'], array('f', [1, 2])), array('q', [0])] == await p.execute()
+
+
+async def test_numpy(redis: Redis):
+    numpy = pytest.importorskip('numpy')
+    scores = numpy.linspace(0, 1, 1000)
+    assert 1000 == await redis.zadd('z', scores, [f'm{i}' for i in range(1000)])
+    members, result = await redis.zrange('z', 0, -1, withscores=True, array=numpy.float64)
+    assert members[:2] == ['m0', 'm1']
+    assert result.dtype == numpy.float64
+    assert numpy.array_equal(result, scores)
+
+    await redis.mset(*zip(['a', 'b'], number_args(numpy.array([7, 8], dtype=numpy.int32))))
+    result = await redis.mget('a', 'b', 'c', array=numpy.dtype('i8'))
+    assert result.tolist() == [7, 8, 0]
+    result = await redis.mget('a', 'c', array=numpy.float32)
+    assert result[0] == 7 and numpy.isnan(result[1])
+
+
+def test_to_array():
+    assert to_array([b'1', None, b'3'], 'l') == array('l', [1, 0, 3])
+    assert to_array([1, 2], 'B') == array('B', [1, 2])
+    assert to_array(['1.5'], 'f') == array('f', [1.5])
+    assert to_array([], 'q') == array('q')
+    with pytest.raises(ValueError, match="invalid array typecode 'x'"):
+        to_array([1], 'x')
+
+
+def test_to_array_numpy():
+    numpy = pytest.importorskip('numpy')
+    assert to_array([b'1', None, b'-3'], numpy.int64).tolist() == [1, 0, -3]
+    assert to_array([None, 4], numpy.int16).tolist() == [0, 4]
+    assert to_array(['2.5'], numpy.float64).tolist() == [2.5]
+    assert to_array([], numpy.float64).shape == (0,)
+
+
+def test_number_args():
+    assert number_args([1, 2.5, -3]) == [b'1', b'2.5', b'-3']
+    assert number_args(array('d', [1, float('-inf')])) == [b'1.0', b'-inf']
+    assert number_args(array('q', [2 ** 40])) == [b'1099511627776']
+    assert number_args([True]) == [b'1']
+    with pytest.raises(TypeError, match='not Decimal'):
+        number_args([Decimal('1.5')])
+    with pytest.raises(TypeError, match='not str'):
+        number_args(['1'])
+
+
+def test_number_args_numpy_scalars():
+    numpy = pytest.importorskip('numpy')
+    assert number_args([numpy.float64(1.5), numpy.int16(-2)]) == [b'1.5', b'-2']
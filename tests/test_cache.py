@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from pytest import fixture
+
+from async_redis import CachedRedis, CacheSettings, connect
+from async_redis.cache import ClientCache
+
+
+@fixture(name='cached_redis')
+def fix_cached_redis(loop, settings):
+    asyncio.set_event_loop(loop)
+    redis: CachedRedis = loop.run_until_complete(connect(settings, cache_settings=CacheSettings(max_keys=5)))
+    loop.run_until_complete(redis.flushall())
+    yield redis
+    loop.run_until_complete(redis.close())
+
+
+async def wait_for_invalidation(redis: CachedRedis, invalidations: int):
+    for _ in range(100):
+        if redis.cache.stats().invalidations >= invalidations:
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError('invalidation not received')
+
+
+async def test_cache_hit(cached_redis: CachedRedis):
+    await cached_redis.set('foo', 'bar')
+    assert 'bar' == await cached_redis.get('foo')
+    assert 'bar' == await cached_redis.get('foo')
+    assert b'bar' == await cached_redis.get('foo', decode=False)
+    assert 3 == await cached_redis.strlen('foo')
+    s = cached_redis.cache.stats()
+    assert (s.hits, s.misses, s.keys) == (1, 3, 1)
+
+
+async def test_invalidation(cached_redis: CachedRedis, redis):
+    await cached_redis.set('foo', 'bar')
+    assert 'bar' == await cached_redis.get('foo')
+    # changed by another client, the cache is only updated when the invalidation message is received
+    await redis.set('foo', 'spam')
+    await wait_for_invalidation(cached_redis, 1)
+    assert 'spam' == await cached_redis.get('foo')
+    assert cached_redis.cache.stats().keys == 1
+
+
+async def test_read_own_writes(cached_redis: CachedRedis):
+    for i in range(200):
+        await cached_redis.set('foo', i)
+        assert str(i) == await cached_redis.get('foo')
+    await cached_redis._execute((b'DEL', b'foo'), 'int')
+    assert None is await cached_redis.get('foo')
+    await cached_redis.mset(a='1', b='2')
+    assert ['1', '2'] == await cached_redis.mget('a', 'b')
+    await cached_redis.mset(b='3')
+    assert ['1', '3'] == await cached_redis.mget('a', 'b')
+    await cached_redis.flushdb()
+    assert [None, None] == await cached_redis.mget('a', 'b')
+
+
+async def test_mget(cached_redis: CachedRedis):
+    await cached_redis.mset(a='1', b='2', c='3')
+    assert '1' == await cached_redis.get('a')
+    assert ['1', '2', None, '3'] == await cached_redis.mget('a', 'b', 'd', 'c')
+    assert ['1', '2', None, '3'] == await cached_redis.mget('a', 'b', 'd', 'c')
+    s = cached_redis.cache.stats()
+    assert (s.hits, s.misses) == (5, 4)
+
+
+async def test_lru_eviction(cached_redis: CachedRedis):
+    for i in range(7):
+        await cached_redis.get(f'key_{i}')
+    s = cached_redis.cache.stats()
+    assert (s.keys, s.evictions) == (5, 2)
+    await cached_redis.get('key_6')
+    assert cached_redis.cache.stats().hits == 1
+    await cached_redis.get('key_0')
+    assert cached_redis.cache.stats().misses == 8
+
+
+async def test_flushall_clears_cache(cached_redis: CachedRedis):
+    await cached_redis.mset(a='1', b='2')
+    assert ['1', '2'] == await cached_redis.mget('a', 'b')
+    await cached_redis.flushall()
+    await wait_for_invalidation(cached_redis, 2)
+    assert cached_redis.cache.stats().keys == 0
+    assert [None, None] == await cached_redis.mget('a', 'b')
+
+
+async def test_max_ttl(settings):
+    async with connect(settings, cache_settings=CacheSettings(max_ttl=0.01)) as redis:
+        await redis.set('foo', 'bar')
+        assert 'bar' == await redis.get('foo')
+        await asyncio.sleep(0.02)
+        assert 'bar' == await redis.get('foo')
+        assert redis.cache.stats().misses == 2
+
+
+async def test_reconnect(cached_redis: CachedRedis):
+    await cached_redis.set('foo', 'bar')
+    assert 'bar' == await cached_redis.get('foo')
+    await cached_redis._conn.execute([b'CLIENT', b'KILL', b'TYPE', b'pubsub'])
+    for _ in range(100):
+        if not cached_redis.cache.enabled:
+            break
+        await asyncio.sleep(0.005)
+    assert cached_redis.cache.stats().keys == 0
+    # reads bypass the cache until tracking is restarted
+    assert 'bar' == await cached_redis.get('foo')
+    for _ in range(100):
+        if cached_redis.cache.enabled:
+            break
+        await asyncio.sleep(0.02)
+    assert 'bar' == await cached_redis.get('foo')
+    await cached_redis.set('foo', 'spam')
+    await wait_for_invalidation(cached_redis, 1)
+    assert 'spam' == await cached_redis.get('foo')
+
+
+async def test_exists_not_cached(cached_redis: CachedRedis, redis):
+    await cached_redis.mset(a=1, b=2)
+    assert 2 == await cached_redis._execute((b'EXISTS', b'a', b'b'), 'int')
+    # deleting the second key by another client must be seen straight away
+    await redis._execute((b'DEL', b'b'), 'int')
+    assert 1 == await cached_redis._execute((b'EXISTS', b'a', b'b'), 'int')
+    assert cached_redis.cache.stats().keys == 0
+
+
+async def test_mget_error(cached_redis: CachedRedis, monkeypatch):
+    async def read(*args):
+        raise ConnectionError('lost')
+
+    monkeypatch.setattr(ClientCache, '_read', read)
+    with pytest.raises(ConnectionError):
+        await cached_redis.mget('a', 'b')
+    assert cached_redis.cache._inflight == {}
@@ -0,0 +1,132 @@
+import asyncio
+from array import array
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import ClusterSettings, RedisCluster, create_cluster
+from async_redis.cluster import crc16, key_slot
+from async_redis.connection import ConnectionSettings, create_raw_connection
+
+# tests other than those of key_slot need a cluster with primaries on ports 7000, 7001 and 7002
+cluster_settings = ClusterSettings(startup_nodes=[('127.0.0.1', 7000)])
+
+
+@pytest.fixture(name='cluster')
+def fix_cluster(loop):
+    asyncio.set_event_loop(loop)
+    try:
+        cluster: RedisCluster = loop.run_until_complete(create_cluster(cluster_settings))
+    except ConnectionError:
+        pytest.skip('redis cluster not available')
+    loop.run_until_complete(cluster.flushall())
+    yield cluster
+    loop.run_until_complete(cluster.close())
+
+
+def test_crc16():
+    assert crc16(b'123456789') == 0x31C3
+
+
+@pytest.mark.parametrize(
+    'key,slot',
+    [
+        (b'foo', 12182),
+        (b'', 0),
+        (b'{user1000}.following', key_slot(b'user1000')),
+        (b'foo{}{bar}', key_slot(b'foo{}{bar}')),
+        (b'foo{{bar}}zap', key_slot(b'{bar')),
+        (b'foo{bar}{zap}', key_slot(b'bar')),
+    ],
+)
+def test_key_slot(key, slot):
+    assert key_slot(key) == slot
+    assert 0 <= slot < 16384
+
+
+def test_key_slot_empty_tag():
+    assert key_slot(b'foo{}{bar}') != key_slot(b'bar')
+
+
+async def test_commands(cluster: RedisCluster):
+    assert len(cluster.nodes) == 3
+    keys = [f'key_{i}' for i in range(50)]
+    assert len({cluster.node_for_key(k) for k in keys}) == 3
+    for i, key in enumerate(keys):
+        await cluster.set(key, i)
+    assert [str(i) for i in range(50)] == await asyncio.gather(*[cluster.get(k) for k in keys])
+    assert 5 == await cluster.incrby('key_4', 1)
+    assert isinstance(await cluster.info(), dict)
+
+
+async def test_mget_mset(cluster: RedisCluster):
+    await cluster.mset(**{f'key_{i}': i for i in range(100)})
+    keys = [f'key_{i}' for i in reversed(range(100))] + ['missing']
+    assert [str(i) for i in reversed(range(100))] + [None] == await cluster.mget(*keys)
+    assert [None, b'1', b'2'] == await cluster.mget('{tag}a', 'key_1', 'key_2', decode=False)
+    values = await cluster.mget(*(f'key_{i}' for i in range(100)), 'missing', array='q')
+    assert values == array('q', [*range(100), 0])
+
+
+async def test_scripts(cluster: RedisCluster):
+    script = cluster.register_script("return redis.call('INCR', KEYS[1])")
+    await cluster.script_flush()
+    assert [1, 1, 2] == [await script(cluster, [k]) for k in ('a', 'b', 'a')]
+    assert all(pool.scripts is cluster.scripts for pool in cluster._pools.values())
+
+
+async def test_moved(cluster: RedisCluster):
+    await cluster.set('foo', 'bar')
+    slot = key_slot(b'foo')
+    right = cluster._slots[slot]
+    wrong = next(n for n in cluster.nodes if n != right)
+    cluster._slots[slot] = wrong
+    assert 'bar' == await cluster.get('foo')
+    assert cluster._slots[slot] == right
+    cluster._slots[slot] = wrong
+    assert ['bar', None] == await cluster.mget('foo', 'spam')
+    await asyncio.sleep(0.01)
+    assert cluster._slots[slot] == right
+
+
+async def test_refresh_closes_removed_nodes(cluster: RedisCluster):
+    removed = ('127.0.0.1', 7999)
+    pool = cluster._pool(removed)
+    cluster._nodes.append(removed)
+    await cluster.refresh()
+    assert removed not in cluster.nodes
+    assert set(cluster._pools) == set(cluster.nodes)
+    assert pool._closed
+
+
+async def test_ask(cluster: RedisCluster):
+    slot = key_slot(b'foo')
+    source = cluster._slots[slot]
+    target = next(n for n in cluster.nodes if n != source)
+    source_conn = await create_raw_connection(ConnectionSettings(*source))
+    target_conn = await create_raw_connection(ConnectionSettings(*target))
+    try:
+        source_id = await source_conn.execute([b'CLUSTER', b'MYID'])
+        target_id = await target_conn.execute([b'CLUSTER', b'MYID'])
+        await target_conn.execute([b'CLUSTER', b'SETSLOT', slot, b'IMPORTING', source_id])
+        await source_conn.execute([b'CLUSTER', b'SETSLOT', slot, b'MIGRATING', target_id])
+        try:
+            # the key doesn't exist on the source node so it replies ASK
+            assert None is await cluster.set('foo', 'bar')
+            assert 'bar' == await cluster.get('foo')
+            assert cluster._slots[slot] == source
+        finally:
+            await target_conn.execute_many([([b'ASKING'], 'ok', None), ([b'DEL', b'foo'], None, None)])
+            await source_conn.execute([b'CLUSTER', b'SETSLOT', slot, b'STABLE'])
+            await target_conn.execute([b'CLUSTER', b'SETSLOT', slot, b'STABLE'])
+    finally:
+        await source_conn.close()
+        await target_conn.close()
+
+
+async def test_too_many_redirects(cluster: RedisCluster):
+    cluster._settings.max_redirects = 0
+    slot = key_slot(b'foo')
+    cluster._slots[slot] = next(n for n in cluster.nodes if n != cluster._slots[slot])
+    with pytest.raises(ReplyError, match='MOVED'):
+        await cluster.get('foo')
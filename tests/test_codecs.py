@@ -0,0 +1,134 @@
+import json
+import os
+import zlib
+
+import pytest
+
+from async_redis import BytesCodec, CacheSettings, Codec, CompressedCodec, JsonCodec, PickleCodec, connect
+from async_redis.codecs import MsgpackCodec
+from async_redis.testing import RespServer
+
+
+async def test_json(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        r = redis.with_codec(JsonCodec())
+        await r.set('foo', {'a': [1, 2]})
+        assert {'a': [1, 2]} == await r.get('foo')
+        assert b'{"a":[1,2]}' == await r.get('foo', decode=False)
+        assert '{"a":[1,2]}' == await redis.get('foo')
+        assert None is await r.get('missing')
+
+        await r.mset(('x', 1), y=[True, None])
+        assert [1, [True, None], None] == await r.mget('x', 'y', 'z')
+        assert 1 == await r.getset('x', 2)
+        assert 2 == await r.get('x')
+        assert True is await r.setnx('n', 'new')
+        await r.setex('e', 10, {'x': 1})
+        assert {'x': 1} == await r.get('e')
+        assert {'x': 1} == json.loads(resp_server.data[b'e'])
+
+
+async def test_pipeline(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        r = redis.with_codec(PickleCodec())
+        async with r.pipeline() as p:
+            p.set('foo', {1, 2})
+            p.mset(bar=(3, 4))
+            p.get('foo')
+            p.mget('foo', 'bar')
+            assert [None, None, {1, 2}, [{1, 2}, (3, 4)]] == await p.execute()
+        async with r.transaction() as tr:
+            tr.getset('foo', 'new')
+            assert [{1, 2}] == await tr.execute()
+        assert 'new' == await r.get('foo')
+
+
+async def test_many(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        r = redis.with_codec(JsonCodec())
+        await r.set_many({f'key:{i}': {'i': i} for i in range(10)}, chunk_size=3)
+        assert [{'i': i} for i in range(10)] == await r.get_many([f'key:{i}' for i in range(10)], chunk_size=3)
+
+
+async def test_compression(resp_server: RespServer):
+    codec = CompressedCodec(JsonCodec(), threshold=100)
+    value = {'items': ['x' * 20] * 100}
+    assert codec.encode(value)[:1] == b'z'
+    assert codec.encode({'small': 1}) == b'\x00{"small":1}'
+    # incompressible values are stored uncompressed
+    random = os.urandom(1024)
+    assert CompressedCodec(threshold=100).encode(random) == b'\x00' + random
+    # values which happen to start with a header byte are still stored with a header
+    raw = CompressedCodec(threshold=100)
+    assert raw.decode(raw.encode(b'z\x00\xc1')) == b'z\x00\xc1'
+
+    async with connect(resp_server.settings()) as redis:
+        r = redis.with_codec(codec)
+        await r.set('big', value)
+        await r.set('small', [1])
+        stored = resp_server.data[b'big']
+        assert len(stored) < len(json.dumps(value)) / 10
+        assert json.loads(zlib.decompress(stored[1:])) == value
+        assert value == await r.get('big')
+        assert [value, [1]] == await r.mget('big', 'small')
+        # values written without the codec have no header
+        await redis.set('plain', '{"a":1}')
+        with pytest.raises(ValueError, match='invalid compression header'):
+            await r.get('plain')
+        assert stored == await r.get('big', decode=False)
+
+
+def test_compression_invalid():
+    with pytest.raises(ValueError, match='invalid compression'):
+        CompressedCodec(compression='gzip')
+
+
+def test_abstract_codec():
+    with pytest.raises(TypeError):
+        Codec()
+
+
+def test_bytes_codec():
+    codec = BytesCodec()
+    assert codec.encode('café') == 'café'.encode()
+    assert codec.encode(42) == b'42'
+    assert codec.encode(bytearray(b'x')) == b'x'
+    assert codec.decode(b'x') == b'x'
+
+
+def test_msgpack_lz4():
+    pytest.importorskip('msgpack')
+    pytest.importorskip('lz4')
+    codec = CompressedCodec(MsgpackCodec(), compression='lz4', threshold=10)
+    value = {'a': 'b' * 100}
+    data = codec.encode(value)
+    assert data[:1] == b'4'
+    assert codec.decode(data) == value
+    assert CompressedCodec(MsgpackCodec()).decode(data) == value
+
+
+class UpperCodec(Codec):
+    def encode(self, value):
+        return value.upper().encode()
+
+    def decode(self, data):
+        return data.decode().lower()
+
+
+async def test_custom_codec(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        r = redis.with_codec(UpperCodec())
+        await r.set('foo', 'bar')
+        assert resp_server.data[b'foo'] == b'BAR'
+        assert 'bar' == await r.get('foo')
+        assert r.with_timeout(1)._codec is r._codec
+
+
+async def test_cached(redis, settings):
+    async with connect(settings, cache_settings=CacheSettings()) as cached:
+        r = cached.with_codec(JsonCodec())
+        await r.set('foo', [1, 2])
+        assert [1, 2] == await r.get('foo')
+        assert [1, 2] == await r.get('foo')
+        assert [[1, 2], None] == await r.mget('foo', 'bar')
+        assert cached.cache.stats().hits >= 1
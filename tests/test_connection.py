@@ -1,5 +1,14 @@
+import asyncio
+import mmap
+import os
+import socket
+from datetime import datetime
+
 import pytest
+from hiredis import ReplyError
 
+from async_redis import connect
+from async_redis.testing import RespServer
 from async_redis.connection import ConnectionSettings, RawConnection, create_raw_connection
 
 
@@ -28,10 +37,150 @@ async def test_return_as_int_list(raw_connection: RawConnection):
 
 async def test_settings_repr():
     s = ConnectionSettings()
-    assert repr(s) == "RedisSettings(host='localhost', port=6379, database=0, password=None, encoding='utf8')"
-    assert str(s) == "RedisSettings(host='localhost', port=6379, database=0, password=None, encoding='utf8')"
+    assert repr(s) == (
+        "RedisSettings(host='localhost', port=6379, database=0, password=None, encoding='utf8', protocol=2, "
+        "parser='hiredis', metrics=None, command_timeout=None, stuck_timeout=10, offload_threshold=None, "
+        'executor=None, unix_socket=None, tcp_nodelay=True, tcp_keepalive=None, recv_buffer_size=None, '
+        'send_buffer_size=None, read_limit=65536, max_read_limit=16777216)'
+    )
+    assert str(s) == (
+        "RedisSettings(host='localhost', port=6379, database=0, password=None, encoding='utf8', protocol=2, "
+        "parser='hiredis', metrics=None, command_timeout=None, stuck_timeout=10, offload_threshold=None, "
+        'executor=None, unix_socket=None, tcp_nodelay=True, tcp_keepalive=None, recv_buffer_size=None, '
+        'send_buffer_size=None, read_limit=65536, max_read_limit=16777216)'
+    )
 
 
 async def test_encode_invalid(raw_connection: RawConnection):
     with pytest.raises(TypeError, match=r"Invalid argument: '\[1\]' <class 'list'> expected"):
         await raw_connection.execute([b'ECHO', [1]])
+
+
+async def test_concurrent_commands(raw_connection: RawConnection):
+    results = await asyncio.gather(*[raw_connection.execute([b'ECHO', i], 'int') for i in range(100)])
+    assert results == list(range(100))
+
+
+async def test_concurrent_mixed_encoding(raw_connection: RawConnection):
+    results = await asyncio.gather(
+        raw_connection.execute([b'ECHO', 'foo'], 'str'),
+        raw_connection.execute([b'ECHO', 'bar']),
+        raw_connection.execute([b'ECHO', 'spam'], 'str'),
+    )
+    assert results == ['foo', b'bar', 'spam']
+
+
+async def test_error_reply(raw_connection: RawConnection):
+    with pytest.raises(ReplyError, match='unknown command'):
+        await raw_connection.execute([b'FOOBAR'])
+    assert b'hello' == await raw_connection.execute([b'ECHO', b'hello'])
+
+
+async def test_cancel_command(raw_connection: RawConnection):
+    task = asyncio.ensure_future(raw_connection.execute([b'ECHO', b'first']))
+    await asyncio.sleep(0)
+    task.cancel()
+    assert b'second' == await raw_connection.execute([b'ECHO', b'second'])
+    assert task.cancelled()
+
+
+async def test_large_arguments(raw_connection: RawConnection):
+    value = os.urandom(200_000)
+    with mmap.mmap(-1, len(value)) as m:
+        m.write(value)
+        results = await asyncio.gather(
+            raw_connection.execute([b'SET', b'bytes', value]),
+            raw_connection.execute([b'SET', b'bytearray', bytearray(value)]),
+            raw_connection.execute([b'SET', b'memoryview', memoryview(value)[1000:]]),
+            raw_connection.execute([b'SET', b'mmap', m]),
+            raw_connection.execute([b'MGET', b'bytes', b'bytearray', b'memoryview', b'mmap']),
+        )
+    assert results[:4] == [b'OK'] * 4
+    assert results[4] == [value, value, value[1000:], value]
+
+
+async def test_encode_invalid_after_large_argument(raw_connection: RawConnection):
+    with pytest.raises(TypeError, match='Invalid argument'):
+        await raw_connection.execute([b'MSET', b'a', os.urandom(100_000), b'b', [1]])
+    assert b'hello' == await raw_connection.execute([b'ECHO', b'hello'])
+    assert None is await raw_connection.execute([b'GET', b'a'])
+
+
+async def test_resp3():
+    conn = await create_raw_connection(ConnectionSettings(protocol=3))
+    try:
+        assert {'maxmemory': '0'} == await conn.execute([b'CONFIG', b'GET', b'maxmemory'], 'str')
+        assert 1.5 == await conn.execute([b'INCRBYFLOAT', b'resp3-float', 1.5], 'float')
+        await conn.execute([b'DEL', b'resp3-float'])
+        assert 1 == await conn.execute([b'SETNX', b'resp3-float', 1], 'bool')
+        await conn.execute([b'DEL', b'resp3-float'])
+    finally:
+        await conn.close()
+
+
+async def test_resp3_redis():
+    async with connect(ConnectionSettings(protocol=3)) as redis:
+        assert {'maxmemory': '0'} == await redis.config_get('maxmemory')
+        await redis.set('foo', 'bar')
+        assert 'bar' == await redis.get('foo')
+        assert isinstance(await redis.time(), datetime)
+
+
+async def test_resp3_push_messages():
+    conn = await create_raw_connection(ConnectionSettings(protocol=3))
+    pushes = []
+    conn.set_push_handler(pushes.append)
+    try:
+        await conn.execute([b'SET', b'tracked', b'1'])
+        await conn.execute([b'CLIENT', b'TRACKING', b'ON'])
+        assert '1' == await conn.execute([b'GET', b'tracked'], 'str')
+        # invalidation arrives before the reply
+        assert 2 == await conn.execute([b'INCR', b'tracked'], 'int')
+        assert pushes == [[b'invalidate', [b'tracked']]]
+
+        assert '2' == await conn.execute([b'GET', b'tracked'], 'str')
+        other = await create_raw_connection(ConnectionSettings())
+        await other.execute([b'DEL', b'tracked'])
+        await other.close()
+        # invalidation received while no commands are pending
+        for _ in range(100):
+            if len(pushes) == 2:
+                break
+            await asyncio.sleep(0.005)
+        assert pushes == [[b'invalidate', [b'tracked']]] * 2
+    finally:
+        await conn.close()
+
+
+async def test_invalid_protocol():
+    with pytest.raises(ValueError, match='invalid protocol 4, must be 2 or 3'):
+        await create_raw_connection(ConnectionSettings(protocol=4))
+
+
+async def test_unix_socket(tmp_path):
+    async with RespServer(unix_socket=str(tmp_path / 'redis.sock')) as server:
+        async with connect(server.settings()) as redis:
+            await redis.set('foo', 'bar')
+            assert 'bar' == await redis.get('foo')
+            assert redis._conn._writer.get_extra_info('socket').family == socket.AF_UNIX
+        assert server.data == {b'foo': b'bar'}
+
+
+async def test_socket_options(resp_server: RespServer):
+    settings = resp_server.settings(
+        tcp_nodelay=False, tcp_keepalive=30, recv_buffer_size=2 ** 18, send_buffer_size=2 ** 18
+    )
+    async with connect(settings) as redis:
+        assert None is await redis.set('foo', 'bar')
+        sock = redis._conn._writer.get_extra_info('socket')
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) == 0
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE) == 1
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE) == 30
+        # linux doubles the requested size
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 2 ** 18
+
+    async with connect(resp_server.settings()) as redis:
+        sock = redis._conn._writer.get_extra_info('socket')
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE) == 0
@@ -1,7 +1,42 @@
-from async_redis import connect
+from async_redis import PoolSettings, Redis, connect
 
 
 async def test_simple():
     async with connect() as redis:
         assert None is await redis.set('foo', 123)
         assert '123' == await redis.get('foo')
+
+
+async def test_get_many(redis: Redis):
+    await redis.mset(**{f'key_{i}': i for i in range(2500)})
+    keys = [f'key_{i}' for i in reversed(range(2500))] + ['missing']
+    values = await redis.get_many(keys, chunk_size=100)
+    assert values == [str(i) for i in reversed(range(2500))] + [None]
+    assert {'key_1': b'1', 'missing': None} == await redis.get_many(['key_1', 'missing'], as_dict=True, decode=False)
+    assert [] == await redis.get_many([])
+
+
+async def test_set_many(redis: Redis):
+    await redis.set_many({f'key_{i}': i for i in range(2500)}, chunk_size=100)
+    assert [str(i) for i in range(2500)] == await redis.get_many([f'key_{i}' for i in range(2500)])
+    assert -1 == await redis._conn.execute([b'TTL', b'key_0'])
+
+
+async def test_set_many_expire(redis: Redis):
+    await redis.set_many([(f'key_{i}', i) for i in range(250)], expire=100, chunk_size=100)
+    assert [100] * 250 == [await redis._conn.execute([b'TTL', f'key_{i}']) for i in range(250)]
+    await redis.set_many({'a': 1, 'b': 2, 'c': 3}, expire={'a': 10, 'b': 0.5})
+    assert ['1', '2', '3'] == await redis.mget('a', 'b', 'c')
+    assert 10 == await redis._conn.execute([b'TTL', b'a'])
+    assert 0 < await redis._conn.execute([b'PTTL', b'b']) <= 500
+    assert -1 == await redis._conn.execute([b'TTL', b'c'])
+    await redis.set_many({'d': 4}, expire=0.0001)
+    # a millisecond TTL, the key may already have expired
+    assert await redis._conn.execute([b'PTTL', b'd']) in (-2, 0, 1)
+
+
+async def test_get_many_pool():
+    async with connect(pool_settings=PoolSettings(max_size=4)) as redis:
+        await redis.set_many({f'key_{i}': i for i in range(1000)}, chunk_size=50)
+        assert [str(i) for i in range(1000)] == await redis.get_many([f'key_{i}' for i in range(1000)], chunk_size=50)
+        assert redis._conn.stats().size == 4
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import ConnectionSettings, Histogram, Metrics, PoolSettings, connect
+from async_redis.connection import create_raw_connection
+from async_redis.metrics import command_name
+
+
+def test_histogram():
+    h = Histogram()
+    assert h.percentile(50) == 0
+    for i in range(1, 1001):
+        h.record(i / 1000)
+    assert h.count == 1000
+    assert h.min == 0.001
+    assert h.max == 1
+    assert h.mean == pytest.approx(0.5005)
+    assert h.percentile(50) == pytest.approx(0.5, rel=0.04)
+    assert h.percentile(99) == pytest.approx(0.99, rel=0.04)
+    assert h.percentile(100) == 1
+    assert sum(c for _, c in h.buckets()) == 1000
+    assert repr(h).startswith('Histogram(count=1000, mean=0.500500, p50=0.5')
+    h.reset()
+    assert h.count == 0
+    assert h.buckets() == []
+
+
+def test_histogram_small_large():
+    h = Histogram()
+    h.record(0.000_003)
+    h.record(-1)
+    h.record(10 ** 9)
+    assert h.buckets()[0] == (0.0, 1)
+    assert h.buckets()[1] == (0.000_003, 1)
+    assert h.max == 10 ** 9
+    # values are clamped to the largest bucket
+    assert h.percentile(100) == pytest.approx(2 ** 36 / 1_000_000)
+
+
+@pytest.mark.parametrize(
+    'args,name',
+    [
+        ((b'GET', b'foo'), 'GET'),
+        ((b'get', b'foo'), 'GET'),
+        (('SET', 'foo', 1), 'SET'),
+        ((b'CONFIG', b'get', b'maxmemory'), 'CONFIG GET'),
+        ((b'SCRIPT', 'flush'), 'SCRIPT FLUSH'),
+        ((b'SCRIPT',), 'SCRIPT'),
+    ],
+)
+def test_command_name(args, name):
+    assert command_name(args) == name
+
+
+async def test_connection_metrics(loop):
+    metrics = Metrics()
+    conn = await create_raw_connection(ConnectionSettings(metrics=metrics))
+    assert conn.metrics is metrics
+    # ignore registered scripts loaded by create_raw_connection
+    metrics.reset()
+    try:
+        await asyncio.gather(*[conn.execute((b'SET', f'key_{i}', i), 'ok') for i in range(10)])
+        await conn.execute((b'GET', b'key_1'))
+        with pytest.raises(ReplyError):
+            await conn.execute((b'INCR', b'key_1', b'extra'))
+    finally:
+        await conn.close()
+    assert set(metrics.commands) == {'SET', 'GET', 'INCR'}
+    assert metrics.commands['SET'].calls == 10
+    assert metrics.commands['SET'].errors == 0
+    assert metrics.commands['GET'].calls == 1
+    assert metrics.commands['INCR'].errors == 1
+    assert metrics.in_flight == 0
+    assert metrics.max_in_flight == 10
+    assert metrics.bytes_written == 10 * len(b'*3\r\n$3\r\nSET\r\n$5\r\nkey_0\r\n$1\r\n0\r\n') + 60
+    assert metrics.bytes_read > 10 * len(b'+OK\r\n')
+    assert repr(metrics) == 'Metrics(commands=3, in_flight=0)'
+
+    snapshot = metrics.snapshot(percentiles=(50,))
+    assert snapshot['in_flight'] == 0
+    assert snapshot['commands']['SET']['calls'] == 10
+    assert list(snapshot['commands']['SET']['latency_percentiles']) == [50]
+    metrics.reset()
+    assert metrics.commands == {}
+    assert metrics.bytes_written == 0
+
+
+async def test_hooks(loop):
+    metrics = Metrics()
+    calls = []
+
+    def hook(name, latency, error):
+        calls.append((name, latency > 0, type(error)))
+
+    def bad_hook(name, latency, error):
+        raise RuntimeError('boom')
+
+    errors = []
+    loop.set_exception_handler(lambda loop, context: errors.append(context['message']))
+    metrics.add_hook(hook)
+    metrics.add_hook(bad_hook)
+    async with connect(ConnectionSettings(metrics=metrics)) as redis:
+        await redis.set('foo', 'bar')
+        with pytest.raises(ReplyError):
+            await redis.incr('foo')
+        metrics.remove_hook(hook)
+        await redis.get('foo')
+    assert calls == [('SET', True, type(None)), ('INCR', True, ReplyError)]
+    assert errors == ['error in metrics hook'] * 3
+
+
+async def test_pool_metrics(loop):
+    metrics = Metrics()
+    async with connect(ConnectionSettings(metrics=metrics), pool_settings=PoolSettings(max_size=3)) as redis:
+        await asyncio.gather(*[redis.incr('counter') for _ in range(30)])
+        async with redis.transaction() as tr:
+            tr.incr('counter')
+    assert metrics.commands['INCR'].calls == 31
+    assert metrics.commands['MULTI'].calls == 1
+    assert metrics.commands['EXEC'].calls == 1
+    assert metrics.in_flight == 0
+
+
+async def test_connection_lost_metrics(loop):
+    metrics = Metrics()
+    conn = await create_raw_connection(ConnectionSettings(metrics=metrics))
+    fut = asyncio.ensure_future(conn.execute((b'BLPOP', b'list', 0)))
+    await asyncio.sleep(0.01)
+    conn._reader.feed_eof()
+    with pytest.raises(ConnectionError):
+        await fut
+    await conn.close()
+    assert metrics.commands['BLPOP'].errors == 1
+    assert metrics.in_flight == 0
+
+
+async def test_disabled(redis):
+    assert redis._conn.metrics is None
+    assert redis._conn._reader.metrics is None
+    await redis.set('foo', 'bar')
+    assert len(redis._conn._metric_starts) == 0
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from async_redis import JsonCodec, connect
+from async_redis.connection import _reply_size
+from async_redis.testing import RespServer
+
+
+def thread_name(value):
+    return value, threading.current_thread().name
+
+
+@pytest.fixture(name='executor')
+def _fix_executor():
+    executor = ThreadPoolExecutor(1, thread_name_prefix='offload')
+    yield executor
+    executor.shutdown()
+
+
+async def test_offload(resp_server: RespServer, executor):
+    async with connect(resp_server.settings(offload_threshold=1000, executor=executor)) as redis:
+        await redis.set('small', 'x' * 10)
+        await redis.set('big', 'x' * 1000)
+        assert ('x' * 10, 'MainThread') == await redis._execute((b'GET', b'small'), 'str', thread_name)
+        assert ('x' * 1000, 'offload_0') == await redis._execute((b'GET', b'big'), 'str', thread_name)
+        value, name = await redis._execute((b'MGET', b'small', b'big'), 'str', thread_name)
+        assert (value, name) == (['x' * 10, 'x' * 1000], 'offload_0')
+
+        # replies keep their order and errors are raised
+        async with redis.pipeline() as p:
+            p._execute((b'GET', b'big'), None, thread_name)
+            p._execute((b'GET', b'small'), None, thread_name)
+            p._execute((b'GET', b'big'), None, lambda v: 1 / 0)
+            with pytest.raises(ZeroDivisionError):
+                await p.execute()
+
+        async with redis.transaction() as tr:
+            tr._execute((b'GET', b'big'), 'str', thread_name)
+            tr._execute((b'GET', b'small'), 'str', thread_name)
+            assert [('x' * 1000, 'offload_0'), ('x' * 10, 'offload_0')] == await tr.execute()
+
+
+async def test_offload_codec(resp_server: RespServer, executor):
+    async with connect(resp_server.settings(offload_threshold=100, executor=executor)) as redis:
+        r = redis.with_codec(JsonCodec())
+        await r.set('foo', {'a': 'b' * 200})
+        assert {'a': 'b' * 200} == await r.get('foo')
+        assert [{'a': 'b' * 200}, None] == await r.mget('foo', 'bar')
+
+
+async def test_offload_cancelled(resp_server: RespServer, executor):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(value):
+        started.set()
+        release.wait()
+        return value
+
+    async with connect(resp_server.settings(offload_threshold=10, executor=executor)) as redis:
+        await redis.set('big', 'x' * 100)
+        task = asyncio.get_event_loop().create_task(redis._execute((b'GET', b'big'), None, slow))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert 'x' * 100 == await redis.get('big')
+
+
+def test_reply_size():
+    assert _reply_size(b'abc', 100) == 3
+    assert _reply_size(['abcdef', [b'de', 5]], 100) == 6 + 4 + 4
+    assert _reply_size([b'x' * 10] * 1000, 50) == 50
+    assert _reply_size(None, 100) == 0
@@ -1,3 +1,8 @@
+from datetime import datetime
+
+import pytest
+from hiredis import ReplyError
+
 from async_redis import Redis
 
 
@@ -8,5 +13,33 @@ async def test_simple(redis: Redis):
         p.get('foo')
         p.set('foo', 3)
         p.get('foo')
-        # v = await p.execute()
-    # debug(v)
+        v = await p.execute()
+    assert v == [None, None, '1', None, '3']
+
+
+async def test_mixed_return_types(redis: Redis):
+    async with redis.pipeline() as p:
+        p.set('foo', 'bar')
+        p.get('foo')
+        p.get('foo', decode=False)
+        p.incr('counter')
+        p.incrbyfloat('float', 1.5)
+        p.setnx('foo', 'x')
+        p.mget('foo', 'counter')
+        p.time()
+        p.config_get('maxmemory')
+        v = await p.execute()
+    assert v[:8] == [None, 'bar', b'bar', 1, 1.5, False, ['bar', '1'], v[7]]
+    assert isinstance(v[7], datetime)
+    assert v[8] == {'maxmemory': '0'}
+
+
+async def test_errors_deferred(redis: Redis):
+    async with redis.pipeline() as p:
+        p.set('foo', 'bar')
+        p.incr('foo')
+        p.set('spam', 'x')
+        with pytest.raises(ReplyError, match='value is not an integer'):
+            await p.execute()
+    assert 'x' == await redis.get('spam')
+    assert 'bar' == await redis.get('foo')
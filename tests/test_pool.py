@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from async_redis import ConnectionPool, PoolSettings, connect, create_pool
+from async_redis.connection import ConnectionSettings
+
+
+async def test_connect_pool():
+    async with connect(pool_settings=PoolSettings(min_size=2, max_size=4)) as redis:
+        assert None is await redis.set('foo', 123)
+        assert '123' == await redis.get('foo')
+        assert ['123', '123'] == await asyncio.gather(redis.get('foo'), redis.get('foo'))
+
+
+async def test_lifo_reuse(settings: ConnectionSettings):
+    pool = await create_pool(settings, PoolSettings(min_size=0, max_size=2))
+    try:
+        assert pool.stats().size == 0
+        c1 = await pool.acquire()
+        c2 = await pool.acquire()
+        pool.release(c1)
+        pool.release(c2)
+        assert await pool.acquire() is c2
+        assert await pool.acquire() is c1
+        s = pool.stats()
+        assert (s.size, s.idle, s.in_use, s.created) == (2, 0, 2, 2)
+        pool.release(c1)
+        pool.release(c2)
+    finally:
+        await pool.close()
+
+
+async def test_waiters_served_in_order(settings: ConnectionSettings):
+    pool = await create_pool(settings, PoolSettings(min_size=1, max_size=1))
+    try:
+        conn = await pool.acquire()
+        order = []
+
+        async def acquire(n):
+            c = await pool.acquire()
+            order.append(n)
+            pool.release(c)
+
+        tasks = [asyncio.ensure_future(acquire(n)) for n in range(5)]
+        await asyncio.sleep(0)
+        assert pool.stats().waiting == 5
+        pool.release(conn)
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2, 3, 4]
+        assert pool.stats().created == 1
+    finally:
+        await pool.close()
+
+
+async def test_broken_connection_discarded(settings: ConnectionSettings):
+    pool = await create_pool(settings, PoolSettings(min_size=1, max_size=1))
+    try:
+        conn = await pool.acquire()
+        await conn.close()
+        pool.release(conn)
+        assert b'hello' == await pool.execute([b'ECHO', b'hello'])
+        s = pool.stats()
+        assert (s.size, s.created, s.discarded) == (1, 2, 1)
+    finally:
+        await pool.close()
+
+
+async def test_idle_connections_pruned(settings: ConnectionSettings):
+    pool = await create_pool(settings, PoolSettings(min_size=1, max_size=3, max_idle_time=0.02))
+    try:
+        conns = await asyncio.gather(pool.acquire(), pool.acquire(), pool.acquire())
+        for c in conns:
+            pool.release(c)
+        assert pool.stats().idle == 3
+        # pruned without the pool being used
+        await asyncio.sleep(0.1)
+        s = pool.stats()
+        assert (s.size, s.idle, s.discarded) == (1, 1, 2)
+        assert b'PONG' == await pool.execute([b'PING'])
+    finally:
+        await pool.close()
+
+
+async def test_health_check(settings: ConnectionSettings):
+    pool = await create_pool(settings, PoolSettings(min_size=1, max_size=1, health_check_interval=0))
+    try:
+        conn = await pool.acquire()
+        pool.release(conn)
+        # the idle connection replies to PING so it's reused
+        assert conn is await pool.acquire()
+        pool.release(conn)
+        assert pool.stats().discarded == 0
+    finally:
+        await pool.close()
+
+
+async def test_health_check_unresponsive():
+    async def handle(reader, writer):
+        # accept the connection but never reply, like a half open socket
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    pool_settings = PoolSettings(min_size=1, max_size=1, health_check_interval=0, health_check_timeout=0.05)
+    pool = await create_pool(ConnectionSettings(port=port, stuck_timeout=0.1), pool_settings)
+    try:
+        ((conn, _),) = pool._idle
+        new_conn = await pool.acquire()
+        # the idle connection didn't reply to PING so it was replaced
+        assert new_conn is not conn
+        s = pool.stats()
+        assert (s.size, s.created, s.discarded) == (1, 2, 1)
+        pool.release(new_conn)
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_invalid_settings(settings: ConnectionSettings):
+    with pytest.raises(ValueError, match='min_size must be between 0 and max_size'):
+        ConnectionPool(settings, PoolSettings(min_size=3, max_size=2))
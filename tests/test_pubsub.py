@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from async_redis import ConnectionSettings, PubSub, PubSubSettings, Redis, create_pubsub
+from async_redis.pubsub import Message
+
+
+@pytest.fixture(name='pubsub')
+def fix_pubsub(loop, settings: ConnectionSettings):
+    asyncio.set_event_loop(loop)
+    pubsub: PubSub = loop.run_until_complete(create_pubsub(settings))
+    yield pubsub
+    loop.run_until_complete(pubsub.close())
+
+
+async def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError('condition not met')
+
+
+async def test_subscribe(redis: Redis, pubsub: PubSub):
+    sub = await pubsub.subscribe('foo', 'bar')
+    assert 1 == await redis.publish('foo', 'hello')
+    assert 1 == await redis.publish('bar', b'world')
+    assert 0 == await redis.publish('spam', 'x')
+    assert Message('foo', 'hello') == await sub.__anext__()
+    assert Message('bar', 'world') == await sub.__anext__()
+    await sub.unsubscribe()
+    assert [m async for m in sub] == []
+    assert 0 == await redis.publish('foo', 'hello')
+
+
+async def test_subscribe_duplicates(redis: Redis, pubsub: PubSub):
+    sub = await pubsub.subscribe('foo', b'foo', 'bar', max_queue=1, overflow='drop_newest')
+    assert sub.names == [b'foo', b'bar']
+    assert sub._max_queue == 1
+    sub = await pubsub.subscribe('foo', 'foo')
+    await redis.publish('foo', 'a')
+    await redis.publish('foo', 'b')
+    assert [Message('foo', 'a'), Message('foo', 'b')] == [await sub.__anext__(), await sub.__anext__()]
+
+
+async def test_psubscribe(redis: Redis, pubsub: PubSub):
+    sub = await pubsub.psubscribe('news.*', decode=False)
+    await redis.publish('news.tech', 'a')
+    await redis.publish('other', 'b')
+    await redis.publish('news.art', 'c')
+    messages = []
+    async for msg in sub:
+        messages.append(msg)
+        if len(messages) == 2:
+            break
+    assert messages == [Message(b'news.tech', b'a', b'news.*'), Message(b'news.art', b'c', b'news.*')]
+
+
+async def test_batches(redis: Redis, pubsub: PubSub):
+    sub1 = await pubsub.subscribe('foo')
+    batches = []
+    await pubsub.subscribe('foo', callback=batches.append)
+    async with redis.pipeline() as p:
+        for i in range(100):
+            p.publish('foo', i)
+    await wait_for(lambda: sum(len(b) for b in batches) == 100)
+    # messages are delivered in batches rather than one at a time
+    assert len(batches) < 100
+    assert [m.data for b in batches for m in b] == [str(i) for i in range(100)]
+    received = []
+    async for batch in sub1.batches():
+        received += batch
+        if len(received) == 100:
+            break
+    assert [m.data for m in received] == [str(i) for i in range(100)]
+
+
+@pytest.mark.parametrize(
+    'overflow,expected,dropped', [('drop_oldest', ['7', '8', '9'], 7), ('drop_newest', ['0', '1', '2'], 7)]
+)
+async def test_drop(redis: Redis, pubsub: PubSub, overflow, expected, dropped):
+    sub = await pubsub.subscribe('foo', max_queue=3, overflow=overflow)
+    for i in range(10):
+        await redis.publish('foo', i)
+    await wait_for(lambda: sub.dropped == dropped)
+    await sub.unsubscribe()
+    assert [m.data async for m in sub] == expected
+
+
+async def test_block(redis: Redis, pubsub: PubSub):
+    sub = await pubsub.subscribe('foo', max_queue=2, overflow='block')
+    other = []
+    await pubsub.subscribe('bar', callback=other.extend)
+    for i in range(5):
+        await redis.publish('foo', i)
+    await redis.publish('bar', 'x')
+    await asyncio.sleep(0.01)
+    # reading has stopped until foo is consumed
+    assert other == []
+    assert [m.data for m in [await sub.__anext__() for _ in range(5)]] == ['0', '1', '2', '3', '4']
+    await wait_for(lambda: other == [Message('bar', 'x')])
+    assert sub.dropped == 0
+
+
+async def test_resubscribe(redis: Redis, pubsub: PubSub):
+    sub = await pubsub.subscribe('foo')
+    psub = await pubsub.psubscribe('b*')
+    await redis._conn.execute([b'CLIENT', b'KILL', b'TYPE', b'pubsub'])
+    await wait_for(lambda: not pubsub.connected)
+    # wait until the channel has been subscribed to again
+    for _ in range(100):
+        if await redis.publish('foo', 'a') == 1:
+            break
+        await asyncio.sleep(0.005)
+    await redis.publish('bar', 'b')
+    assert Message('foo', 'a') == await sub.__anext__()
+    assert Message('bar', 'b', 'b*') == await psub.__anext__()
+
+
+async def test_close(settings: ConnectionSettings):
+    async with PubSub(settings, PubSubSettings(max_queue=None)) as pubsub:
+        sub = await pubsub.subscribe(b'foo')
+    assert sub.closed
+    assert [m async for m in sub] == []
+    with pytest.raises(RuntimeError, match='pubsub is not open'):
+        await pubsub.subscribe('foo')
+
+
+async def test_max_queue(settings, pubsub: PubSub):
+    assert (await pubsub.subscribe('a'))._max_queue == 10_000
+    # None means no limit rather than the default
+    assert (await pubsub.subscribe('b', max_queue=None))._max_queue is None
+    for max_queue in (0, -1):
+        with pytest.raises(ValueError, match='max_queue must be at least 1'):
+            await pubsub.subscribe('c', max_queue=max_queue)
+    with pytest.raises(ValueError, match='max_queue must be at least 1'):
+        PubSub(settings, PubSubSettings(max_queue=0))
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from async_redis import CacheSettings, ConnectionSettings, PoolSettings, ReplicaRedis, ReplicaSettings, connect
+from async_redis.replicas import ReplicaSet
+
+
+@pytest.fixture(name='silent_server')
+def fix_silent_server(loop):
+    """
+    Server which accepts connections and commands but never replies, like a very slow replica.
+    """
+    received = []
+
+    async def handle(reader, writer):
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                break
+            received.append(data)
+        writer.close()
+
+    server = loop.run_until_complete(asyncio.start_server(handle, 'localhost', 0))
+    yield server.sockets[0].getsockname()[1], received
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+
+
+async def test_reads_from_replicas(settings: ConnectionSettings):
+    replica_settings = ReplicaSettings(replicas=[settings, settings])
+    async with connect(settings, replica_settings=replica_settings) as redis:
+        assert isinstance(redis, ReplicaRedis)
+        assert None is await redis.set('foo', 'bar')
+        assert ['bar'] * 4 == await asyncio.gather(*[redis.get('foo') for _ in range(4)])
+        # all replicas are used
+        tasks = [asyncio.ensure_future(redis.strlen('foo')) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert redis.replicas.outstanding == [2, 2]
+        assert [3] * 4 == await asyncio.gather(*tasks)
+        assert redis.replicas.outstanding == [0, 0]
+
+
+async def test_writes_to_primary(settings: ConnectionSettings):
+    async with connect(settings, replica_settings=ReplicaSettings(replicas=[settings])) as redis:
+        task = asyncio.ensure_future(redis.incr('counter'))
+        await asyncio.sleep(0)
+        assert redis.replicas.outstanding == [0]
+        assert 1 == await task
+
+
+async def test_hedged_read(settings: ConnectionSettings, silent_server):
+    port, received = silent_server
+    replica_settings = ReplicaSettings(
+        replicas=[ConnectionSettings(port=port), settings], hedge=True, max_hedge_delay=0.01
+    )
+    async with connect(settings, pool_settings=PoolSettings(), replica_settings=replica_settings) as redis:
+        await redis.set('foo', 'bar')
+        assert ['bar', 'bar'] == [await redis.get('foo'), await redis.get('foo')]
+        assert redis.replicas.hedged >= 1
+        assert received
+        # the cancelled read to the silent replica is recorded with the time it had taken
+        assert max(redis.replicas._latencies) >= 0.01
+        assert redis.replicas.outstanding == [0, 0]
+
+
+async def test_no_replicas(settings: ConnectionSettings):
+    with pytest.raises(ValueError, match='at least one replica is required'):
+        await connect(settings, replica_settings=ReplicaSettings())
+
+
+def test_cache_and_replicas():
+    with pytest.raises(ValueError, match='cache_settings and replica_settings cannot be used together'):
+        connect(cache_settings=CacheSettings(), replica_settings=ReplicaSettings())
+
+
+def test_hedge_delay(loop):
+    asyncio.set_event_loop(loop)
+    replicas = ReplicaSet(ReplicaSettings(min_hedge_delay=0.005, max_hedge_delay=1))
+    assert replicas.hedge_delay == 1
+    for i in range(100):
+        replicas._record(i / 1000)
+    assert replicas.hedge_delay == 0.095
+    # once the old latencies have left the window
+    for i in range(1000):
+        replicas._record(0)
+    assert replicas.hedge_delay == 0.005
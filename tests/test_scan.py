@@ -0,0 +1,96 @@
+import asyncio
+
+from async_redis import Redis
+from async_redis.scan import ScanIterator
+
+
+async def test_scan(redis: Redis):
+    await redis.mset(**{f'key:{i}': i for i in range(500)})
+    await redis.set('other', 1)
+    cursor, keys = await redis.scan(match='key:*', count=50)
+    assert cursor != 0
+    assert all(k.startswith('key:') for k in keys)
+    keys = [k async for k in redis.scan_iter(match='key:*', count=50)]
+    assert sorted(keys) == sorted(f'key:{i}' for i in range(500))
+    assert {b'other'} == {k async for k in redis.scan_iter(match='o*', decode=False)}
+
+
+async def test_scan_pages(redis: Redis):
+    await redis.mset(**{f'key:{i}': i for i in range(500)})
+    it = redis.scan_iter(count=100, target_latency=None)
+    pages = [page async for page in it.pages()]
+    assert len(pages) > 1
+    assert sum(len(p) for p in pages) == 500
+    assert it.count == 100
+
+
+async def test_sscan_hscan_zscan(redis: Redis):
+    await redis._conn.execute([b'SADD', b'set', *range(200)])
+    await redis._conn.execute([b'HSET', b'hash', *[v for i in range(200) for v in (f'f{i}', i)]])
+    await redis._conn.execute([b'ZADD', b'zset', *[v for i in range(200) for v in (i / 2, f'm{i}')]])
+    assert sorted([int(m) async for m in redis.sscan_iter('set', count=20)]) == list(range(200))
+    assert {f: v async for f, v in redis.hscan_iter('hash', count=20)} == {f'f{i}': str(i) for i in range(200)}
+    assert sorted([s async for _, s in redis.zscan_iter('zset', count=20)]) == [i / 2 for i in range(200)]
+    assert [(b'm3', 1.5)] == [v async for v in redis.zscan_iter('zset', match='m3', decode=False)]
+
+
+async def test_prefetch():
+    pages = {0: (1, ['a', 'b']), 1: (2, ['c']), 2: (0, ['d'])}
+    requested = []
+
+    async def fetch(cursor, count):
+        requested.append(cursor)
+        return pages[cursor]
+
+    it = ScanIterator(fetch)
+    items = []
+    async for item in it:
+        items.append(item)
+        await asyncio.sleep(0)
+        if item == 'a':
+            # the next page was requested before the first page has been consumed
+            assert requested == [0, 1]
+    assert items == ['a', 'b', 'c', 'd']
+    assert requested == [0, 1, 2]
+
+
+async def test_stop_early():
+    requested = []
+
+    async def fetch(cursor, count):
+        requested.append(cursor)
+        await asyncio.sleep(0.01)
+        return cursor + 1, [cursor]
+
+    it = ScanIterator(fetch).pages()
+    assert [0] == await it.__anext__()
+    await it.aclose()
+    await asyncio.sleep(0.02)
+    # the prefetch of the next page was cancelled
+    assert requested == [0]
+
+
+async def test_adaptive_count(monkeypatch):
+    # a fake clock which only advances while fetching, so the measured latency doesn't depend on the machine
+    now = 0.0
+    latency = 0.001
+
+    async def fetch(cursor, count):
+        nonlocal now
+        now += latency
+        return cursor + 1, [cursor]
+
+    monkeypatch.setattr(asyncio.get_event_loop(), 'time', lambda: now)
+    it = ScanIterator(fetch, count=100, target_latency=0.01)
+    pages = it.pages()
+    for _ in range(3):
+        await pages.__anext__()
+    # pages are much faster than the target, so COUNT is doubled each time
+    assert it.count >= 400
+    # pages are slower than the target, COUNT is halved each time
+    latency = 0.05
+    count = it.count
+    for _ in range(3):
+        await pages.__anext__()
+    assert it.count < count
+    await pages.aclose()
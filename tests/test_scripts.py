@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import PoolSettings, Redis, Script, connect
+from async_redis.connection import RawConnection, default_timeout
+
+
+async def test_eval(redis: Redis):
+    assert 'foo' == await redis.eval('return ARGV[1]', args=['foo'])
+    assert b'bar' == await redis.eval('return KEYS[1]', keys=['bar'], decode=False)
+    sha = await redis.script_load('return 42')
+    assert 42 == await redis.evalsha(sha)
+    assert [True, False] == await redis.script_exists(sha, '0' * 40)
+
+
+async def test_register_script(redis: Redis):
+    incr_by = redis.register_script("return redis.call('INCRBY', KEYS[1], ARGV[1])")
+    assert isinstance(incr_by, Script)
+    assert redis._conn.scripts == {incr_by.sha: incr_by}
+    assert repr(incr_by) == f'Script(sha={incr_by.sha!r})'
+    assert 3 == await incr_by(redis, ['counter'], [3])
+    assert 5 == await incr_by(redis, ['counter'], [2])
+
+
+async def test_noscript_reload(redis: Redis):
+    script = redis.register_script("return redis.call('GET', KEYS[1])")
+    await redis.set('foo', 'bar')
+    await redis.script_flush()
+    assert [False] == await redis.script_exists(script.sha)
+    assert 'bar' == await script(redis, ['foo'])
+    assert [True] == await redis.script_exists(script.sha)
+
+
+async def test_noscript_reload_pipeline(redis: Redis):
+    script = redis.register_script("return redis.call('INCR', KEYS[1])")
+    await redis.script_flush()
+    async with redis.pipeline() as p:
+        script(p, ['a'])
+        p.set('foo', 'bar')
+        script(p, ['b'])
+        p.get('foo')
+        v = await p.execute()
+    assert v == [1, None, 1, 'bar']
+
+
+async def test_noscript_unregistered(redis: Redis):
+    with pytest.raises(ReplyError, match='^NOSCRIPT'):
+        await redis.evalsha('0' * 40)
+
+
+async def test_registry_per_client(redis: Redis):
+    script = redis.register_script('return 1')
+    await redis.script_flush()
+    async with connect() as redis2:
+        assert redis2._conn.scripts == {}
+        with pytest.raises(ReplyError, match='^NOSCRIPT'):
+            await script(redis2)
+        assert [False] == await redis2.script_exists(script.sha)
+    # loaded lazily when redis replies NOSCRIPT
+    assert 1 == await script(redis)
+    assert [True] == await redis.script_exists(script.sha)
+
+
+async def test_registry_pool():
+    async with connect(pool_settings=PoolSettings(max_size=2)) as redis:
+        script = redis.register_script("return redis.call('INCR', KEYS[1])")
+        await redis.script_flush()
+        assert [1, 1] == await asyncio.gather(script(redis, ['a']), script(redis, ['b']))
+        assert redis._conn.size == 2
+        assert all(conn.scripts is redis._conn.scripts for conn, _ in redis._conn._idle)
+
+
+async def test_noscript_retry_timeout(redis: Redis, monkeypatch):
+    script = redis.register_script('return 1')
+    await redis.script_flush()
+    timeouts = []
+    execute_many = RawConnection.execute_many
+
+    def spy(self, commands, timeout):
+        timeouts.append(timeout)
+        return execute_many(self, commands, timeout)
+
+    monkeypatch.setattr(RawConnection, 'execute_many', spy)
+    assert 1 == await redis._conn.execute((b'EVALSHA', script.sha, 0), timeout=10)
+    # the retry only gets the time left of the original timeout
+    assert len(timeouts) == 1 and 9 < timeouts[0] < 10
+
+
+async def test_register_loads(redis: Redis, monkeypatch):
+    await redis.script_flush()
+    script = redis.register_script('return 2')
+    calls = []
+    execute_many = RawConnection.execute_many
+
+    def spy(self, commands, timeout=default_timeout):
+        calls.append(commands)
+        return execute_many(self, commands, timeout)
+
+    monkeypatch.setattr(RawConnection, 'execute_many', spy)
+    # the script is loaded as soon as it's registered, so there's no NOSCRIPT retry
+    assert 2 == await script(redis)
+    assert calls == []
+
+
+async def test_preload_round_trips(monkeypatch):
+    async with connect(pool_settings=PoolSettings(max_size=2)) as redis:
+        scripts = [redis.register_script('return 1'), redis.register_script('return 2')]
+        await redis.script_flush()
+        calls = []
+        execute_many = RawConnection.execute_many
+
+        def spy(self, commands, timeout=default_timeout):
+            calls.append(commands)
+            return execute_many(self, commands, timeout)
+
+        monkeypatch.setattr(RawConnection, 'execute_many', spy)
+        pool = redis._conn
+        conn1 = await pool.acquire()
+        conn2 = await pool.acquire()
+        try:
+            # the second connection is new, both scripts are loaded in one round trip when it's created
+            assert len(calls) == 1
+            assert [c[0][:2] for c in calls[0]] == [(b'SCRIPT', b'LOAD')] * 2
+            assert [1, 1] == await conn2.execute((b'SCRIPT', b'EXISTS', *(s.sha for s in scripts)))
+        finally:
+            pool.release(conn1)
+            pool.release(conn2)
@@ -0,0 +1,131 @@
+from collections import Counter
+
+import pytest
+from pytest import fixture
+
+from async_redis import HashRing, JsonCodec, PoolSettings, Redis, create_sharded
+from async_redis.testing import RespServer
+
+
+@fixture(name='servers')
+def fix_servers(loop):
+    servers = [RespServer() for _ in range(3)]
+    for server in servers:
+        loop.run_until_complete(server.start())
+    yield servers
+    for server in servers:
+        loop.run_until_complete(server.close())
+
+
+def test_ring_distribution():
+    ring = HashRing(['a:6379/0', 'b:6379/0', 'c:6379/0'])
+    counts = Counter(ring.node(b'key:%d' % i) for i in range(30_000))
+    assert set(counts) == {0, 1, 2}
+    assert all(8_000 < c < 12_000 for c in counts.values()), counts
+
+
+def test_ring_remove_node():
+    names = [f'10.0.0.{i}:6379/0' for i in range(5)]
+    ring = HashRing(names)
+    smaller = HashRing(names[:2] + names[3:])
+    keys = [b'key:%d' % i for i in range(20_000)]
+    moved = 0
+    for key in keys:
+        before = names[ring.node(key)]
+        after = smaller.names[smaller.node(key)]
+        if before != after:
+            # only keys of the removed node move
+            assert before == names[2]
+            moved += 1
+    assert 0.15 < moved / len(keys) < 0.25
+
+
+def test_ring_hash_tag():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    assert len({ring.node(b'{user:1}:%d' % i) for i in range(100)}) == 1
+
+
+def test_ring_invalid():
+    with pytest.raises(ValueError, match='at least one node is required'):
+        HashRing([])
+    with pytest.raises(ValueError, match='node names must be unique'):
+        HashRing(['a', 'a'])
+
+
+async def test_commands(servers):
+    async with await create_sharded([s.settings() for s in servers]) as redis:
+        for i in range(30):
+            await redis.set(f'key:{i}', i)
+        assert ['0', '7', None] == [await redis.get('key:0'), await redis.get('key:7'), await redis.get('missing')]
+        # every key is on the server its shard belongs to
+        for i in range(30):
+            shard = redis.shard_for_key(f'key:{i}')
+            server = next(s for s in servers if s.port == shard.port)
+            assert server.data[f'key:{i}'.encode()] == str(i).encode()
+        assert all(s.data for s in servers)
+
+        assert [str(i) if i < 30 else None for i in range(40)] == await redis.mget(*(f'key:{i}' for i in range(40)))
+        await redis.mset(*((f'new:{i}', i * 2) for i in range(20)))
+        assert [str(i * 2) for i in range(20)] == await redis.get_many([f'new:{i}' for i in range(20)])
+        await redis.set_many({f'many:{i}': i for i in range(20)}, chunk_size=5)
+        assert {f'many:{i}': str(i) for i in range(20)} == await redis.get_many(
+            [f'many:{i}' for i in range(20)], as_dict=True
+        )
+
+        await redis.flushdb()
+        assert not any(s.data for s in servers)
+
+
+async def test_scripts(servers):
+    async with await create_sharded([s.settings() for s in servers], PoolSettings(max_size=2)) as redis:
+        script = redis.register_script('return 1')
+        assert all(redis._conn.connection(i).scripts == {script.sha: script} for i in range(3))
+
+
+async def test_pipeline(servers):
+    settings = [s.settings() for s in servers]
+    async with await create_sharded(settings, PoolSettings(min_size=1, max_size=2)) as redis:
+        r = redis.with_codec(JsonCodec())
+        async with r.pipeline() as p:
+            for i in range(10):
+                p.set(f'key:{i}', {'i': i})
+            p.mget(*(f'key:{i}' for i in range(10)))
+            for i in range(10):
+                p.get(f'key:{i}')
+            results = await p.execute()
+        assert results[:10] == [None] * 10
+        assert results[10] == [{'i': i} for i in range(10)]
+        assert results[11:] == [{'i': i} for i in range(10)]
+
+        async with redis.pipeline() as p:
+            p.set('foo', 'bar')
+            p.incr('foo')
+            p.get('foo')
+            with pytest.raises(Exception, match='not an integer'):
+                await p.execute()
+
+
+async def test_transaction(servers):
+    async with await create_sharded([s.settings() for s in servers]) as redis:
+        async with redis.transaction() as tr:
+            tr.set('{user:1}:name', 'anne')
+            tr.incr('{user:1}:visits')
+            assert [None, 1] == await tr.execute()
+
+        async def update(r, tr):
+            visits = int(await r.get('{user:1}:visits'))
+            tr.set('{user:1}:visits', visits + 1)
+
+        assert [None] == await redis.watch(update, '{user:1}:visits')
+        assert '2' == await redis.get('{user:1}:visits')
+
+        async with redis.transaction() as tr:
+            for i in range(10):
+                tr.set(f'key:{i}', i)
+            with pytest.raises(ValueError, match='must belong to the same shard'):
+                await tr.execute()
+        with pytest.raises(ValueError, match='must belong to the same shard'):
+            await redis.watch(update, *(f'key:{i}' for i in range(10)))
+
+        with pytest.raises(TypeError, match='watch is not supported with ShardedConnection'):
+            await Redis(redis._conn).watch(update, '{user:1}:visits')
@@ -0,0 +1,220 @@
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import ConnectionSettings, Redis, connect
+from async_redis.streams import HiredisParser, PythonParser, RedisProtocol, RedisStreamReader
+
+
+async def test_get_into_file(redis: Redis):
+    value = os.urandom(1_000_000)
+    await redis.set('foo', value)
+    f = BytesIO()
+    assert 1_000_000 == await redis.get_into('foo', f)
+    assert f.getvalue() == value
+    assert 1_000_000 == await redis.strlen('foo')
+
+
+async def test_get_into_buffer(redis: Redis):
+    await redis.set('foo', b'hello world')
+    buffer = bytearray(20)
+    assert 11 == await redis.get_into('foo', buffer)
+    assert buffer == b'hello world' + b'\x00' * 9
+
+
+async def test_get_into_buffer_too_small(redis: Redis):
+    await redis.set('foo', b'hello world')
+    with pytest.raises(ValueError, match='value of 11 bytes does not fit in a buffer of 5 bytes'):
+        await redis.get_into('foo', bytearray(5))
+    assert 'hello world' == await redis.get('foo')
+
+
+async def test_get_into_missing(redis: Redis):
+    assert None is await redis.get_into('foo', BytesIO())
+
+
+async def test_get_stream_error(redis: Redis):
+    await redis._conn.execute([b'RPUSH', b'foo', b'x'])
+    with pytest.raises(ReplyError, match='WRONGTYPE'):
+        await redis.get_stream('foo')
+    assert None is await redis.get('bar')
+
+
+async def test_get_stream_concurrent(redis: Redis):
+    value = os.urandom(500_000)
+    await redis.set('big', value)
+    await redis.set('small', 'x')
+
+    async def consume():
+        stream = await redis.get_stream('big')
+        chunks = []
+        async for chunk in stream:
+            chunks.append(bytes(chunk))
+            # slow consumer so the transport is paused
+            await asyncio.sleep(0)
+        return b''.join(chunks)
+
+    results = await asyncio.gather(redis.get('small'), consume(), redis.get('small'), consume(), redis.get('small'))
+    assert results == ['x', value, 'x', value, 'x']
+
+
+async def test_stream_closed_early(redis: Redis):
+    value = os.urandom(500_000)
+    await redis.set('big', value)
+    stream = await redis.get_stream('big')
+    assert stream.size == 500_000
+    stream.close()
+    assert [c async for c in stream] == []
+    assert 500_000 == await redis.strlen('big')
+
+
+@pytest.mark.parametrize('parser_class', [HiredisParser, PythonParser])
+@pytest.mark.parametrize(
+    'data,encoding,convert,expected',
+    [
+        (b'$3\r\nfoo\r\n', None, None, b'foo'),
+        (b'$3\r\nfoo\r\n', 'utf8', None, 'foo'),
+        (b'$-1\r\n', None, int, None),
+        (b'+OK\r\n', None, None, b'OK'),
+        (b':42\r\n', None, float, 42.0),
+        (b'*3\r\n$1\r\n1\r\n$-1\r\n$2\r\n23\r\n', None, int, [1, None, 23]),
+        (b'*2\r\n$3\r\n1.5\r\n:2\r\n', None, float, [1.5, 2.0]),
+        (b'*2\r\n$1\r\n0\r\n*1\r\n$1\r\na\r\n', 'utf8', None, ['0', ['a']]),
+        (b'*0\r\n', None, int, []),
+        (b'%1\r\n+k\r\n,1.5\r\n', 'utf8', None, {'k': 1.5}),
+        (b'~2\r\n#t\r\n_\r\n', None, None, [True, None]),
+        (b'=7\r\ntxt:abc\r\n', None, None, b'abc'),
+        (b'(123\r\n', None, None, b'123'),
+    ],
+)
+def test_parser(parser_class, data, encoding, convert, expected):
+    parser = parser_class()
+    parser.set_reply_type(encoding, convert)
+    # feed one byte at a time to check partial replies are resumed correctly
+    for i in range(len(data)):
+        assert parser.gets() is False
+        parser.feed(data[i : i + 1])
+    result = parser.gets()
+    assert result == expected
+    assert type(result) is type(expected)
+    assert parser.gets() is False
+
+
+@pytest.mark.parametrize('parser_class', [HiredisParser, PythonParser])
+def test_parser_errors(parser_class):
+    parser = parser_class()
+    parser.feed(b'-ERR bad\r\n*2\r\n$1\r\n1\r\n$1\r\nx\r\n:5\r\n')
+    parser.set_reply_type(None, int)
+    error = parser.gets()
+    assert isinstance(error, ReplyError)
+    assert str(error) == 'ERR bad'
+    error = parser.gets()
+    assert isinstance(error, ValueError)
+    assert str(error) == "invalid literal for int() with base 10: b'x'"
+    assert parser.gets() == 5
+
+
+@pytest.mark.parametrize('parser_class', [HiredisParser, PythonParser])
+def test_parser_nested_errors(parser_class):
+    parser = parser_class()
+    parser.feed(b'*4\r\n$1\r\n1\r\n-ERR bad\r\n*1\r\n$1\r\n2\r\n$-1\r\n%1\r\n+a\r\n$1\r\n3\r\n')
+    parser.set_reply_type(None, int)
+    # errors and nested aggregates are kept as they are, other elements are converted
+    one, error, nested, nil = parser.gets()
+    assert (one, nested, nil) == (1, [b'2'], None)
+    assert isinstance(error, ReplyError)
+    assert parser.gets() == {b'a': b'3'}
+
+
+async def test_python_parser():
+    async with connect(ConnectionSettings(parser='python')) as redis:
+        await redis.flushall()
+        await redis.set('foo', 'bar')
+        await redis.mset(a=1, b=2)
+        assert 'bar' == await redis.get('foo')
+        assert b'bar' == await redis.get('foo', decode=False)
+        assert ['1', '2', None] == await redis.mget('a', 'b', 'c')
+        assert 2 == await redis.incr('a')
+        assert 2.5 == await redis.incrbyfloat('a', 0.5)
+        assert isinstance(await redis.config_get('maxmemory'), dict)
+        with pytest.raises(ReplyError, match='ERR value is not an integer'):
+            await redis.incr('a')
+        value = os.urandom(200_000)
+        await redis.set('big', value)
+        assert value == await redis.get('big', decode=False)
+        assert value == b''.join([bytes(c) async for c in await redis.get_stream('big')])
+
+
+def test_unknown_parser(loop):
+    with pytest.raises(ValueError, match="unknown parser 'foo', must be one of: hiredis, python"):
+        RedisStreamReader(2 ** 16, loop, parser='foo')
+
+
+async def test_adaptive_read_limit(redis: Redis):
+    value = os.urandom(2 ** 20)
+    await redis.set('big', value)
+    async with connect(ConnectionSettings(read_limit=2 ** 12, max_read_limit=2 ** 16)) as r:
+        reader = r._conn._reader
+        assert reader._limit == 2 ** 12
+        assert value == await r.get('big', decode=False)
+        # the limit was raised while the reply was received
+        assert reader._limit == 2 ** 16
+        for _ in range(128 * 4):
+            await r.get('small')
+        assert reader._limit == 2 ** 12
+
+
+def test_read_limit_bounds(loop):
+    reader = RedisStreamReader(limit=100, loop=loop, max_limit=10)
+    assert reader._max_limit == 100
+    reader._raise_limit()
+    assert reader._limit == 100
+
+
+async def test_protocol(loop):
+    reader = RedisStreamReader(limit=100, loop=loop)
+    protocol = RedisProtocol(reader, loop)
+    replies = []
+
+    def on_data():
+        while True:
+            reply = reader.read_nowait()
+            if reply is False:
+                break
+            replies.append(reply)
+
+    reader.on_data = on_data
+    protocol.data_received(b'+OK\r\n:1\r\n$3\r\nfo')
+    assert replies == [b'OK', 1]
+    protocol.data_received(b'o\r\n')
+    assert replies == [b'OK', 1, b'foo']
+
+    protocol.pause_writing()
+    drain = asyncio.ensure_future(protocol.drain())
+    await asyncio.sleep(0)
+    assert not drain.done()
+    protocol.resume_writing()
+    await drain
+
+    reader.on_data = None
+    protocol.connection_lost(None)
+    assert reader._eof
+    assert protocol.closed.done()
+    with pytest.raises(asyncio.IncompleteReadError):
+        reader.read_nowait()
+    with pytest.raises(ConnectionResetError):
+        await protocol.drain()
+
+
+async def test_replies_without_read_task(redis: Redis):
+    conn = redis._conn
+    fut = conn._queue_command((b'ECHO', b'hello'), 'str', None)
+    conn._flush()
+    while not fut.done():
+        # the reply is set as soon as it's received
+        await asyncio.sleep(0)
+    assert fut.result() == 'hello'
+    assert all(not t.get_coro().__qualname__.startswith('RawConnection') for t in asyncio.all_tasks())
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import Transaction, connect
+from async_redis.testing import RespServer
+
+
+async def test_strings(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        assert None is await redis.set('foo', 'bar')
+        assert 'bar' == await redis.get('foo')
+        assert b'bar' == await redis.get('foo', decode=False)
+        assert None is await redis.get('missing')
+        assert 6 == await redis.append('foo', 'baz')
+        assert 'arb' == await redis.getrange('foo', 1, 3)
+        assert 'baz' == await redis.getrange('foo', -3, -1)
+        assert 'barbaz' == await redis.getset('foo', 'new')
+        assert 3 == await redis.strlen('foo')
+        assert 1 == await redis.incr('counter')
+        assert 11 == await redis.incrby('counter', 10)
+        assert 10 == await redis.decr('counter')
+        assert 5 == await redis.decrby('counter', 5)
+        assert 6.5 == await redis.incrbyfloat('counter', 1.5)
+        assert None is await redis.mset(a=1, b=2)
+        assert ['1', '2', None] == await redis.mget('a', 'b', 'c')
+        assert 0 == await redis.msetnx(a=3, c=3)
+        assert 1 == await redis.msetnx(c=3, d=4)
+        assert True is await redis.setnx('e', 5)
+        assert False is await redis.setnx('e', 6)
+        assert 5 == await redis.setrange('e', 2, 'xyz')
+        assert b'5\0xyz' == await redis.get('e', decode=False)
+        with pytest.raises(ReplyError, match='not an integer'):
+            await redis.incr('foo')
+        assert resp_server.data[b'foo'] == b'new'
+
+
+async def test_bits(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        assert 0 == await redis.setbit('bits', 7, 1)
+        assert 1 == await redis.setbit('bits', 7, 1)
+        assert 1 == await redis.getbit('bits', 7)
+        assert 0 == await redis.getbit('bits', 100)
+        await redis.set('foo', 'foobar')
+        assert 26 == await redis.bitcount('foo')
+        assert 4 == await redis.bitcount('foo', 0, 0)
+        assert 6 == await redis.bitcount('foo', 1, 1)
+        await redis.set('pos', b'\xff\xf0\x00')
+        assert 12 == await redis.bitpos('pos', 0)
+        assert 0 == await redis.bitpos('pos', 1)
+        assert -1 == await redis.bitpos('pos', 1, 2)
+        await redis.set('ones', b'\xff')
+        assert 8 == await redis.bitpos('ones', 0)
+        assert 3 == await redis._conn.execute([b'BITOP', b'AND', b'dest', b'pos', b'ones'])
+        assert resp_server.data[b'dest'] == b'\xff\x00\x00'
+        assert 1 == await redis._conn.execute([b'BITOP', b'NOT', b'dest', b'ones'])
+        assert resp_server.data[b'dest'] == b'\x00'
+
+
+async def test_expiry(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        await redis.set('foo', 'bar', expire=10)
+        assert 10 == await redis._conn.execute([b'TTL', b'foo'])
+        await redis.set('foo', 'bar', pexpire=10)
+        assert 0 < await redis._conn.execute([b'PTTL', b'foo']) <= 10
+        await asyncio.sleep(0.02)
+        assert None is await redis.get('foo')
+        assert -2 == await redis._conn.execute([b'TTL', b'foo'])
+        await redis.setex('foo', 0.5, 'bar')
+        await redis.set('foo', 'new', if_exists=True)
+        assert -1 == await redis._conn.execute([b'TTL', b'foo'])
+
+
+async def test_pipeline_and_transaction(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        async with redis.pipeline() as p:
+            for i in range(100):
+                p.set(f'key_{i}', i)
+            p.mget('key_0', 'key_99')
+            v = await p.execute()
+        assert v[-1] == ['0', '99']
+
+        async with redis.transaction() as tr:
+            tr.incr('counter')
+            tr.get('counter')
+            assert [1, '1'] == await tr.execute()
+
+        async def incr(r, tr: Transaction):
+            tr.set('counter', int(await r.get('counter')) + 1)
+
+        assert [None] == await redis.watch(incr, 'counter')
+        assert '2' == await redis.get('counter')
+
+
+async def test_watch_conflict(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        calls = 0
+
+        async def conflict(r, tr: Transaction):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                async with connect(resp_server.settings()) as other:
+                    await other.set('foo', 'changed')
+            tr.set('foo', 'mine')
+
+        await redis.watch(conflict, 'foo', backoff=0)
+        assert calls == 2
+        assert 'mine' == await redis.get('foo')
+
+
+async def test_errors(resp_server: RespServer):
+    async with connect(resp_server.settings()) as redis:
+        with pytest.raises(ReplyError, match="^ERR unknown command 'NOPE'"):
+            await redis._conn.execute([b'NOPE'])
+        with pytest.raises(ReplyError, match="^ERR wrong number of arguments for 'get' command"):
+            await redis._conn.execute([b'GET'])
+        with pytest.raises(ReplyError, match='^ERR syntax error'):
+            await redis._conn.execute([b'SET', b'a', b'b', b'XY'])
+        with pytest.raises(ReplyError, match='^NOSCRIPT'):
+            await redis.evalsha('0' * 40)
+
+
+async def test_latency(loop):
+    async with RespServer(latency=0.05) as server:
+        async with connect(server.settings()) as redis:
+            start = loop.time()
+            await asyncio.gather(*[redis.set(f'k{i}', i) for i in range(10)])
+            # replies are delayed but not serialised
+            assert 0.05 <= loop.time() - start < 0.15
+
+
+async def test_command_delays(loop):
+    async with RespServer(command_delays={'get': 0.05}) as server:
+        async with connect(server.settings()) as redis:
+            start = loop.time()
+            assert None is await redis.set('foo', 'bar')
+            assert loop.time() - start < 0.05
+            assert 'bar' == await redis.get('foo')
+            assert loop.time() - start >= 0.05
+
+
+async def test_chunked_large_payload(loop):
+    value = bytes(range(256)) * 40_000
+    async with RespServer(write_chunk_size=100_000, chunk_delay=0.001) as server:
+        server.data[b'big'] = value
+        async with connect(server.settings()) as redis:
+            assert value == await redis.get('big', decode=False)
+            stream = await redis.get_stream('big')
+            chunks = [bytes(c) async for c in stream]
+            assert len(chunks) > 1
+            assert b''.join(chunks) == value
+
+
+def test_thread():
+    server = RespServer()
+    server.start_thread()
+    try:
+
+        async def run():
+            async with connect(server.settings()) as redis:
+                await redis.set('foo', 'bar')
+                return await redis.get('foo')
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert 'bar' == loop.run_until_complete(run())
+        finally:
+            loop.close()
+        assert server.commands >= 2
+    finally:
+        server.stop_thread()
+
+
+def test_thread_start_error():
+    server = RespServer()
+    server.start_thread()
+    try:
+        with pytest.raises(OSError):
+            RespServer(port=server.port).start_thread()
+    finally:
+        server.stop_thread()
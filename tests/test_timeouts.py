@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from async_redis import PoolSettings, connect
+from async_redis.testing import RespServer
+
+
+async def test_command_timeout(resp_server: RespServer):
+    resp_server.command_delays = {b'GET': 0.2}
+    async with connect(resp_server.settings()) as redis:
+        await redis.set('foo', 'bar')
+        with pytest.raises(asyncio.TimeoutError):
+            await redis.with_timeout(0.05).get('foo')
+        # the late reply is discarded, the next command gets its own reply
+        assert 2 == await redis.incrby('counter', 2)
+        assert 'bar' == await redis.get('foo')
+        assert not redis._conn._timed_out
+        assert not redis._conn.is_closed
+
+
+async def test_default_timeout(resp_server: RespServer):
+    resp_server.command_delays = {b'GET': 0.2}
+    async with connect(resp_server.settings(command_timeout=0.05)) as redis:
+        with pytest.raises(asyncio.TimeoutError):
+            await redis.get('foo')
+        assert None is await redis.with_timeout(None).get('foo')
+        assert None is await redis.with_timeout(1).get('foo')
+
+
+async def test_pipeline_timeout(resp_server: RespServer):
+    resp_server.command_delays = {b'GET': 0.2}
+    async with connect(resp_server.settings()) as redis:
+        async with redis.with_timeout(0.05).pipeline() as p:
+            p.set('foo', 'bar')
+            p.get('foo')
+            with pytest.raises(asyncio.TimeoutError):
+                await p.execute()
+        resp_server.command_delays = {b'EXEC': 0.2}
+        async with redis.with_timeout(0.05).transaction() as tr:
+            tr.set('foo', 'baz')
+            with pytest.raises(asyncio.TimeoutError):
+                await tr.execute()
+        assert 'baz' == await redis.with_timeout(None).get('foo')
+
+
+async def test_stuck_connection(resp_server: RespServer):
+    resp_server.command_delays = {b'GET': 1}
+    async with connect(resp_server.settings(command_timeout=0.05, stuck_timeout=0.05)) as redis:
+        with pytest.raises(asyncio.TimeoutError):
+            await redis.get('foo')
+        await asyncio.sleep(0.2)
+        assert redis._conn.is_closed
+        with pytest.raises(ConnectionError):
+            await redis.set('foo', 'bar')
+
+
+async def test_pool_discards_stuck(resp_server: RespServer):
+    resp_server.command_delays = {b'GET': 1}
+    settings = resp_server.settings(command_timeout=0.05, stuck_timeout=0.05)
+    async with connect(settings, pool_settings=PoolSettings(min_size=1, max_size=1)) as redis:
+        with pytest.raises(asyncio.TimeoutError):
+            await redis.get('foo')
+        await asyncio.sleep(0.2)
+        assert None is await redis.set('foo', 'bar')
+        assert redis._conn.stats().discarded == 1
+
+
+async def test_close_stuck(resp_server: RespServer, loop):
+    resp_server.command_delays = {b'GET': 1}
+    redis = await connect(resp_server.settings(stuck_timeout=0.05))
+    get = loop.create_task(redis.get('foo'))
+    await asyncio.sleep(0.01)
+    start = loop.time()
+    # the reply never arrives in time, close gives up waiting for it after stuck_timeout
+    await redis.close()
+    assert loop.time() - start < 0.5
+    with pytest.raises(ConnectionError, match='connection closed before all replies were received'):
+        await get
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from hiredis import ReplyError
+
+from async_redis import PoolSettings, Redis, Transaction, WatchError, connect
+
+
+async def test_transaction(redis: Redis):
+    async with redis.transaction() as tr:
+        tr.set('foo', 'bar')
+        tr.get('foo')
+        tr.get('foo', decode=False)
+        tr.incr('counter')
+        tr.incrbyfloat('float', 1.5)
+        tr.setnx('foo', 'x')
+        tr.mget('foo', 'counter')
+        tr.strlen('foo')
+        v = await tr.execute()
+    assert v == [None, 'bar', b'bar', 1, 1.5, False, ['bar', '1'], 3]
+    assert isinstance(tr, Transaction)
+
+
+async def test_transaction_context_executes(redis: Redis):
+    async with redis.transaction() as tr:
+        tr.set('foo', 1)
+        tr.incr('foo')
+    assert '2' == await redis.get('foo')
+
+
+async def test_transaction_error(redis: Redis):
+    await redis.set('foo', 'bar')
+    async with redis.transaction() as tr:
+        tr.set('other', 1)
+        tr.incr('foo')
+        with pytest.raises(ReplyError, match='not an integer'):
+            await tr.execute()
+    # not rolled back, as with redis
+    assert '1' == await redis.get('other')
+
+
+async def test_transaction_queue_error(redis: Redis):
+    async with redis.transaction() as tr:
+        tr.set('foo', 1)
+        tr._execute((b'NOT_A_COMMAND',), None)
+        with pytest.raises(ReplyError, match='unknown command'):
+            await tr.execute()
+    assert None is await redis.get('foo')
+    # the connection isn't left inside MULTI
+    await redis.set('foo', 2)
+    assert '2' == await redis.get('foo')
+
+
+async def test_transaction_encode_error(redis: Redis):
+    async with redis.transaction() as tr:
+        tr.set('foo', 1)
+        tr.set('bar', object())
+        with pytest.raises(TypeError):
+            await tr.execute()
+    assert None is await redis.get('foo')
+    await redis.set('foo', 2)
+    assert '2' == await redis.get('foo')
+
+
+async def test_transaction_script(redis: Redis):
+    script = redis.register_script("return redis.call('INCR', KEYS[1])")
+    await redis.script_flush()
+    async with redis.transaction() as tr:
+        script(tr, ['foo'])
+        script(tr, ['foo'])
+        v = await tr.execute()
+    assert v == [1, 2]
+
+
+async def test_watch(redis: Redis):
+    await redis.set('counter', 10)
+
+    async def double(r: Redis, tr: Transaction):
+        value = int(await r.get('counter'))
+        tr.set('counter', value * 2)
+        tr.get('counter')
+
+    assert [None, '20'] == await redis.watch(double, 'counter')
+    assert '20' == await redis.get('counter')
+
+
+async def test_watch_retry(redis: Redis):
+    await redis.set('counter', 1)
+    calls = 0
+
+    async def incr(r: Redis, tr: Transaction):
+        nonlocal calls
+        calls += 1
+        value = int(await r.get('counter'))
+        if calls < 3:
+            # another client modifies the key
+            async with connect() as other:
+                await other.incr('counter')
+        tr.set('counter', value + 1)
+
+    assert [None] == await redis.watch(incr, 'counter', backoff=0.001)
+    assert calls == 3
+    assert '4' == await redis.get('counter')
+
+
+async def test_watch_exhausted(redis: Redis):
+    async def conflict(r: Redis, tr: Transaction):
+        async with connect() as other:
+            await other.incr('counter')
+        tr.set('counter', 0)
+
+    with pytest.raises(WatchError, match='transaction aborted 3 times'):
+        await redis.watch(conflict, 'counter', retries=2, backoff=0.001)
+    assert '3' == await redis.get('counter')
+
+
+async def test_watch_no_commands(redis: Redis):
+    async def nothing(r: Redis, tr: Transaction):
+        pass
+
+    assert [] == await redis.watch(nothing, 'foo')
+
+
+async def test_watch_error(redis: Redis):
+    async def error(r: Redis, tr: Transaction):
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError, match='boom'):
+        await redis.watch(error, 'foo')
+
+
+async def test_watch_concurrent(redis: Redis):
+    await redis.set('counter', 0)
+
+    async def incr(r: Redis, tr: Transaction):
+        value = int(await r.get('counter'))
+        tr.set('counter', value + 1)
+
+    async def plain_transaction():
+        async with redis.transaction() as tr:
+            tr.incr('other')
+
+    await asyncio.gather(*[redis.watch(incr, 'counter') for _ in range(10)], *[plain_transaction() for _ in range(10)])
+    assert '10' == await redis.get('counter')
+    assert '10' == await redis.get('other')
+
+
+async def test_watch_pool():
+    async with connect(pool_settings=PoolSettings(max_size=3)) as redis:
+        await redis.set('counter', 0)
+
+        async def incr(r: Redis, tr: Transaction):
+            value = int(await r.get('counter'))
+            tr.set('counter', value + 1)
+
+        await asyncio.gather(*[redis.watch(incr, 'counter', backoff=0.001, retries=100) for _ in range(10)])
+        assert '10' == await redis.get('counter')
+        async with redis.transaction() as tr:
+            tr.incr('counter')
+            tr.get('counter')
+            assert [11, '11'] == await tr.execute()
@@ -3,29 +3,45 @@ import re
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent.parent
-func_regex = re.compile(r'( {4}def [a-z][a-z_]+\(.*?\) -> )Result.*?\n( {8}""".+?"""\n {8})', flags=re.S)
+# signatures can span several lines but not several methods, methods not returning Result are inherited as they are
+func_regex = re.compile(
+    r'( {4}def [a-z][a-z_]+\((?:(?!\n {4}def ).)*?\) -> )Result.*?\n( {8}""".+?"""\n {8})', flags=re.S
+)
 
 HEAD = """\
-from typing import Any, Coroutine, List, Tuple, TypeVar, Union
+from typing import Any, Coroutine, List, Optional, Sequence, Tuple, TypeVar, Union
 
+from .arrays import ArrayType
+from .codecs import Codec
 from .commands import AbstractCommands
-from .connection import RawConnection
-from .typing import ArgType, CommandArgs, Literal, ResultType, ReturnAs
+from .connection import AbstractConnection, default_timeout
+from .scripts import Script
+from .typing import ArgType, Callback, Command, CommandArgs, Literal, ReturnAs
 
 __all__ = ('CommandsPipeline',)
 
 
 class CommandsPipeline(AbstractCommands):
-    _conn: RawConnection
-    _pipeline: List[CommandArgs]
+    _conn: AbstractConnection
+    _timeout: Optional[float]
+    _codec: Optional[Codec]
+    _pipeline: List[Command]
+
+    def __init__(
+        self,
+        raw_connection: AbstractConnection,
+        timeout: Optional[float] = default_timeout,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        ...
 
-    def __init__(self, raw_connection: RawConnection):
+    def _execute(self, args: CommandArgs, return_as: ReturnAs, callback: Optional[Callback] = None) -> None:
         ...
 
-    def _execute(self, args: CommandArgs, return_as: ReturnAs) -> None:
+    def _register_script(self, script: Script) -> None:
         ...
 
-    async def execute(self, return_as: ReturnAs = None) -> List[ResultType]:
+    async def execute(self) -> List[Any]:
         ...
 
 """